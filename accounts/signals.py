@@ -0,0 +1,14 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .tokens import forget_user_state
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_state(sender, instance, **kwargs):
+    # khoá tài khoản / đổi is_staff -> token đang dùng được kiểm tra lại ngay request sau
+    forget_user_state([instance.pk])
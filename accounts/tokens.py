@@ -0,0 +1,116 @@
+"""
+JWT mang sẵn thông tin phân quyền để API không phải đọc bảng User mỗi request.
+
+Claim thêm vào token: username, is_staff, is_superuser, roles (tên group).
+ClaimsJWTAuthentication dựng User từ claim (User.from_db với các field khác bị defer,
+không query) sau khi đối chiếu với trạng thái hiện tại của user trong cache:
+  - user bị khoá / xoá -> từ chối ngay khi cache hết hạn hoặc bị xoá bởi signal
+  - quyền đổi (is_staff, group...) -> claim cũ, nạp User từ DB như JWTAuthentication thường
+Token không có claim (cấp trước đây) cũng đi đường DB.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from orders.metrics import cache_event
+from orders.perm import cached_roles, preload_roles, roles
+
+CLAIM_FIELDS = ("username", "is_staff", "is_superuser")
+
+
+def _conf(name, default):
+    return getattr(settings, "AUTH_CLAIMS", {}).get(name, default)
+
+
+def _cache():
+    return caches[_conf("CACHE_ALIAS", "default")]
+
+
+def _state_key(user_id):
+    return f"jwt:user:{user_id}"
+
+
+def add_claims(token, user):
+    for f in CLAIM_FIELDS:
+        token[f] = getattr(user, f)
+    token["roles"] = sorted(roles(user))
+    return token
+
+
+def user_state(user_id):
+    """(is_active, is_staff, is_superuser) hiện tại; cache STATE_TTL giây, xoá khi User đổi."""
+    key = _state_key(user_id)
+    state = _cache().get(key)
+    cache_event("jwt_user", state is not None)
+    if state is None:
+        User = get_user_model()
+        row = User.objects.filter(pk=user_id).values_list("is_active", "is_staff", "is_superuser").first()
+        state = tuple(row) if row else (False, False, False)
+        _cache().set(key, state, _conf("STATE_TTL", 60))
+    return state
+
+
+def forget_user_state(user_ids):
+    keys = [_state_key(uid) for uid in user_ids]
+    if keys:
+        _cache().delete_many(keys)
+
+
+def claims_user(token):
+    """User dựng từ claim: chỉ id/username/is_* được nạp, field khác đọc từ DB khi truy cập."""
+    User = get_user_model()
+    known = {f: token.get(f) for f in CLAIM_FIELDS}
+    # simplejwt lưu user_id dạng chuỗi -> đổi về kiểu của pk để so sánh với *_id được
+    known[User._meta.pk.attname] = User._meta.pk.to_python(token[api_settings.USER_ID_CLAIM])
+    known["is_active"] = True
+    # from_db nhận giá trị theo đúng thứ tự field của model
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in known]
+    user = User.from_db(DEFAULT_DB_ALIAS, fields, [known[f] for f in fields])
+    preload_roles(user, token.get("roles", ()))
+    return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Access token mới lấy claim theo quyền hiện tại (1 query mỗi lần refresh)."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data["access"], verify=False)
+        User = get_user_model()
+        user = User.objects.filter(pk=access[api_settings.USER_ID_CLAIM], is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        data["access"] = str(add_claims(access, user))
+        return data
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if "is_staff" not in validated_token or "roles" not in validated_token:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken("Token contained no recognizable user identification") from e
+
+        active, is_staff, is_superuser = user_state(user_id)
+        if not active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if (
+            (is_staff, is_superuser) != (validated_token["is_staff"], validated_token.get("is_superuser"))
+            or cached_roles(user_id) != frozenset(validated_token["roles"])
+        ):
+            return super().get_user(validated_token)
+        return claims_user(validated_token)
@@ -1,13 +1,12 @@
 from django.urls import path, reverse_lazy
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth import views as auth_views
-from .views import RegisterView, logout_get
+from .views import LoginView, RefreshView, RegisterView, logout_get
 from .forms import StrictPasswordResetForm  # nếu có
 
 urlpatterns = [
     # ==== JWT API (Postman / Mobile) ====
-    path("api/login/", TokenObtainPairView.as_view(), name="jwt-login"),
-    path("api/refresh/", TokenRefreshView.as_view(), name="jwt-refresh"),
+    path("api/login/", LoginView.as_view(), name="jwt-login"),
+    path("api/refresh/", RefreshView.as_view(), name="jwt-refresh"),
     path("api/register/", RegisterView.as_view(), name="jwt-register"),
 
     # ==== UI (web người dùng) ====
@@ -1,4 +1,4 @@
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
@@ -7,8 +7,16 @@ from django.contrib.auth.hashers import make_password
 from django.contrib.auth import logout
 from django.shortcuts import redirect
 
+from .tokens import ClaimsTokenObtainPairSerializer, ClaimsTokenRefreshSerializer
+
 class LoginView(TokenObtainPairView):
+    # access token mang sẵn is_staff / roles -> API không phải đọc User mỗi request
+    permission_classes = [AllowAny]
+    serializer_class = ClaimsTokenObtainPairSerializer
+
+class RefreshView(TokenRefreshView):
     permission_classes = [AllowAny]
+    serializer_class = ClaimsTokenRefreshSerializer
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
@@ -0,0 +1,67 @@
+"""
+So sánh xác thực JWT: JWTAuthentication (đọc User mỗi request) vs ClaimsJWTAuthentication
+(dựng User từ claim, chỉ đọc cache).
+
+    python bench/bench_jwt_auth.py --user shipper1 --requests 2000
+
+Mỗi "request" = authenticate() + kiểm tra vai trò (is_admin / is_employee) như các API đơn hàng.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "deliverysys.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from rest_framework_simplejwt.authentication import JWTAuthentication  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+from accounts.tokens import ClaimsJWTAuthentication, ClaimsTokenObtainPairSerializer  # noqa: E402
+from orders.perm import is_admin, is_employee  # noqa: E402
+
+
+def run(label, auth, token, n):
+    request = APIRequestFactory().get("/orders/api/orders/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    auth.authenticate(request)  # làm nóng cache
+    with CaptureQueriesContext(connection) as ctx:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            user, _tok = auth.authenticate(request)
+            is_admin(user), is_employee(user)
+        dt = time.perf_counter() - t0
+    print(f"{label:<26} queries/request={len(ctx.captured_queries) / n:<6.2f} "
+          f"{dt / n * 1e6:8.1f} µs/request  {n / dt:10.0f} req/s")
+    return len(ctx.captured_queries) / n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--user", help="username (mặc định: user đầu tiên)")
+    ap.add_argument("--requests", type=int, default=2000)
+    args = ap.parse_args()
+
+    User = get_user_model()
+    qs = User.objects.filter(is_active=True)
+    user = qs.get(username=args.user) if args.user else qs.order_by("id").first()
+    if user is None:
+        sys.exit("Chưa có user nào đang hoạt động.")
+
+    plain = str(RefreshToken.for_user(user).access_token)
+    claims = str(ClaimsTokenObtainPairSerializer.get_token(user).access_token)
+    old = run("JWTAuthentication", JWTAuthentication(), plain, args.requests)
+    new = run("ClaimsJWTAuthentication", ClaimsJWTAuthentication(), claims, args.requests)
+    print(f"tiết kiệm: {old - new:.2f} query/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+So sánh list đơn hàng: ModelSerializer cũ (N+1) vs fast path values_list.
+
+    python bench/bench_order_list.py --rows 2000 --repeat 5
+
+Chạy trên DB trong settings (cần sẵn dữ liệu Order, xem --rows).
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "deliverysys.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from orders.models import Order  # noqa: E402
+from orders.serializers import OrderSerializer, order_list_rows, serialize_order_rows  # noqa: E402
+
+
+def run(label, fn, repeat):
+    best, queries, n = float("inf"), 0, 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            t0 = time.perf_counter()
+            data = fn()
+            dt = time.perf_counter() - t0
+        best = min(best, dt)
+        queries, n = len(ctx.captured_queries), len(data)
+    print(f"{label:<28} rows={n:<6} queries={queries:<6} best={best * 1000:8.1f} ms  {n / best:10.0f} rows/s")
+    return data
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=2000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    base = Order.objects.order_by("-created_at", "-id")
+    n = args.rows
+    old = run("ModelSerializer (cũ)", lambda: OrderSerializer(base[:n], many=True).data, args.repeat)
+    run("ModelSerializer + JOIN", lambda: OrderSerializer(base.select_related("assigned_to")[:n], many=True).data, args.repeat)
+    new = run("values_list fast path", lambda: serialize_order_rows(order_list_rows(base)[:n]), args.repeat)
+    print("kết quả giống nhau:", [dict(r) for r in old] == new)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+So sánh 2 báo cáo của bench/load.py (trước / sau 1 thay đổi).
+
+    python bench/compare.py bench/results/before-*.json bench/results/after-*.json --threshold 10
+
+In p50/p95/p99, request/s và query/request theo endpoint kèm % thay đổi. Thoát mã 1 nếu
+p95 của endpoint nào chậm hơn --threshold % hoặc số query trung bình tăng (dùng được trong CI).
+Không cần Django.
+"""
+import argparse
+import json
+import sys
+
+METRICS = (("p50_ms", "p50"), ("p95_ms", "p95"), ("p99_ms", "p99"), ("rps", "rps"), ("queries_mean", "q/req"))
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def pct(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100.0
+
+
+def fmt_cell(old, new):
+    if old is None or new is None:
+        return f"{'-' if old is None else old:>8} -> {'-' if new is None else new:<8}{'':>8}"
+    d = pct(old, new)
+    return f"{old:>8.1f} -> {new:<8.1f}{'' if d is None else f'{d:+7.1f}%':>8}"
+
+
+def describe(report):
+    m = report.get("meta", {})
+    git = m.get("git") or {}
+    sha = (git.get("sha") or "?")[:10] + ("+dirty" if git.get("dirty") else "")
+    return f"{m.get('label', '?')} @ {sha} ({m.get('time', '?')}, {m.get('elapsed_s', '?')}s)"
+
+
+def _run_args(report):
+    args = dict(report.get("meta", {}).get("args") or {})
+    for k in ("label", "out"):
+        args.pop(k, None)
+    return args
+
+
+def compare(old, new, threshold):
+    """-> (dòng in ra, danh sách endpoint chậm đi)."""
+    lines, regressions = [], []
+    head = f"{'endpoint':<16}" + "".join(f"{label:^28}" for _, label in METRICS)
+    lines.append(head)
+    eo, en = old.get("endpoints", {}), new.get("endpoints", {})
+    for name in sorted(set(eo) | set(en)):
+        a, b = eo.get(name, {}), en.get(name, {})
+        lines.append(f"{name:<16}" + "".join(fmt_cell(a.get(k), b.get(k)) + "  " for k, _ in METRICS))
+        if a and b:
+            d = pct(a.get("p95_ms"), b.get("p95_ms"))
+            if d is not None and d > threshold:
+                regressions.append(f"{name}: p95 {d:+.1f}%")
+            if b.get("queries_mean", 0) > a.get("queries_mean", 0):
+                regressions.append(f"{name}: query/request {a['queries_mean']} -> {b['queries_mean']}")
+    to, tn = old.get("total", {}), new.get("total", {})
+    lines.append(f"{'TỔNG rps':<16}{fmt_cell(to.get('rps'), tn.get('rps'))}")
+    return lines, regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("old")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=10.0, help="%% p95 chậm đi tối đa cho phép")
+    args = ap.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    print("cũ:", describe(old))
+    print("mới:", describe(new))
+    if _run_args(old) != _run_args(new):
+        print("CHÚ Ý: tham số chạy khác nhau, so sánh có thể không công bằng")
+    lines, regressions = compare(old, new, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print("\nChậm đi:")
+        for r in regressions:
+            print("  -", r)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Chạy kịch bản tải shipper / điều phối lên API, ghi báo cáo JSON để so sánh giữa các commit.
+
+    python bench/seed.py --couriers 50 --orders 20000 --seed 42     # dữ liệu (1 lần)
+    python bench/load.py --couriers 20 --dispatchers 4 --duration 30 --label before
+    python bench/compare.py bench/results/before-*.json bench/results/after-*.json
+
+Chạy in-process (django.test.Client, mỗi worker 1 thread + 1 kết nối DB riêng), không qua
+HTTP server -> đo đúng thời gian view + middleware + SQL. OSRM / Nominatim trỏ sang
+stub_server.py chạy trong thread nền (--osrm-latency-ms giả lập độ trễ mạng), --external để
+giữ URL trong settings.
+Kịch bản:
+  - shipper   : list đơn của mình, xem chi tiết, route, track theo mã, chấm công GET / in / out,
+                hiệu suất 30 ngày
+  - điều phối : list toàn bộ (có lọc status), chi tiết + route + track đơn bất kỳ, ETA mọi đơn
+                đang mở, hiệu suất
+Báo cáo theo endpoint: p50/p95/p99/mean/max (ms), request/s, số query SQL trung bình / tối đa,
+mã HTTP. Lưu bench/results/<label>-<thời điểm>.json kèm git sha + tham số.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "deliverysys.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from accounts.tokens import ClaimsTokenObtainPairSerializer  # noqa: E402
+from orders.models import Order  # noqa: E402
+from stub_server import start_stub  # noqa: E402
+
+User = get_user_model()
+
+PREFIX = "bench_"  # trùng seed.py
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+API = "/orders/api"
+
+
+# ---------- đo ----------
+class QueryCounter:
+    """execute_wrapper trên kết nối của thread hiện tại: đếm câu SQL của 1 request."""
+
+    def __init__(self):
+        self.n = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.n += 1
+        return execute(sql, params, many, context)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)   # endpoint -> [(ms, queries)]
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def add(self, endpoint, ms, queries, status):
+        with self.lock:
+            self.samples[endpoint].append((ms, queries))
+            self.statuses[endpoint][status] += 1
+
+
+def percentile(sorted_vals, p):
+    """Nearest-rank trên list đã sắp xếp."""
+    if not sorted_vals:
+        return None
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(p / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+def summarize(recorder, elapsed):
+    out = {}
+    for endpoint in sorted(recorder.samples):
+        rows = recorder.samples[endpoint]
+        lat = sorted(ms for ms, _ in rows)
+        qs = [q for _, q in rows]
+        out[endpoint] = {
+            "count": len(rows),
+            "rps": round(len(rows) / elapsed, 2),
+            "p50_ms": round(percentile(lat, 50), 3),
+            "p95_ms": round(percentile(lat, 95), 3),
+            "p99_ms": round(percentile(lat, 99), 3),
+            "mean_ms": round(sum(lat) / len(lat), 3),
+            "max_ms": round(lat[-1], 3),
+            "queries_mean": round(sum(qs) / len(qs), 2),
+            "queries_max": max(qs),
+            "status": {str(k): v for k, v in sorted(recorder.statuses[endpoint].items())},
+        }
+    return out
+
+
+# ---------- worker ----------
+class Worker(threading.Thread):
+    def __init__(self, role, user, orders, recorder, start, args, seed):
+        super().__init__(name=f"bench-{role}-{user.username}", daemon=True)
+        self.role, self.user, self.orders = role, user, orders
+        self.recorder, self.start_barrier = recorder, start
+        self.duration, self.iterations, self.warmup = args.duration, args.iterations, args.warmup
+        self.rng = random.Random(seed)
+        self.warming = True
+        self.error = None
+        token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        self.client = Client(HTTP_AUTHORIZATION=f"Bearer {token}", raise_request_exception=False)
+
+    def call(self, endpoint, method, path, data=None, **extra):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            t0 = time.perf_counter()
+            if method == "post":
+                resp = self.client.post(path, data, content_type="application/json", **extra)
+            else:
+                resp = self.client.get(path, data, **extra)
+            ms = (time.perf_counter() - t0) * 1000
+        if not self.warming:
+            self.recorder.add(endpoint, ms, counter.n, resp.status_code)
+        return resp
+
+    def pick(self):
+        return self.rng.choice(self.orders) if self.orders else None
+
+    def courier_round(self):
+        self.call("list", "get", f"{API}/orders/")
+        o = self.pick()
+        if o:
+            oid, code = o
+            self.call("detail", "get", f"{API}/orders/{oid}/")
+            self.call("route", "get", f"{API}/orders/{oid}/route/")
+            self.call("track", "get", f"{API}/track/", {"code": code})
+        self.call("attendance_get", "get", f"{API}/attendance/")
+        if self.rng.random() < 0.2:
+            # ca mở -> in trả 400, ca đóng -> out trả 400: vẫn là đường code thật cần đo
+            act = self.rng.choice(("in", "out"))
+            self.call(f"attendance_{act}", "post", f"{API}/attendance/", {"action": act},
+                      HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex)
+        self.call("performance", "get", f"{API}/performance/")
+
+    def dispatcher_round(self):
+        status = self.rng.choice(("", "new", "shipping", "done"))
+        self.call("list", "get", f"{API}/orders/", {"status": status} if status else None)
+        o = self.pick()
+        if o:
+            oid, code = o
+            self.call("detail", "get", f"{API}/orders/{oid}/")
+            self.call("route", "get", f"{API}/orders/{oid}/route/")
+            self.call("track", "get", f"{API}/track/", {"code": code})
+        self.call("eta", "get", f"{API}/eta/")
+        self.call("performance", "get", f"{API}/performance/")
+
+    def run(self):
+        step = self.courier_round if self.role == "courier" else self.dispatcher_round
+        try:
+            for _ in range(self.warmup):
+                step()
+            self.warming = False
+            self.start_barrier.wait()  # mọi worker bắt đầu đo cùng lúc
+            deadline = time.monotonic() + self.duration
+            i = 0
+            while (self.iterations and i < self.iterations) or (not self.iterations and time.monotonic() < deadline):
+                step()
+                i += 1
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as e:  # báo lỗi sau khi join, không làm treo các worker khác
+            self.error = e
+            self.start_barrier.abort()
+        finally:
+            connection.close()
+
+
+# ---------- metadata ----------
+def git_meta():
+    def git(*args):
+        try:
+            return subprocess.check_output(("git", *args), cwd=BASE_DIR, stderr=subprocess.DEVNULL, text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {"sha": git("rev-parse", "HEAD"), "subject": git("log", "-1", "--format=%s"),
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def load_actors(n_couriers, n_dispatchers, orders_per_courier, rng):
+    couriers = list(User.objects.filter(username__startswith=f"{PREFIX}courier_", is_active=True).order_by("id")[:n_couriers])
+    admin = User.objects.filter(username=f"{PREFIX}admin").first()
+    if not couriers or admin is None:
+        sys.exit("Chưa có dữ liệu bench: chạy python bench/seed.py trước.")
+    own = defaultdict(list)
+    for oid, code, uid in (
+        Order.objects.filter(assigned_to__in=couriers).order_by("id").values_list("id", "code", "assigned_to_id")
+    ):
+        own[uid].append((oid, code))
+    for uid, rows in own.items():
+        if len(rows) > orders_per_courier:
+            own[uid] = rng.sample(rows, orders_per_courier)
+    ids = list(Order.objects.filter(code__startswith="BENCH").values_list("id", "code")[:50000])
+    pool = rng.sample(ids, min(len(ids), 2000))
+    actors = [("courier", u, own.get(u.id, [])) for u in couriers]
+    actors += [("dispatcher", admin, pool)] * n_dispatchers
+    return actors
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--couriers", type=int, default=20, help="số worker shipper (mỗi worker 1 user)")
+    ap.add_argument("--dispatchers", type=int, default=4)
+    ap.add_argument("--duration", type=float, default=30, help="giây đo (bỏ qua nếu có --iterations)")
+    ap.add_argument("--iterations", type=int, default=0, help="số vòng kịch bản mỗi worker")
+    ap.add_argument("--warmup", type=int, default=2, help="số vòng không tính vào kết quả")
+    ap.add_argument("--orders-per-courier", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--osrm-latency-ms", type=float, default=20)
+    ap.add_argument("--external", action="store_true", help="dùng OSRM/geocoder trong settings, không bật stub")
+    ap.add_argument("--label", default="run")
+    ap.add_argument("--out", help="đường dẫn file JSON (mặc định bench/results/<label>-<time>.json)")
+    args = ap.parse_args()
+
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+    stub = None
+    if not args.external:
+        stub, base = start_stub(latency_ms=args.osrm_latency_ms)
+        settings.OSRM_URL = base
+        settings.GEOCODER = {**settings.GEOCODER, "NOMINATIM_URL": base, "PHOTON_URL": base}
+
+    rng = random.Random(args.seed)
+    actors = load_actors(args.couriers, args.dispatchers, args.orders_per_courier, rng)
+    recorder = Recorder()
+    start = threading.Barrier(len(actors) + 1)
+    workers = [
+        Worker(role, user, orders, recorder, start, args, args.seed + i)
+        for i, (role, user, orders) in enumerate(actors)
+    ]
+    connection.close()
+    print(f"{sum(w.role == 'courier' for w in workers)} shipper + {args.dispatchers} điều phối, "
+          f"{'%d vòng' % args.iterations if args.iterations else '%.0fs' % args.duration}")
+
+    for w in workers:
+        w.start()
+    try:
+        start.wait()  # hết warmup
+    except threading.BrokenBarrierError:
+        pass
+    t0 = time.perf_counter()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    if stub:
+        stub.shutdown()
+    errors = [f"{w.name}: {w.error!r}" for w in workers if w.error]
+
+    endpoints = summarize(recorder, elapsed)
+    total = sum(e["count"] for e in endpoints.values())
+    report = {
+        "meta": {
+            "label": args.label,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git": git_meta(),
+            "args": vars(args),
+            "db": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "elapsed_s": round(elapsed, 3),
+            "errors": errors,
+        },
+        "total": {"count": total, "rps": round(total / elapsed, 2)},
+        "endpoints": endpoints,
+    }
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{args.label}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    print(f"{'endpoint':<16}{'n':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'q/req':>7}  status")
+    for name, e in endpoints.items():
+        print(f"{name:<16}{e['count']:>7}{e['rps']:>9.1f}{e['p50_ms']:>9.1f}{e['p95_ms']:>9.1f}"
+              f"{e['p99_ms']:>9.1f}{e['queries_mean']:>7.1f}  {e['status']}")
+    print(f"tổng {total} request / {elapsed:.1f}s = {report['total']['rps']} rps -> {out}")
+    for err in errors:
+        print("LỖI", err)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Sinh dữ liệu benchmark tất định (cùng --seed -> cùng dữ liệu).
+
+    python bench/seed.py --couriers 50 --orders 20000 --days 30 --roads 2000 --seed 42
+    python bench/seed.py --reset   # chỉ xoá dữ liệu bench cũ
+
+Tạo:
+  - bench_admin (staff, mật khẩu "bench") + N shipper bench_courier_<i> thuộc group NhanVien
+  - M đơn mã BENCH<seed>-<i>, toạ độ pickup/drop trong nội thành TP.HCM, trạng thái và
+    created_at/updated_at rải đều trong --days ngày gần nhất
+  - lịch sử chấm công: mỗi shipper 1 ca/ngày (một số ca qua nửa đêm), không còn ca mở
+  - Road: lưới đường giả quanh trung tâm (cần PostGIS)
+Sau đó dựng lại rollup hiệu suất (stats.rebuild) vì bulk_create không phát signal.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "deliverysys.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.contrib.auth.models import Group  # noqa: E402
+from django.contrib.gis.geos import LineString  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from orders.models import Attendance, Order, Road  # noqa: E402
+from orders.stats import rebuild  # noqa: E402
+from orders.tiles import bump_version  # noqa: E402
+
+User = get_user_model()
+
+PREFIX = "bench_"
+PASSWORD = "bench"
+CENTER = (10.7769, 106.7009)  # Q.1
+SPREAD = (0.09, 0.11)         # ~10-12 km mỗi phía
+STATUSES = (("new", 0.15), ("shipping", 0.2), ("done", 0.55), ("cancel", 0.1))
+HIGHWAYS = ("primary", "secondary", "tertiary", "residential", "residential", "service")
+STREETS = ("Lê Lợi", "Nguyễn Huệ", "Hai Bà Trưng", "Pasteur", "Điện Biên Phủ", "Cách Mạng Tháng 8",
+           "Võ Văn Tần", "Nguyễn Thị Minh Khai", "Trần Hưng Đạo", "Lý Thường Kiệt")
+NAMES = ("Nguyễn Văn An", "Trần Thị Bình", "Lê Văn Cường", "Phạm Thị Dung", "Hoàng Văn Em",
+         "Võ Thị Giang", "Đặng Văn Hùng", "Bùi Thị Lan")
+
+
+def point(rng):
+    return (round(CENTER[0] + rng.uniform(-SPREAD[0], SPREAD[0]), 6),
+            round(CENTER[1] + rng.uniform(-SPREAD[1], SPREAD[1]), 6))
+
+
+def address(rng):
+    return f"{rng.randint(1, 500)} {rng.choice(STREETS)}, Quận {rng.randint(1, 12)}, TP.HCM"
+
+
+def reset():
+    with transaction.atomic():
+        Order.objects.filter(code__startswith="BENCH").delete()
+        Road.objects.filter(name__startswith="Bench").delete()
+        n, _ = User.objects.filter(username__startswith=PREFIX).delete()  # kéo theo Attendance
+    return n
+
+
+def seed_users(n_couriers):
+    pw = make_password(PASSWORD)  # băm 1 lần, dùng chung
+    admin = User.objects.create(username=f"{PREFIX}admin", password=pw, is_staff=True)
+    couriers = User.objects.bulk_create([
+        User(username=f"{PREFIX}courier_{i}", password=pw) for i in range(1, n_couriers + 1)
+    ])
+    couriers = list(User.objects.filter(username__startswith=f"{PREFIX}courier_").order_by("id"))
+    group, _ = Group.objects.get_or_create(name="NhanVien")
+    User.groups.through.objects.bulk_create([
+        User.groups.through(user_id=u.id, group_id=group.id) for u in couriers
+    ])
+    return admin, couriers
+
+
+def _pick_status(rng):
+    r, acc = rng.random(), 0.0
+    for status, p in STATUSES:
+        acc += p
+        if r < acc:
+            return status
+    return STATUSES[-1][0]
+
+
+def seed_orders(rng, n, couriers, admin, days, seed, batch=5000):
+    now = timezone.now()
+    made = 0
+    while made < n:
+        objs, stamps = [], []
+        for i in range(made, min(made + batch, n)):
+            (plat, plng), (dlat, dlng) = point(rng), point(rng)
+            status = _pick_status(rng)
+            created = now - timedelta(seconds=rng.randint(0, days * 86400))
+            updated = min(now, created + timedelta(minutes=rng.randint(5, 600)))
+            objs.append(Order(
+                code=f"BENCH{seed}-{i}",
+                customer_name=rng.choice(NAMES),
+                phone=f"09{rng.randint(10000000, 99999999)}",
+                address=address(rng), pickup_address=address(rng), drop_address=address(rng),
+                pickup_lat=plat, pickup_lng=plng, drop_lat=dlat, drop_lng=dlng,
+                cod=rng.randrange(0, 2_000_000, 1000), status=status, created_by=admin,
+                assigned_to=None if status == "new" and rng.random() < 0.5 else rng.choice(couriers),
+            ))
+            stamps.append((created, updated))
+        with transaction.atomic():
+            Order.objects.bulk_create(objs, batch_size=2000)
+            # auto_now / auto_now_add ghi đè khi bulk_create -> đặt lại mốc thời gian bằng bulk_update
+            for o, (created, updated) in zip(objs, stamps):
+                o.created_at, o.updated_at = created, updated
+            Order.objects.bulk_update(objs, ["created_at", "updated_at"], batch_size=2000)
+        made += len(objs)
+        print(f"  đơn: {made}/{n}")
+
+
+def seed_attendance(rng, couriers, days):
+    today = timezone.localdate()
+    tz = timezone.get_current_timezone()
+    objs, stamps = [], []
+    for u in couriers:
+        for d in range(days, 0, -1):
+            if rng.random() < 0.15:
+                continue  # ngày nghỉ
+            day = today - timedelta(days=d)
+            start = timezone.make_aware(
+                timezone.datetime(day.year, day.month, day.day, rng.choice((6, 7, 8, 14, 18))), tz,
+            ) + timedelta(minutes=rng.randint(0, 59))
+            end = start + timedelta(hours=rng.uniform(4, 9))  # ca 18h có thể qua nửa đêm
+            objs.append(Attendance(employee=u, check_out=end))
+            stamps.append(start)
+    with transaction.atomic():
+        Attendance.objects.bulk_create(objs, batch_size=5000)
+        for a, start in zip(objs, stamps):
+            a.check_in = start
+        Attendance.objects.bulk_update(objs, ["check_in"], batch_size=5000)
+    return len(objs)
+
+
+def seed_roads(rng, n):
+    """Lưới đường đông-tây / bắc-nam, mỗi đường 6 điểm gấp khúc nhẹ."""
+    objs = []
+    for i in range(n):
+        horizontal = i % 2 == 0
+        lat0, lng0 = point(rng)
+        coords = []
+        for k in range(6):
+            step = 0.004 * k
+            jitter = rng.uniform(-0.0004, 0.0004)
+            lat, lng = (lat0 + jitter, lng0 + step) if horizontal else (lat0 + step, lng0 + jitter)
+            coords.append((lng, lat))
+        objs.append(Road(name=f"Bench {rng.choice(STREETS)} {i}", highway=rng.choice(HIGHWAYS),
+                         geom=LineString(coords, srid=4326)))
+    Road.objects.bulk_create(objs, batch_size=2000)
+    bump_version()  # bulk_create không phát signal -> bỏ tile cũ
+    return len(objs)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--couriers", type=int, default=50)
+    ap.add_argument("--orders", type=int, default=20000)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--roads", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--reset", action="store_true", help="chỉ xoá dữ liệu bench rồi thoát")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    print(f"xoá dữ liệu bench cũ: {reset()} dòng")
+    if args.reset:
+        return
+    rng = random.Random(args.seed)
+    admin, couriers = seed_users(args.couriers)
+    print(f"  user: 1 admin + {len(couriers)} shipper (mật khẩu '{PASSWORD}')")
+    seed_orders(rng, args.orders, couriers, admin, args.days, args.seed)
+    print(f"  ca làm: {seed_attendance(rng, couriers, args.days)}")
+    if args.roads:
+        print(f"  road: {seed_roads(rng, args.roads)}")
+    today = timezone.localdate()
+    print(f"  rollup: {rebuild(today - timedelta(days=args.days + 1), today)} dòng")
+    print(f"xong trong {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
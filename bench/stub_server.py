@@ -0,0 +1,142 @@
+"""
+Stub OSRM + Nominatim/Photon chạy local cho benchmark (không gọi dịch vụ công cộng).
+
+    python bench/stub_server.py --port 5005 --latency-ms 20
+    OSRM_URL=http://127.0.0.1:5005 python manage.py runserver
+
+Hỗ trợ:
+  - OSRM  /route/v1/<profile>/<lng,lat;lng,lat>  (đường thẳng, 30 km/h)
+          /table/v1/<profile>/<coords>           (ma trận haversine)
+          /nearest/v1/<profile>/<lng,lat>        (trả lại chính điểm đó)
+  - Nominatim /search?q=...  và Photon /api/?q=... (toạ độ tất định theo chuỗi, trong TP.HCM)
+Dùng được như module: start_stub(port=0) -> (server, base_url), chạy trong thread nền.
+"""
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+EARTH_R = 6371000.0
+SPEED_MPS = 30 / 3.6
+HCMC_BOX = {"W": 106.55, "E": 106.85, "S": 10.68, "N": 10.90}  # nội thành, đủ cho số liệu giả
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_R * math.asin(math.sqrt(a))
+
+
+def fake_point(q):
+    """Chuỗi -> (lat, lng) cố định trong HCMC_BOX."""
+    h = hashlib.md5(q.strip().lower().encode()).digest()
+    fx = int.from_bytes(h[:4], "big") / 2 ** 32
+    fy = int.from_bytes(h[4:8], "big") / 2 ** 32
+    return (HCMC_BOX["S"] + fy * (HCMC_BOX["N"] - HCMC_BOX["S"]),
+            HCMC_BOX["W"] + fx * (HCMC_BOX["E"] - HCMC_BOX["W"]))
+
+
+def _coords(raw):
+    """'lng,lat;lng,lat' -> [(lat, lng), ...]"""
+    out = []
+    for part in unquote(raw).split(";"):
+        lng, lat = part.split(",")[:2]
+        out.append((float(lat), float(lng)))
+    return out
+
+
+def osrm_route(points):
+    dist = sum(haversine(*a, *b) for a, b in zip(points, points[1:]))
+    return {
+        "code": "Ok",
+        "routes": [{
+            "distance": round(dist, 1),
+            "duration": round(dist / SPEED_MPS, 1),
+            "geometry": {"type": "LineString", "coordinates": [[lng, lat] for lat, lng in points]},
+            "legs": [],
+        }],
+        "waypoints": [{"location": [lng, lat]} for lat, lng in points],
+    }
+
+
+def osrm_table(points):
+    dist = [[round(haversine(*a, *b), 1) for b in points] for a in points]
+    return {
+        "code": "Ok",
+        "distances": dist,
+        "durations": [[round(d / SPEED_MPS, 1) for d in row] for row in dist],
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency_s = 0.0
+    protocol_version = "HTTP/1.1"  # keep-alive như OSRM thật
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        url = urlsplit(self.path)  # urlparse tách ";" thành params
+        qs = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        try:
+            if len(parts) == 4 and parts[0] in ("route", "table", "nearest") and parts[1] == "v1":
+                points = _coords(parts[3])
+                if parts[0] == "route":
+                    return self._json(osrm_route(points))
+                if parts[0] == "table":
+                    return self._json(osrm_table(points))
+                lat, lng = points[0]
+                return self._json({"code": "Ok", "waypoints": [{"location": [lng, lat], "distance": 0}]})
+            q = (qs.get("q") or [""])[0]
+            if parts == ["search"]:
+                lat, lng = fake_point(q)
+                return self._json([{"lat": str(lat), "lon": str(lng), "display_name": q}] if q else [])
+            if parts == ["api"]:
+                lat, lng = fake_point(q)
+                return self._json({"features": [{"geometry": {"coordinates": [lng, lat]}}] if q else []})
+        except (ValueError, IndexError):
+            return self._json({"code": "InvalidQuery", "message": "Tham số không hợp lệ"}, 400)
+        return self._json({"code": "InvalidUrl"}, 404)
+
+
+def start_stub(host="127.0.0.1", port=0, latency_ms=0):
+    """Chạy stub trong thread nền. Trả (server, base_url); dừng bằng server.shutdown()."""
+    handler = type("Handler", (StubHandler,), {"latency_s": latency_ms / 1000.0})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="bench-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5005)
+    ap.add_argument("--latency-ms", type=float, default=0, help="độ trễ giả lập mỗi request")
+    args = ap.parse_args()
+    server, url = start_stub(args.host, args.port, args.latency_ms)
+    print(f"stub OSRM/Nominatim tại {url} (Ctrl+C để dừng)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 import os
 from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'deliverysys.settings')
+# Push realtime (/orders/api/events/, SSE) cần ASGI để giữ hàng nghìn kết nối chờ
+# trên 1 event loop, vd: uvicorn deliverysys.asgi:application --workers 2
 application = get_asgi_application()
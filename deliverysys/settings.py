@@ -24,6 +24,8 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.humanize",
+    "django.contrib.gis",
+    "django.contrib.postgres",
     "rest_framework",
     "corsheaders",
     "django_filters",
@@ -34,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "orders.metrics.MetricsMiddleware",  # đầu tiên: đo cả các middleware phía sau
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -67,7 +70,7 @@ TEMPLATES = [
 # --- Database ---
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "django.contrib.gis.db.backends.postgis",
         "NAME": os.getenv("DB_NAME", "giaohang_django"),
         "USER": os.getenv("DB_USER", "postgres"),
         "PASSWORD": os.getenv("DB_PASSWORD", "postgres"),
@@ -76,6 +79,152 @@ DATABASES = {
     }
 }
 
+# --- Cache ---
+# Mặc định LocMem; production đặt CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# và CACHE_LOCATION=redis://... để các worker dùng chung.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "deliverysys"),
+    }
+}
+
+# --- Routing (OSRM) ---
+# OSRM_URL trỏ sang stub local khi test, vd. http://127.0.0.1:5005
+OSRM_URL = os.getenv("OSRM_URL", "https://router.project-osrm.org")
+OSRM_TIMEOUT = float(os.getenv("OSRM_TIMEOUT", "10"))
+ROUTE_CACHE = {
+    "ALIAS": "default",
+    "PRECISION": int(os.getenv("ROUTE_CACHE_PRECISION", "4")),  # 4 chữ số ~ 11 m
+    "TTL": int(os.getenv("ROUTE_CACHE_TTL", str(60 * 60 * 24))),
+    "LOCAL_MAXSIZE": int(os.getenv("ROUTE_CACHE_LOCAL_MAXSIZE", "2048")),
+}
+# Engine nội bộ dựng từ bảng Road (manage.py build_road_graph)
+ROUTING = {
+    "ENGINE": os.getenv("ROUTING_ENGINE", "osrm"),  # "local" để không gọi mạng
+    "GRAPH_PATH": os.getenv("ROUTING_GRAPH_PATH", str(BASE_DIR / "var" / "roadgraph.npz")),
+    "RELOAD_S": 60,  # worker kiểm tra file graph mới (sau build_road_graph) mỗi ngần này giây
+    "SPEEDS": {},  # ghi đè HIGHWAY_SPEEDS_KMH, vd. {"primary": 30}
+    "BATCH_WORKERS": int(os.getenv("ROUTING_BATCH_WORKERS", "8")),  # số lookup song song tối đa
+    "BATCH_LIMIT": 200,  # số đơn tối đa mỗi lần gọi /orders/routes/
+    # Tối ưu nhiều điểm (/orders/optimize/)
+    "DETOUR_FACTOR": 1.3,  # quãng đường thực tế / đường chim bay
+    "AVG_SPEED_KMH": 20,
+    "TABLE_MAX_POINTS": 100,  # giới hạn OSRM /table public
+    "OPTIMIZE_BUDGET_S": 0.8,
+    "OPTIMIZE_LIMIT": 300,
+}
+
+# --- Geocode (server-side, có cache) ---
+GEOCODER = {
+    "NOMINATIM_URL": os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org"),
+    "PHOTON_URL": os.getenv("PHOTON_URL", "https://photon.komoot.io"),
+    "USER_AGENT": "deliverysys",
+    "TIMEOUT": 8,
+    "NEGATIVE_TTL": 60 * 60 * 24 * 7,  # địa chỉ không tìm thấy: 7 ngày sau mới thử lại
+    "RATE": 1.0,  # lần gọi provider/giây mỗi tiến trình (Nominatim: tối đa 1 req/s)
+    "MAX_WAIT": 2.0,  # giây chờ lượt tối đa trong 1 request, quá thì trả 503
+}
+
+# --- Auto dispatch ---
+DISPATCH = {
+    "AUTO": os.getenv("DISPATCH_AUTO", "False") == "True",  # gán shipper ngay khi tạo đơn
+    "DEPOT": (10.776, 106.701),  # vị trí mặc định khi chưa biết shipper ở đâu
+    "CELL_DEG": 0.01,  # ô lưới ~1.1 km
+    "MAX_RING": 30,
+    "LOAD_PENALTY_KM": 1.5,  # mỗi đơn đang mở tương đương 1.5 km đường đi thêm
+    "MAX_LOAD": 20,
+    "REFRESH_S": 30,
+}
+
+# --- Realtime (SSE /orders/api/events/, chạy qua ASGI) ---
+REALTIME = {
+    # "orders.realtime.RedisBroker" khi chạy nhiều worker ASGI
+    "BACKEND": os.getenv("REALTIME_BACKEND", "orders.realtime.InProcessBroker"),
+    "REDIS_URL": os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0"),
+    "HEARTBEAT_S": 15,
+    "QUEUE_SIZE": 100,  # sự kiện chờ tối đa mỗi kết nối
+}
+
+TRACKING = {
+    "FLUSH_S": int(os.getenv("TRACKING_FLUSH_S", "5")),  # chu kỳ ghi bộ đệm GPS xuống DB
+    "FLUSH_SIZE": 5000,     # hoặc khi bộ đệm đủ số điểm này
+    "MAX_PENDING": 50000,   # DB lỗi: giữ tối đa ngần này điểm chờ ghi lại, quá thì bỏ điểm cũ nhất
+    "EPSILON_M": float(os.getenv("TRACKING_EPSILON_M", "10")),  # sai số Douglas-Peucker
+    "RING_SIZE": 32,        # số điểm gần nhất giữ trong bộ nhớ / shipper
+    "MAX_POINTS": 500,      # tối đa điểm mỗi request
+    "MAX_PING_AGE_S": 24 * 3600,  # điểm cũ hơn (lô gửi bù) hoặc mới hơn MAX_PING_AHEAD_S bị từ chối
+    "MAX_PING_AHEAD_S": 300,      # lệch giờ máy điện thoại
+    "SHIFT_CACHE_S": 60,
+}
+
+ORDER_MAP = {
+    "CLUSTER_MAX_ZOOM": 15,  # zoom nhỏ hơn -> gom cụm theo lưới
+    "CELL_PX": 64,           # kích thước ô lưới trên màn hình
+    "MAX_GRID": 64,          # tối đa 64 x 64 ô mỗi khung nhìn
+    "MAX_FEATURES": 2000,    # tối đa điểm lẻ mỗi response
+}
+
+SNAP = {
+    "MAX_DISTANCE_M": 200,  # xa hơn -> coi như không có đường, giữ toạ độ gốc
+    "CELL_DEG": 0.002,      # ô lưới của chỉ mục dự phòng trong bộ nhớ
+    "USE_DB": True,         # False: chỉ dùng road graph trong bộ nhớ
+    "MAX_POINTS": 100,
+}
+
+TILES = {
+    "CACHE_DIR": os.getenv("TILES_CACHE_DIR", str(BASE_DIR / "var" / "tiles")),
+    "CACHE_MAX_ZOOM": 18,   # zoom cao hơn: sinh tại chỗ, không ghi đĩa
+    "TOLERANCE_PX": 1.0,    # sai số đơn giản hoá (pixel)
+    "BUFFER": 0.05,         # lề cắt quanh tile (tỉ lệ cạnh tile)
+    "MVT_EXTENT": 4096,
+}
+
+STATS = {
+    "CACHE_ALIAS": "default",
+    "LEADERBOARD_TTL": 3600,      # khoảng ngày đã qua
+    "LEADERBOARD_TTL_LIVE": 60,   # khoảng có hôm nay
+}
+
+SYNC = {
+    "ETAG_WINDOW": 1000,    # ETag list API: đếm dòng nhật ký trong ngần này id cuối (bắt commit muộn)
+    "MAX_CHANGES": 500,     # dòng nhật ký tối đa mỗi lần /orders/api/sync/
+    "RETENTION_DAYS": 30,   # client lâu hơn không đồng bộ -> reset, tải lại toàn bộ
+}
+
+ATTENDANCE = {
+    "MAX_SHIFT_HOURS": 16,      # ca mở lâu hơn -> coi như quên check-out
+    "MAX_TIMESHEET_DAYS": 62,   # khoảng ngày tối đa của /orders/api/timesheet/
+}
+
+METRICS = {
+    "ENABLED": os.getenv("METRICS_ENABLED", "True") == "True",
+    "SLOW_MS": int(os.getenv("METRICS_SLOW_MS", "1000")),  # 0: tắt log request chậm
+    "SLOW_SAMPLE_RATE": 0.1,  # tỉ lệ request giữ văn bản SQL để in khi chậm
+    "SLOW_MAX_QUERIES": 10,
+    "SERVER_TIMING": DEBUG,   # header Server-Timing (db / http / app) cho DevTools
+}
+
+ETA = {
+    "PROFILE_PATH": os.getenv("ETA_PROFILE_PATH", str(BASE_DIR / "var" / "eta_profile.npz")),
+    "LEARN_DAYS": 60,          # manage.py build_eta_profile học từ ngần này ngày đơn done
+    "STOP_S": 180,             # thời gian dừng lấy / giao hàng mỗi điểm
+    "MIN_KMH": 5,              # chuyến có tốc độ ngoài khoảng này bị loại khi học
+    "MAX_KMH": 60,
+    "MAX_TRIP_S": 3 * 3600,
+    "PRIOR_TRIPS": 20,         # tốc độ mặc định có trọng số ngang ngần này chuyến
+    "DETOUR": 1.3,             # khi chưa có road graph: quãng đường / đường chim bay
+    "CELL_DEG": 0.01,          # ô lưới tỉ lệ loại đường (~1.1 km)
+    "POSITION_MAX_AGE_S": 900, # GPS cũ hơn -> không dùng vị trí shipper
+    "MAX_ORDERS": 2000,        # tối đa đơn mỗi lần /orders/api/eta/
+    "RELOAD_S": 60,            # worker kiểm tra file profile mới
+}
+
+PERMS = {
+    "CACHE_ALIAS": "default",
+    "ROLE_TTL": 300,  # cache tên group theo user (xoá ngay khi group thay đổi)
+}
+
 # --- i18n ---
 LANGUAGE_CODE = "vi"
 TIME_ZONE = "Asia/Ho_Chi_Minh"
@@ -97,15 +246,23 @@ LOGOUT_REDIRECT_URL = "/"
 # --- DRF / JWT ---
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
+        # Session đứng đầu để request chưa đăng nhập vẫn nhận 403 như trước (lớp đầu tiên quyết
+        # định 401 + WWW-Authenticate). App shipper gửi Bearer không kèm cookie nên bước session
+        # không chạm DB, rồi tới JWT.
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.tokens.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    "DEFAULT_THROTTLE_RATES": {"geocode": "30/min"},  # geocode_api ?q= (views.GeocodeThrottle)
 }
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=int(os.getenv("JWT_HOURS", "8"))),
 }
+AUTH_CLAIMS = {
+    "CACHE_ALIAS": "default",
+    "STATE_TTL": 60,  # giây: user bị khoá chậm nhất sau ngần này (signal xoá cache ngay nếu cùng cache)
+}
 
 # --- Email / Mailtrap ---
 EMAIL_BACKEND = os.getenv(
@@ -2,12 +2,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.shortcuts import render
 
+from orders.views import metrics_view
+
 def home(request):
     return render(request, "index.html")
 
 urlpatterns = [
     path("", home, name="home"),
     path("admin/", admin.site.urls),
+    path("metrics/", metrics_view, name="metrics"),  # Prometheus, chỉ staff
 
     # auth
     path("accounts/", include("accounts.urls")),
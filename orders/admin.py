@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import Order
+from .search import search_orders
 
 
 @admin.register(Order)
@@ -15,6 +17,10 @@ class OrderAdmin(admin.ModelAdmin):
         return format_html('<a href="/orders/{}/" target="_blank">Điều phối</a>', obj.id)
     map_link.short_description = "Map"
 
+    # Tìm kiếm không dấu qua index trigram thay vì icontains trên từng cột
+    def get_search_results(self, request, queryset, search_term):
+        return search_orders(queryset, search_term), False
+
     # Nhân viên chỉ thấy đơn của họ
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -29,8 +35,8 @@ class OrderAdmin(admin.ModelAdmin):
             ro.append("assigned_to")
         return ro
 
-    # Auto gán người tạo nếu chưa chọn
+    # Auto gán người tạo nếu chưa chọn (trừ khi bật auto dispatch: để trống cho dispatcher gán)
     def save_model(self, request, obj, form, change):
-        if not obj.assigned_to:
+        if not obj.assigned_to and not settings.DISPATCH.get("AUTO", False):
             obj.assigned_to = request.user
         super().save_model(request, obj, form, change)
@@ -3,3 +3,6 @@ class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
     verbose_name = 'Đơn hàng'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,279 @@
+"""
+Chấm công: check-in / check-out bằng 1 câu SQL, và bảng công (timesheet) tính trong DB.
+
+Check-in / check-out (PostgreSQL):
+  - check-in : INSERT ... ON CONFLICT (employee) WHERE check_out IS NULL DO NOTHING
+               (ràng buộc one_open_shift_per_employee quyết định ai thắng khi bấm trùng)
+  - check-out: UPDATE ... WHERE check_out IS NULL RETURNING
+  - Idempotency key (header Idempotency-Key của app mobile): gửi lại cùng key -> trả lại
+    kết quả lần trước thay vì báo lỗi "Đã check-in" / "Chưa check-in".
+    Lần gửi lại chạy song song với lần đầu: prev (snapshot lúc bắt đầu câu lệnh) rỗng, INSERT /
+    UPDATE chờ lần đầu commit rồi không ra dòng nào -> đọc lại theo key trước khi báo lỗi.
+Câu SQL không phát signal -> tự cộng rollup (stats) và báo dispatcher / shift_cache.
+
+Timesheet: giờ làm theo ngày + theo tuần (ISO, bắt đầu thứ Hai) của mọi nhân viên trong 1 query,
+ca qua nửa đêm được tách theo giờ địa phương (TIME_ZONE). Ca đang mở tính tới hiện tại nhưng
+không quá MAX_SHIFT_HOURS; close_stale_shifts() đóng hẳn các ca quên check-out.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import stats
+from .dispatch import dispatcher
+from .models import Attendance, CourierLocation
+from .tracking import shift_cache
+
+MAX_KEY_LENGTH = 64
+
+
+class AttendanceError(Exception):
+    pass
+
+
+def _conf(name, default):
+    return getattr(settings, "ATTENDANCE", {}).get(name, default)
+
+
+def max_shift():
+    return timedelta(hours=_conf("MAX_SHIFT_HOURS", 16))
+
+
+def _shift_changed(employee_ids):
+    # giống signal attendance_changed: danh sách shipper trong ca đã đổi
+    def notify():
+        dispatcher.mark_dirty()
+        for emp in employee_ids:
+            shift_cache.invalidate(emp)
+
+    transaction.on_commit(notify)
+
+
+# ---------- check-in / check-out ----------
+CHECK_IN_SQL = """
+WITH prev AS (
+    SELECT id, check_in, check_out FROM orders_attendance
+    WHERE employee_id = %(emp)s AND check_in_key = %(key)s
+), ins AS (
+    INSERT INTO orders_attendance (employee_id, check_in, check_in_key)
+    SELECT %(emp)s, %(now)s, %(key)s
+    WHERE NOT EXISTS (SELECT 1 FROM prev)
+    ON CONFLICT (employee_id) WHERE check_out IS NULL DO NOTHING
+    RETURNING id, check_in, check_out
+)
+SELECT true, id, check_in, check_out FROM ins
+UNION ALL
+SELECT false, id, check_in, check_out FROM prev
+"""
+
+CHECK_OUT_SQL = """
+WITH prev AS (
+    SELECT id, check_in, check_out FROM orders_attendance
+    WHERE employee_id = %(emp)s AND check_out_key = %(key)s
+), upd AS (
+    UPDATE orders_attendance SET check_out = GREATEST(%(now)s, check_in), check_out_key = %(key)s
+    WHERE employee_id = %(emp)s AND check_out IS NULL AND NOT EXISTS (SELECT 1 FROM prev)
+    RETURNING id, check_in, check_out
+)
+SELECT true, id, check_in, check_out FROM upd
+UNION ALL
+SELECT false, id, check_in, check_out FROM prev
+"""
+
+REPLAY_SQL = """
+SELECT false, id, check_in, check_out FROM orders_attendance
+WHERE employee_id = %(emp)s AND {column} = %(key)s
+"""
+
+
+def _row(created, att_id, check_in, check_out):
+    return {"id": att_id, "check_in": check_in, "check_out": check_out, "replayed": not created}
+
+
+def _clean_key(key):
+    # key lấy từ body JSON có thể là số / object: số thì đổi ra chuỗi, còn lại báo lỗi 400
+    if key is None:
+        return None
+    if isinstance(key, bool) or not isinstance(key, (str, int)):
+        raise AttendanceError("Idempotency key phải là chuỗi.")
+    key = str(key).strip() or None
+    if key and len(key) > MAX_KEY_LENGTH:
+        raise AttendanceError(f"Idempotency key tối đa {MAX_KEY_LENGTH} ký tự.")
+    return key
+
+
+def check_in(employee_id, key=None):
+    """Mở ca. Trả dict {id, check_in, check_out, replayed}; AttendanceError nếu đang có ca mở."""
+    key = _clean_key(key)
+    if connection.vendor != "postgresql":
+        return _check_in_orm(employee_id, key)
+    with transaction.atomic(), connection.cursor() as cur:
+        params = {"emp": employee_id, "key": key, "now": timezone.now()}
+        cur.execute(CHECK_IN_SQL, params)
+        row = cur.fetchone()
+        if row is None and key:
+            cur.execute(REPLAY_SQL.format(column="check_in_key"), params)
+            row = cur.fetchone()
+        if row and row[0]:
+            _shift_changed([employee_id])
+    if row is None:
+        raise AttendanceError("Đã check-in.")
+    return _row(*row)
+
+
+def check_out(employee_id, key=None):
+    """Đóng ca đang mở. AttendanceError nếu chưa check-in."""
+    key = _clean_key(key)
+    if connection.vendor != "postgresql":
+        return _check_out_orm(employee_id, key)
+    with transaction.atomic(), connection.cursor() as cur:
+        params = {"emp": employee_id, "key": key, "now": timezone.now()}
+        cur.execute(CHECK_OUT_SQL, params)
+        row = cur.fetchone()
+        if row is None and key:
+            cur.execute(REPLAY_SQL.format(column="check_out_key"), params)
+            row = cur.fetchone()
+        if row and row[0]:
+            _created, _id, ci, co = row
+            stats.apply_shift_change((employee_id, ci, None), (employee_id, ci, co))
+            _shift_changed([employee_id])
+    if row is None:
+        raise AttendanceError("Chưa check-in.")
+    return _row(*row)
+
+
+# CSDL khác PostgreSQL: cùng kết quả qua ORM (nhiều query hơn, signal lo phần rollup / cache)
+_ROW_FIELDS = ("id", "check_in", "check_out")
+
+
+def _check_in_orm(employee_id, key):
+    if key:
+        prev = Attendance.objects.filter(employee_id=employee_id, check_in_key=key).values_list(*_ROW_FIELDS).first()
+        if prev:
+            return _row(False, *prev)
+    try:
+        with transaction.atomic():
+            a = Attendance.objects.create(employee_id=employee_id, check_in_key=key)
+    except IntegrityError:
+        raise AttendanceError("Đã check-in.")
+    return _row(True, a.id, a.check_in, a.check_out)
+
+
+def _check_out_orm(employee_id, key):
+    if key:
+        prev = Attendance.objects.filter(employee_id=employee_id, check_out_key=key).values_list(*_ROW_FIELDS).first()
+        if prev:
+            return _row(False, *prev)
+    a = Attendance.objects.filter(employee_id=employee_id, check_out__isnull=True).first()
+    if a is None:
+        raise AttendanceError("Chưa check-in.")
+    a.check_out, a.check_out_key = timezone.now(), key
+    a.save(update_fields=["check_out", "check_out_key"])
+    return _row(True, a.id, a.check_in, a.check_out)
+
+
+def close_stale_shifts(now=None):
+    """
+    Đóng các ca mở quá MAX_SHIFT_HOURS (quên check-out): giờ ra = điểm GPS cuối của ca
+    nếu có, không thì check_in + MAX_SHIFT_HOURS. Trả list (id, employee_id, check_in, check_out).
+    """
+    now = now or timezone.now()
+    limit = max_shift()
+    with transaction.atomic():
+        stale = list(
+            Attendance.objects.select_for_update(skip_locked=True)
+            .filter(check_out__isnull=True, check_in__lt=now - limit)
+            .values_list("id", "employee_id", "check_in")
+        )
+        if not stale:
+            return []
+        last_ping = dict(
+            CourierLocation.objects.filter(attendance_id__in=[s[0] for s in stale])
+            .values("attendance_id").annotate(t=Max("recorded_at")).values_list("attendance_id", "t")
+        )
+        closed = []
+        for att_id, emp, ci in stale:
+            co = min(max(last_ping.get(att_id) or ci + limit, ci), ci + limit)
+            Attendance.objects.filter(pk=att_id, check_out__isnull=True).update(check_out=co)
+            stats.apply_shift_change((emp, ci, None), (emp, ci, co))
+            closed.append((att_id, emp, ci, co))
+        _shift_changed({c[1] for c in closed})
+    return closed
+
+
+# ---------- timesheet ----------
+TIMESHEET_SQL = """
+WITH s AS (
+    SELECT a.employee_id,
+           a.check_in AT TIME ZONE %(tz)s AS ci,
+           COALESCE(a.check_out, LEAST(%(now)s, a.check_in + %(max)s)) AT TIME ZONE %(tz)s AS co
+    FROM orders_attendance a
+    WHERE a.check_in < %(end)s
+      AND COALESCE(a.check_out, %(now)s) > %(start)s
+      {employee_filter}
+), d AS (
+    SELECT s.employee_id, g.day::date AS day, date_trunc('week', g.day)::date AS week,
+           GREATEST(s.ci, g.day) AS a,
+           LEAST(s.co, g.day + interval '1 day') AS b
+    FROM s
+    CROSS JOIN LATERAL generate_series(date_trunc('day', s.ci), date_trunc('day', s.co), interval '1 day') AS g(day)
+    WHERE s.co > s.ci
+)
+SELECT employee_id, week, day,
+       SUM(EXTRACT(EPOCH FROM b - a))::bigint AS seconds
+FROM d
+WHERE b > a AND day BETWEEN %(d0)s AND %(d1)s
+GROUP BY GROUPING SETS ((employee_id, week, day), (employee_id, week))
+ORDER BY employee_id, week, day NULLS FIRST
+"""
+
+
+def timesheet(day_from, day_to, employee_ids=None, now=None):
+    """
+    Giờ làm trong [day_from, day_to] (ngày địa phương) -> {employee_id: {"days": {ngày: giây},
+    "weeks": {thứ Hai đầu tuần: giây}, "total": giây}}. Tuần chỉ cộng phần nằm trong khoảng.
+    """
+    now = now or timezone.now()
+    start, end = stats.day_bounds(day_from)[0], stats.day_bounds(day_to)[1]
+    params = {
+        "tz": str(timezone.get_current_timezone()), "now": now, "max": max_shift(),
+        "start": start, "end": end, "d0": day_from, "d1": day_to,
+    }
+    out = {}
+
+    def emp_entry(emp):
+        return out.setdefault(emp, {"days": {}, "weeks": {}, "total": 0})
+
+    if connection.vendor == "postgresql":
+        employee_filter = ""
+        if employee_ids:
+            employee_filter = "AND a.employee_id = ANY(%(emps)s)"
+            params["emps"] = list(employee_ids)
+        with connection.cursor() as cur:
+            cur.execute(TIMESHEET_SQL.format(employee_filter=employee_filter), params)
+            for emp, week, day, sec in cur.fetchall():
+                e = emp_entry(emp)
+                if day is None:
+                    e["weeks"][week] = sec
+                    e["total"] += sec
+                else:
+                    e["days"][day] = sec
+        return out
+
+    # CSDL khác: tách ca trong Python bằng stats.split_by_day
+    qs = Attendance.objects.filter(check_in__lt=end).exclude(check_out__lte=start)
+    if employee_ids:
+        qs = qs.filter(employee_id__in=employee_ids)
+    for emp, ci, co in qs.values_list("employee_id", "check_in", "check_out").iterator():
+        co = co or min(now, ci + params["max"])
+        for day, sec in stats.split_by_day(ci, co):
+            if day_from <= day <= day_to and sec > 0:
+                e = emp_entry(emp)
+                week = day - timedelta(days=day.weekday())
+                e["days"][day] = e["days"].get(day, 0) + sec
+                e["weeks"][week] = e["weeks"].get(week, 0) + sec
+                e["total"] += sec
+    return out
@@ -0,0 +1,278 @@
+"""
+Nhập / xuất đơn hàng số lượng lớn (CSV hoặc NDJSON), xử lý theo dòng chảy.
+
+Import: đọc file từng dòng -> gom chunk -> kiểm tra dữ liệu -> kiểm tra trùng `code`
+bằng 1 query/chunk -> bulk_create trong 1 transaction/chunk. Lỗi được báo theo dòng,
+dòng hỏng không làm hỏng cả chunk. File hỏng giữa chừng (sai encoding, CSV lỗi cú pháp)
+dừng đọc tại đó và báo ở "file_error"; các dòng trước đó vẫn được nhập.
+Export: queryset.iterator(chunk_size=...) -> generator, không nạp hết vào bộ nhớ.
+"""
+import csv
+import json
+import math
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, IntegrityError, transaction
+
+from . import sync
+from .models import Order
+from .snap import snap_orders
+from .stats import record_orders
+
+IMPORT_FIELDS = (
+    "code", "customer_name", "address",
+    "pickup_address", "pickup_lat", "pickup_lng",
+    "drop_address", "drop_lat", "drop_lng",
+    "phone", "cod", "status", "assigned_to",
+)
+EXPORT_FIELDS = IMPORT_FIELDS[:-1] + ("assigned_to__username", "created_at", "updated_at")
+
+_STATUSES = {k for k, _ in Order.STATUS_CHOICES}
+_COORD_RANGE = {"pickup_lat": 90, "pickup_lng": 180, "drop_lat": 90, "drop_lng": 180}
+MAX_COD = 2147483647  # PositiveIntegerField = int4
+_MAX_LEN = {
+    f.name: f.max_length
+    for f in Order._meta.get_fields()
+    if getattr(f, "max_length", None) and f.name in IMPORT_FIELDS
+}
+
+
+# ---------- đọc file ----------
+class _BadEncoding(Exception):
+    pass
+
+
+def _decode_lines(fileobj, encoding):
+    """Giải mã từng dòng: lỗi encoding chỉ chặn từ dòng hỏng trở đi."""
+    for n, raw in enumerate(fileobj, 1):
+        try:
+            yield raw.decode(encoding)
+        except UnicodeDecodeError as e:
+            raise _BadEncoding(f"Dòng {n} của file không phải {encoding}: {e.reason}") from e
+
+
+def iter_records(fileobj, fmt="csv", encoding="utf-8-sig"):
+    """
+    Sinh dict cho từng dòng; fileobj là file nhị phân (upload hoặc open(..., 'rb')).
+    Không đọc tiếp được -> sinh {"__fatal__": lý do} rồi dừng.
+    """
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+    text = _decode_lines(fileobj, encoding)
+    try:
+        if fmt == "csv":
+            yield from csv.DictReader(text)
+            return
+        for line in text:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError as e:
+                rec = {"__error__": f"JSON không hợp lệ: {e}"}
+            yield rec if isinstance(rec, dict) else {"__error__": "Mỗi dòng phải là 1 object"}
+    except _BadEncoding as e:
+        yield {"__fatal__": str(e)}
+    except csv.Error as e:
+        yield {"__fatal__": f"CSV không hợp lệ: {e}"}
+
+
+# ---------- kiểm tra ----------
+def _clean(rec):
+    """Trả (dict đã chuẩn hoá, dict lỗi)."""
+    if "__error__" in rec:
+        return None, {"__all__": rec["__error__"]}
+    data, errors = {}, {}
+    for name in IMPORT_FIELDS:
+        v = rec.get(name)
+        if isinstance(v, str):
+            v = v.strip()
+        if v in ("", None):
+            v = None
+        data[name] = v
+
+    if not data["code"]:
+        errors["code"] = "Bắt buộc."
+    if not data["customer_name"]:
+        errors["customer_name"] = "Bắt buộc."
+    for name, n in _MAX_LEN.items():
+        if data[name] is not None and len(str(data[name])) > n:
+            errors[name] = f"Tối đa {n} ký tự."
+    for name, limit in _COORD_RANGE.items():
+        if data[name] is not None:
+            try:
+                data[name] = float(data[name])
+            except (TypeError, ValueError):
+                errors[name] = "Phải là số."
+                continue
+            if not (math.isfinite(data[name]) and -limit <= data[name] <= limit):
+                errors[name] = f"Phải trong khoảng -{limit}..{limit}."
+    try:
+        data["cod"] = int(data["cod"] or 0)
+        if data["cod"] < 0:
+            errors["cod"] = "Không được âm."
+        elif data["cod"] > MAX_COD:
+            errors["cod"] = f"Tối đa {MAX_COD}."
+    except (TypeError, ValueError, OverflowError):
+        errors["cod"] = "Phải là số nguyên."
+    data["status"] = data["status"] or "new"
+    if data["status"] not in _STATUSES:
+        errors["status"] = f"Phải thuộc {sorted(_STATUSES)}."
+    for name in ("address", "pickup_address", "drop_address", "phone"):
+        data[name] = data[name] or ""
+    return data, errors
+
+
+def _chunks(it, size):
+    buf = []
+    for i, rec in enumerate(it, 1):
+        buf.append((i, rec))
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+# ---------- import ----------
+def _bulk_insert(objs, batch_size):
+    orders = [o for _, o in objs]
+    for o in orders:
+        # lần thử trước bị rollback có thể đã gán pk cho 1 phần batch
+        o.pk = None
+        o._state.adding = True
+    with transaction.atomic():
+        Order.objects.bulk_create(orders, batch_size=batch_size)
+        record_orders(orders)  # bulk_create không phát post_save
+        sync.record_orders(orders)
+
+
+def _insert_each(objs, fail):
+    """Chèn từng dòng (savepoint riêng, signal lo rollup + nhật ký sync); dòng lỗi báo theo dòng."""
+    created = []
+    for row, o in objs:
+        o.pk = None
+        o._state.adding = True
+        try:
+            with transaction.atomic():
+                o.save(force_insert=True)
+        except DatabaseError as e:
+            fail(row, o.code, {"__all__": f"Không lưu được: {e}"})
+            continue
+        created.append((row, o))
+    return created
+
+
+def import_orders(records, created_by=None, chunk_size=2000, dry_run=False, max_errors=1000, progress=None):
+    """
+    records: iterable dict (xem iter_records). Trả báo cáo:
+    {"rows", "created", "failed", "errors": [{"row", "code", "errors"}], "file_error": {"row", "error"} | None}
+    """
+    User = get_user_model()
+    report = {"rows": 0, "created": 0, "failed": 0, "errors": [], "file_error": None}
+    seen = set()
+
+    def fail(row, code, errs):
+        report["failed"] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({"row": row, "code": code, "errors": errs})
+
+    for chunk in _chunks(records, chunk_size):
+        cleaned = []
+        for row, rec in chunk:
+            if "__fatal__" in rec:
+                report["file_error"] = {"row": row, "error": rec["__fatal__"]}
+                continue
+            report["rows"] += 1
+            data, errs = _clean(rec)
+            if errs:
+                fail(row, (rec or {}).get("code"), errs)
+                continue
+            if data["code"] in seen:
+                fail(row, data["code"], {"code": "Trùng mã trong file."})
+                continue
+            seen.add(data["code"])
+            cleaned.append((row, data))
+
+        # 1 query cho cả chunk: mã đã tồn tại + người nhận
+        codes = [d["code"] for _, d in cleaned]
+        existing = set(Order.objects.filter(code__in=codes).values_list("code", flat=True))
+        names = {str(d["assigned_to"]) for _, d in cleaned if d["assigned_to"] is not None}
+        users = dict(User.objects.filter(username__in=names).values_list("username", "id"))
+        ids = {int(n) for n in names if n.isdigit() and n not in users}
+        if ids:
+            users.update({str(i): i for i in User.objects.filter(id__in=ids).values_list("id", flat=True)})
+
+        objs = []
+        for row, d in cleaned:
+            if d["code"] in existing:
+                fail(row, d["code"], {"code": "Mã đơn đã tồn tại."})
+                continue
+            assignee = d.pop("assigned_to")
+            if assignee is not None and str(assignee) not in users:
+                fail(row, d["code"], {"assigned_to": "Không tìm thấy nhân viên."})
+                continue
+            objs.append((row, Order(
+                **d,
+                assigned_to_id=users[str(assignee)] if assignee is not None else None,
+                created_by=created_by,
+            )))
+
+        if objs and not dry_run:
+            snap_orders([o for _, o in objs])  # bulk_create không phát pre_save -> bám đường 1 query/chunk
+            try:
+                _bulk_insert(objs, chunk_size)
+            except IntegrityError:
+                # có request khác tạo trùng mã giữa chừng -> kiểm tra lại và chèn phần còn lại
+                taken = set(Order.objects.filter(code__in=[o.code for _, o in objs]).values_list("code", flat=True))
+                for row, o in objs:
+                    if o.code in taken:
+                        fail(row, o.code, {"code": "Mã đơn đã tồn tại."})
+                objs = [(row, o) for row, o in objs if o.code not in taken]
+                try:
+                    _bulk_insert(objs, chunk_size)
+                except DatabaseError:
+                    # vẫn lỗi (lại trùng mã, ràng buộc khác): chèn từng dòng để biết dòng nào hỏng
+                    objs = _insert_each(objs, fail)
+            except DatabaseError:
+                # lỗi dữ liệu khác (DataError...): chèn từng dòng, chỉ dòng hỏng bị báo lỗi
+                objs = _insert_each(objs, fail)
+        report["created"] += len(objs)
+        if progress:
+            progress(report)
+    return report
+
+
+# ---------- export ----------
+class _Echo:
+    """File giả cho csv.writer: write() trả lại chuỗi thay vì ghi."""
+
+    def write(self, value):
+        return value
+
+
+def export_orders(queryset, fmt="csv", chunk_size=2000):
+    """Generator các khối text (CSV hoặc NDJSON) cho StreamingHttpResponse / file."""
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+    rows = queryset.order_by("id").values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    header = [f.replace("assigned_to__username", "assigned_to") for f in EXPORT_FIELDS]
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        encode = writer.writerow
+        yield "\ufeff" + encode(header)  # BOM để Excel đọc đúng tiếng Việt
+    else:
+        def encode(r):
+            return json.dumps(dict(zip(header, r)), cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+    # gộp nhiều dòng mỗi lần yield để giảm số lần ghi socket
+    buf = []
+    for r in rows:
+        buf.append(encode(r))
+        if len(buf) >= 500:
+            yield "".join(buf)
+            buf = []
+    if buf:
+        yield "".join(buf)
@@ -0,0 +1,247 @@
+"""
+Tự động gán đơn cho shipper đang trong ca (Attendance.check_out IS NULL).
+
+Trạng thái shipper (vị trí + số đơn đang mở) giữ trong bộ nhớ, đánh chỉ mục
+bằng lưới đều (GridIndex) để tìm shipper gần nhất mà không quét cả danh sách.
+Điểm = khoảng cách (km) + LOAD_PENALTY_KM * số đơn đang mở; shipper đủ
+MAX_LOAD đơn bị bỏ qua. Trạng thái được nạp lại khi quá REFRESH_S giây hoặc
+khi có ca mở/đóng.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Attendance, Order
+from .realtime import publish_order_event
+from .routing import _hav
+from . import sync
+
+OPEN_STATUSES = ("new", "shipping")
+
+
+def _conf(name, default):
+    return getattr(settings, "DISPATCH", {}).get(name, default)
+
+
+@dataclass
+class CourierState:
+    user_id: int
+    lat: float
+    lng: float
+    load: int = 0
+
+
+class GridIndex:
+    """Chỉ mục lưới cho điểm (lat, lng); cell ~ cell_deg độ."""
+
+    def __init__(self, cell_deg=0.01):
+        self.cell = cell_deg
+        self.cells = defaultdict(set)
+        self.where = {}
+
+    def _key(self, lat, lng):
+        return int(math.floor(lat / self.cell)), int(math.floor(lng / self.cell))
+
+    def add(self, key, lat, lng):
+        self.remove(key)
+        k = self._key(lat, lng)
+        self.cells[k].add(key)
+        self.where[key] = k
+
+    def remove(self, key):
+        k = self.where.pop(key, None)
+        if k is not None:
+            self.cells[k].discard(key)
+
+    def rings(self, lat, lng, max_ring):
+        """Sinh các tập key theo vòng lưới tăng dần quanh (lat, lng)."""
+        ci, cj = self._key(lat, lng)
+        for r in range(max_ring + 1):
+            found = []
+            for i in range(ci - r, ci + r + 1):
+                for j in range(cj - r, cj + r + 1):
+                    if max(abs(i - ci), abs(j - cj)) == r:
+                        found.extend(self.cells.get((i, j), ()))
+            yield r, found
+
+
+class Dispatcher:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.couriers: dict[int, CourierState] = {}
+        self.index = GridIndex(_conf("CELL_DEG", 0.01))
+        self.loaded_at = 0.0
+        self.dirty = True
+
+    # ---------- state ----------
+    def refresh(self, force=False):
+        with self.lock:
+            if not force and not self.dirty and time.monotonic() - self.loaded_at < _conf("REFRESH_S", 30):
+                return
+            on_shift = set(Attendance.objects.filter(check_out__isnull=True).values_list("employee_id", flat=True))
+            loads = dict(
+                Order.objects.filter(assigned_to_id__in=on_shift, status__in=OPEN_STATUSES)
+                .values_list("assigned_to_id").annotate(n=Count("id")).values_list("assigned_to_id", "n")
+            )
+            positions = self._last_positions(on_shift)
+            depot = _conf("DEPOT", (10.776, 106.701))
+
+            self.couriers = {}
+            self.index = GridIndex(_conf("CELL_DEG", 0.01))
+            for uid in on_shift:
+                lat, lng = positions.get(uid, depot)
+                self.couriers[uid] = CourierState(uid, lat, lng, loads.get(uid, 0))
+                self.index.add(uid, lat, lng)
+            self.loaded_at = time.monotonic()
+            self.dirty = False
+
+    def _last_positions(self, user_ids):
+        """
+        Vị trí của shipper: điểm GPS mới nhất nếu có, nếu không thì điểm đến
+        của đơn cập nhật gần nhất (đang giao -> drop, còn lại -> pickup/drop tuỳ trạng thái).
+        """
+        pos = {}
+        rows = (
+            Order.objects.filter(assigned_to_id__in=user_ids)
+            .exclude(Q(drop_lat=None) & Q(pickup_lat=None))
+            .order_by("assigned_to_id", "-updated_at")
+            .values_list("assigned_to_id", "status", "pickup_lat", "pickup_lng", "drop_lat", "drop_lng")
+        )
+        if connection.features.can_distinct_on_fields:
+            rows = rows.distinct("assigned_to_id")
+        for uid, status, plat, plng, dlat, dlng in rows:
+            if uid in pos:
+                continue
+            if status == "new" and plat is not None:
+                pos[uid] = (plat, plng)
+            elif dlat is not None:
+                pos[uid] = (dlat, dlng)
+            else:
+                pos[uid] = (plat, plng)
+        # có GPS thật (orders.tracking) thì ưu tiên
+        from .tracking import location_buffer
+
+        for uid in user_ids:
+            last = location_buffer.last(uid)
+            if last:
+                pos[uid] = (last[-1].lat, last[-1].lng)
+        return pos
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def set_position(self, user_id, lat, lng):
+        with self.lock:
+            c = self.couriers.get(user_id)
+            if c is None:
+                return
+            c.lat, c.lng = lat, lng
+            self.index.add(user_id, lat, lng)
+
+    # ---------- chọn shipper ----------
+    def score(self, c: CourierState, lat, lng):
+        return _hav(lat, lng, c.lat, c.lng) / 1000 + _conf("LOAD_PENALTY_KM", 1.5) * c.load
+
+    def best_courier(self, lat, lng) -> CourierState | None:
+        max_load = _conf("MAX_LOAD", 20)
+        penalty = _conf("LOAD_PENALTY_KM", 1.5)
+        ring_km = self.index.cell * 111.0 * math.cos(math.radians(lat))
+        best, best_score = None, math.inf
+        for r, keys in self.index.rings(lat, lng, _conf("MAX_RING", 30)):
+            for uid in keys:
+                c = self.couriers[uid]
+                if c.load >= max_load:
+                    continue
+                sc = self.score(c, lat, lng)
+                if sc < best_score:
+                    best, best_score = c, sc
+            # shipper ở vòng sau cách ít nhất r * ring_km; load >= 0 nên không thể tốt hơn
+            if best is not None and r * ring_km >= best_score:
+                break
+        if best is None:
+            # không ai trong bán kính: lấy người ít việc nhất
+            free = [c for c in self.couriers.values() if c.load < max_load]
+            best = min(free, key=lambda c: (c.load * penalty, c.user_id), default=None)
+        return best
+
+    # ---------- gán ----------
+    def assign(self, order: Order) -> int | None:
+        """Gán một đơn mới; trả user_id hoặc None nếu không có ai trong ca."""
+        if order.assigned_to_id or order.status != "new":
+            return order.assigned_to_id
+        self.refresh()
+        lat = order.pickup_lat if order.pickup_lat is not None else order.drop_lat
+        lng = order.pickup_lng if order.pickup_lng is not None else order.drop_lng
+        with self.lock:
+            if lat is None:
+                c = min(self.couriers.values(), key=lambda c: (c.load, c.user_id), default=None)
+            else:
+                c = self.best_courier(lat, lng)
+            if c is None:
+                return None
+            # chỉ gán nếu vẫn chưa ai nhận (tránh ghi đè gán tay đồng thời)
+            with transaction.atomic():
+                if not Order.objects.filter(pk=order.pk, assigned_to__isnull=True).update(
+                        assigned_to_id=c.user_id, updated_at=timezone.now()):
+                    return None
+                sync.record([("upsert", order.pk, c.user_id, None)])  # update() không phát post_save
+            c.load += 1
+        order.assigned_to_id = c.user_id
+        # update() không phát post_save -> tự đẩy sự kiện realtime
+        publish_order_event("updated", order.pk, "new", c.user_id, code=order.code)
+        return c.user_id
+
+    def rebalance(self, limit=None) -> dict:
+        """
+        Gán hàng loạt toàn bộ đơn "new" chưa có người nhận.
+        Trả {user_id: [order_id, ...]} gồm các đơn thực sự được gán; mỗi shipper 1 câu UPDATE.
+        """
+        self.refresh(force=True)
+        qs = (
+            Order.objects.filter(status="new", assigned_to__isnull=True)
+            .order_by("created_at")
+            .values_list("id", "pickup_lat", "pickup_lng", "drop_lat", "drop_lng")
+        )
+        if limit:
+            qs = qs[:limit]
+        plan = defaultdict(list)
+        with self.lock:
+            for oid, plat, plng, dlat, dlng in qs.iterator(chunk_size=2000):
+                lat, lng = (plat, plng) if plat is not None else (dlat, dlng)
+                if lat is None:
+                    c = min(self.couriers.values(), key=lambda c: (c.load, c.user_id), default=None)
+                else:
+                    c = self.best_courier(lat, lng)
+                if c is None:
+                    break
+                c.load += 1
+                plan[c.user_id].append(oid)
+            assigned = {}
+            for uid, ids in plan.items():
+                with transaction.atomic():
+                    # khoá các đơn vẫn chưa ai nhận; đơn vừa bị gán tay giữa chừng bị bỏ qua
+                    got = list(
+                        Order.objects.select_for_update()
+                        .filter(id__in=ids, assigned_to__isnull=True)
+                        .values_list("id", flat=True)
+                    )
+                    if got:
+                        Order.objects.filter(id__in=got).update(assigned_to_id=uid, updated_at=timezone.now())
+                        sync.record(("upsert", oid, uid, None) for oid in got)
+                if len(got) != len(ids):
+                    self.couriers[uid].load -= len(ids) - len(got)
+                if got:
+                    assigned[uid] = got
+                for oid in got:
+                    publish_order_event("updated", oid, "new", uid)
+        return assigned
+
+
+dispatcher = Dispatcher()
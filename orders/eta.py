@@ -0,0 +1,401 @@
+"""
+Dự đoán thời gian giao (ETA) theo tốc độ từng loại đường x giờ trong tuần, không gọi OSRM.
+
+Speed profile (file .npz, manage.py build_eta_profile):
+  speed_kmh[C, 168]   tốc độ theo loại đường (routing.HIGHWAY_CLASSES) x giờ trong tuần
+                      (thứ Hai 0h = 0, giờ địa phương)
+  detour              quãng đường thực / đường chim bay (học từ tuyến trên road graph)
+  trip_mix[C]         tỉ lệ quãng đường trên mỗi loại đường của 1 chuyến trung bình
+  grid_mix[ny, nx, C] trip_mix chỉnh theo mạng đường từng ô lưới (khu hẻm nhỏ vs đại lộ)
+Học từ đơn "done": 2 đơn liên tiếp của cùng shipper trong cùng 1 ca (Attendance) cho 1 chuyến
+drop trước -> pickup -> drop, thời gian = chênh lệch updated_at trừ thời gian dừng (STOP_S mỗi
+điểm). Quãng đường theo loại đường lấy từ tuyến A* trên road graph. Giải bình phương tối thiểu
+có ridge theo tầng: toàn cục (kéo về HIGHWAY_SPEEDS_KMH) -> giờ trong ngày -> giờ trong tuần,
+nên giờ ít dữ liệu vẫn có tốc độ hợp lý.
+
+Dự đoán: 1 lượt numpy cho mọi đơn. Đơn "shipping" có vị trí shipper -> shipper -> drop;
+"new" đã gán -> shipper -> pickup -> drop; còn lại pickup -> drop. ETA coi đơn là điểm dừng
+kế tiếp của shipper (không xếp hàng nhiều đơn).
+"""
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from bisect import bisect_right
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Attendance, CourierLocation, Order
+from .routing import DEFAULT_SPEED_KMH, HIGHWAY_CLASSES, HIGHWAY_SPEEDS_KMH, get_graph, haversine_m, highway_class
+from .stats import day_bounds
+
+logger = logging.getLogger(__name__)
+
+HOURS = 7 * 24
+ACTIVE_STATUSES = ("new", "shipping")
+OTHER = highway_class(None)
+
+
+def _conf(name, default):
+    return getattr(settings, "ETA", {}).get(name, default)
+
+
+def hour_of_week(dt):
+    local = timezone.localtime(dt)
+    return local.weekday() * 24 + local.hour
+
+
+def _prior_speeds():
+    speeds = {**HIGHWAY_SPEEDS_KMH, **getattr(settings, "ROUTING", {}).get("SPEEDS", {})}
+    return np.array([speeds.get(h, DEFAULT_SPEED_KMH) for h in HIGHWAY_CLASSES], dtype=np.float64)
+
+
+# ---------- profile ----------
+class SpeedProfile:
+    def __init__(self, speed_kmh, samples, detour, trip_mix, grid_mix=None, grid_origin=(0.0, 0.0),
+                 cell_deg=0.01, built_at=0.0, trips=0):
+        self.speed_kmh = np.asarray(speed_kmh, dtype=np.float32)
+        self.samples = np.asarray(samples, dtype=np.int32)
+        self.detour = float(detour)
+        self.trip_mix = np.asarray(trip_mix, dtype=np.float32)
+        self.grid_mix = None if grid_mix is None else np.asarray(grid_mix, dtype=np.float16)
+        self.grid_origin = tuple(float(v) for v in grid_origin)
+        self.cell_deg = float(cell_deg)
+        self.built_at = float(built_at)
+        self.trips = int(trips)
+        # giây / mét, xếp [giờ, loại đường] để lấy theo giờ bằng 1 lần index
+        self.pace_by_hour = (3.6 / self.speed_kmh.astype(np.float64)).T
+
+    @classmethod
+    def default(cls):
+        """Chưa học: tốc độ mặc định theo loại đường, không đổi theo giờ, mọi chuyến là "other"."""
+        mix = np.zeros(len(HIGHWAY_CLASSES))
+        mix[OTHER] = 1.0
+        return cls(np.repeat(_prior_speeds()[:, None], HOURS, axis=1), np.zeros(HOURS), _conf("DETOUR", 1.3), mix)
+
+    # --- lưu / nạp ---
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        extra = {} if self.grid_mix is None else {"grid_mix": self.grid_mix}
+        # ghi file tạm rồi os.replace -> worker đang nạp lại không đọc phải file dở dang
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    classes=np.array(HIGHWAY_CLASSES), speed_kmh=self.speed_kmh, samples=self.samples,
+                    detour=self.detour, trip_mix=self.trip_mix, grid_origin=np.array(self.grid_origin),
+                    cell_deg=self.cell_deg, built_at=self.built_at, trips=self.trips, **extra,
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            if tuple(z["classes"].tolist()) != HIGHWAY_CLASSES:
+                raise ValueError("Danh sách loại đường đã đổi, cần chạy lại build_eta_profile")
+            return cls(
+                z["speed_kmh"], z["samples"], z["detour"], z["trip_mix"],
+                z["grid_mix"] if "grid_mix" in z.files else None,
+                z["grid_origin"], z["cell_deg"], z["built_at"], z["trips"],
+            )
+
+    # --- dự đoán ---
+    def mix(self, lat, lng):
+        """Tỉ lệ loại đường quanh các điểm (mảng) -> [N, C]; ngoài lưới -> trip_mix."""
+        lat, lng = np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64)
+        out = np.broadcast_to(self.trip_mix, (*lat.shape, len(self.trip_mix))).astype(np.float64)
+        if self.grid_mix is None:
+            return out
+        ny, nx, _ = self.grid_mix.shape
+        iy = np.floor((lat - self.grid_origin[0]) / self.cell_deg).astype(np.int64)
+        ix = np.floor((lng - self.grid_origin[1]) / self.cell_deg).astype(np.int64)
+        inside = (iy >= 0) & (iy < ny) & (ix >= 0) & (ix < nx)
+        out[inside] = self.grid_mix[iy[inside], ix[inside]]
+        return out
+
+    def travel(self, olat, olng, dlat, dlng, how):
+        """Thời gian chạy xe (giây, chưa gồm dừng) + quãng đường ước lượng (m), mọi phần tử 1 lượt."""
+        dist = haversine_m(olat, olng, dlat, dlng) * self.detour
+        mix = 0.5 * (self.mix(olat, olng) + self.mix(dlat, dlng))
+        pace = (mix * self.pace_by_hour[how]).sum(axis=-1)
+        return dist * pace, dist
+
+    def summary(self):
+        # tốc độ hiệu dụng của chuyến trung bình theo từng giờ
+        by_hour = 3.6 / (self.pace_by_hour @ self.trip_mix.astype(np.float64))
+        return {
+            "built_at": self.built_at or None,
+            "trips": self.trips,
+            "detour": round(self.detour, 3),
+            "mean_kmh": round(float(by_hour.mean()), 1),
+            "slowest_hour": int(by_hour.argmin()),
+            "slowest_kmh": round(float(by_hour.min()), 1),
+        }
+
+
+_profile = None
+_profile_checked = 0.0
+_profile_mtime = None
+_profile_lock = threading.Lock()
+
+
+def profile_path() -> Path:
+    return Path(_conf("PROFILE_PATH", Path(settings.BASE_DIR) / "var" / "eta_profile.npz"))
+
+
+def get_profile() -> SpeedProfile:
+    """Profile dùng chung trong worker; nạp lại khi file đổi (kiểm tra mỗi RELOAD_S giây)."""
+    global _profile, _profile_checked, _profile_mtime
+    now = time.monotonic()
+    if _profile is not None and now - _profile_checked < _conf("RELOAD_S", 60):
+        return _profile
+    with _profile_lock:
+        _profile_checked = now
+        path = profile_path()
+        try:
+            st = path.stat()
+            mtime = (st.st_ino, st.st_mtime_ns)  # os.replace luôn tạo inode mới
+        except FileNotFoundError:
+            mtime = None
+        if _profile is None or mtime != _profile_mtime:
+            _profile_mtime = mtime
+            try:
+                _profile = SpeedProfile.load(path) if mtime is not None else SpeedProfile.default()
+            except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+                # file hỏng: giữ profile đang dùng (nếu có) thay vì rơi về mặc định
+                logger.warning("Không nạp được ETA profile %s: %s", path, e)
+                _profile = _profile or SpeedProfile.default()
+    return _profile
+
+
+def reset_profile():
+    global _profile
+    _profile = None
+
+
+# ---------- học ----------
+def training_trips(day_from, day_to, limit=None):
+    """
+    Chuyến (giờ bắt đầu, giây, điểm trước, pickup, drop) từ 2 đơn done liên tiếp của cùng
+    shipper trong cùng 1 ca. Điểm trước = drop của đơn trước.
+    """
+    start, end = day_bounds(day_from)[0], day_bounds(day_to)[1]
+    now = timezone.now()
+    shifts = {}
+    for emp, ci, co in (
+        Attendance.objects.filter(check_in__lt=end).exclude(check_out__lt=start)
+        .order_by("employee_id", "check_in").values_list("employee_id", "check_in", "check_out")
+    ):
+        s = shifts.setdefault(emp, ([], []))
+        s[0].append(ci)
+        s[1].append(co or now)
+
+    def shift_of(emp, t):
+        s = shifts.get(emp)
+        if s is None:
+            return None
+        i = bisect_right(s[0], t) - 1
+        return i if i >= 0 and t <= s[1][i] else None
+
+    rows = (
+        Order.objects.filter(status="done", assigned_to__isnull=False, updated_at__gte=start, updated_at__lt=end)
+        .exclude(pickup_lat=None).exclude(pickup_lng=None).exclude(drop_lat=None).exclude(drop_lng=None)
+        .order_by("assigned_to_id", "updated_at")
+        .values_list("assigned_to_id", "updated_at", "pickup_lat", "pickup_lng", "drop_lat", "drop_lng")
+    )
+    stop_s = _conf("STOP_S", 180)
+    trips = []
+    prev = None
+    for emp, t, plat, plng, dlat, dlng in rows.iterator(chunk_size=5000):
+        shift = shift_of(emp, t)
+        if prev is not None and shift is not None and prev[:2] == (emp, shift):
+            seconds = (t - prev[2]).total_seconds() - 2 * stop_s
+            if 0 < seconds <= _conf("MAX_TRIP_S", 3 * 3600):
+                trips.append((prev[2], seconds, prev[3], (plat, plng), (dlat, dlng)))
+                if limit and len(trips) >= limit:
+                    break
+        prev = (emp, shift, t, (dlat, dlng))
+    return trips
+
+
+def _ridge(D, t, groups, n_groups, prior, lam):
+    """Mỗi nhóm g: argmin ||D_g p - t_g||^2 + lam ||p - prior_g||^2 (giải 1 lần cho mọi nhóm)."""
+    C = D.shape[1]
+    A = np.zeros((n_groups, C, C))
+    b = np.zeros((n_groups, C))
+    for g in np.unique(groups):
+        m = groups == g
+        A[g] = D[m].T @ D[m]
+        b[g] = D[m].T @ t[m]
+    A += lam * np.eye(C)
+    return np.linalg.solve(A, (b + lam * prior)[..., None])[..., 0]
+
+
+def _grid_mix(graph, trip_mix, cell_deg):
+    """trip_mix chỉnh theo tỉ lệ loại đường của từng ô so với toàn mạng (mảng [ny, nx, C])."""
+    if graph is None or graph.edge_class is None or graph.n_edges == 0:
+        return None, (0.0, 0.0)
+    C = len(HIGHWAY_CLASSES)
+    src = np.repeat(np.arange(graph.n_nodes), np.diff(graph.indptr))
+    lat = (graph.node_lat[src] + graph.node_lat[graph.indices]) / 2
+    lng = (graph.node_lng[src] + graph.node_lng[graph.indices]) / 2
+    origin = (float(graph.node_lat.min()), float(graph.node_lng.min()))
+    iy = np.floor((lat - origin[0]) / cell_deg).astype(np.int64)
+    ix = np.floor((lng - origin[1]) / cell_deg).astype(np.int64)
+    grid = np.zeros((iy.max() + 1, ix.max() + 1, C))
+    np.add.at(grid, (iy, ix, graph.edge_class.astype(np.int64)), graph.length_m)
+    total = grid.sum(axis=(0, 1))
+    network = total / total.sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        local = grid / grid.sum(axis=-1, keepdims=True)
+        adj = np.where(network > 0, trip_mix * local / network, 0.0)
+        adj = adj / adj.sum(axis=-1, keepdims=True)
+    empty = ~np.isfinite(adj).all(axis=-1) | (grid.sum(axis=-1) == 0)
+    adj[empty] = trip_mix
+    return adj, origin
+
+
+def learn(days=None, limit=None, graph=None, now=None):
+    """Học speed profile từ dữ liệu `days` ngày gần nhất. Trả (SpeedProfile, thống kê)."""
+    now = now or timezone.now()
+    day_to = timezone.localdate(now)
+    day_from = day_to - timedelta(days=days or _conf("LEARN_DAYS", 60))
+    graph = graph if graph is not None else get_graph()
+    trips = training_trips(day_from, day_to, limit)
+    C = len(HIGHWAY_CLASSES)
+    min_pace, max_pace = 3.6 / _conf("MAX_KMH", 60), 3.6 / _conf("MIN_KMH", 5)
+
+    rows, secs, hours, ratios = [], [], [], []
+    for started, seconds, prev, pickup, drop in trips:
+        d = np.zeros(C)
+        crow = 0.0
+        for a, b in ((prev, pickup), (pickup, drop)):
+            leg_crow = float(haversine_m(a[0], a[1], b[0], b[1]))
+            crow += leg_crow
+            if graph is None or leg_crow < 1:
+                continue
+            leg = graph.class_lengths(a, b)
+            if leg is None:
+                d = None
+                break
+            d += leg
+        if d is None or crow < 1:
+            continue
+        if graph is None:
+            d[OTHER] = crow * _conf("DETOUR", 1.3)
+        elif d.sum() <= 0:
+            continue
+        elif crow > 300:
+            ratios.append(d.sum() / crow)
+        if not min_pace <= seconds / d.sum() <= max_pace:
+            continue  # chờ lâu / GPS lệch / nhập liệu muộn
+        rows.append(d)
+        secs.append(seconds)
+        hours.append(hour_of_week(started))
+
+    prior = 3.6 / _prior_speeds()
+    detour = float(np.median(ratios)) if ratios else _conf("DETOUR", 1.3)
+    if not rows:
+        profile = SpeedProfile.default()
+        profile.built_at = time.time()
+        return profile, {"trips": 0, "candidates": len(trips)}
+
+    D, t, h = np.array(rows), np.array(secs), np.array(hours)
+    lam = _conf("PRIOR_TRIPS", 20) * float(np.mean(np.einsum("ij,ij->i", D, D)))
+    overall = _ridge(D, t, np.zeros(len(t), dtype=np.int64), 1, prior[None, :], lam)
+    by_hour_of_day = _ridge(D, t, h % 24, 24, np.repeat(overall, 24, axis=0), lam)
+    by_hour = _ridge(D, t, h, HOURS, by_hour_of_day[np.arange(HOURS) % 24], lam)
+    pace = np.clip(by_hour, min_pace, max_pace)
+
+    trip_mix = D.sum(axis=0) / D.sum()
+    grid_mix, origin = _grid_mix(graph, trip_mix, _conf("CELL_DEG", 0.01))
+    profile = SpeedProfile(
+        (3.6 / pace).T, np.bincount(h, minlength=HOURS), detour, trip_mix,
+        grid_mix, origin, _conf("CELL_DEG", 0.01), time.time(), len(t),
+    )
+    return profile, {"trips": len(t), "candidates": len(trips)}
+
+
+# ---------- dự đoán ----------
+def courier_positions(user_ids):
+    """Vị trí mới nhất của shipper: bộ đệm GPS trong bộ nhớ, thiếu thì điểm đã lưu gần đây."""
+    from .tracking import location_buffer
+
+    max_age = timedelta(seconds=_conf("POSITION_MAX_AGE_S", 900))
+    now = timezone.now()
+    pos, missing = {}, []
+    for uid in set(user_ids):
+        last = location_buffer.last(uid)
+        if last and now - last[-1].t <= max_age:
+            pos[uid] = (last[-1].lat, last[-1].lng)
+        else:
+            missing.append(uid)
+    if missing:
+        rows = (
+            CourierLocation.objects.filter(employee_id__in=missing, recorded_at__gte=now - max_age)
+            .order_by("employee_id", "-recorded_at").values_list("employee_id", "lat", "lng")
+        )
+        if connection.features.can_distinct_on_fields:
+            rows = rows.distinct("employee_id")
+        for uid, lat, lng in rows:
+            pos.setdefault(uid, (lat, lng))
+    return pos
+
+
+ETA_FIELDS = ("id", "status", "assigned_to_id", "pickup_lat", "pickup_lng", "drop_lat", "drop_lng")
+
+
+def order_etas(rows, now=None, profile=None):
+    """
+    rows: tuple theo ETA_FIELDS. Trả {id: {"eta_s", "eta_at", "distance_m", "from"}} cho đơn
+    đang mở đủ toạ độ (đơn khác không có trong kết quả).
+    """
+    rows = [r for r in rows if r[1] in ACTIVE_STATUSES and None not in r[3:7]]
+    if not rows:
+        return {}
+    now = now or timezone.now()
+    profile = profile or get_profile()
+    pos = courier_positions([r[2] for r in rows if r[2] is not None])
+
+    ids = np.array([r[0] for r in rows])
+    new = np.array([r[1] == "new" for r in rows])
+    pick = np.array([r[3:5] for r in rows], dtype=np.float64)
+    drop = np.array([r[5:7] for r in rows], dtype=np.float64)
+    here = np.array([pos.get(r[2], (math.nan, math.nan)) for r in rows], dtype=np.float64)
+    known = ~np.isnan(here[:, 0])
+    here[~known] = pick[~known]  # chưa biết vị trí: chặng tới pickup bị bỏ qua bên dưới
+    how = hour_of_week(now)
+
+    # chặng tới pickup: đơn mới đã có shipper
+    approach = new & known
+    t_a, d_a = profile.travel(here[:, 0], here[:, 1], pick[:, 0], pick[:, 1], how)
+    # chặng tới drop: từ shipper nếu đang giao, còn lại từ pickup
+    start = np.where((~new & known)[:, None], here, pick)
+    t_b, d_b = profile.travel(start[:, 0], start[:, 1], drop[:, 0], drop[:, 1], how)
+
+    stop_s = _conf("STOP_S", 180)
+    eta = np.where(approach, t_a, 0.0) + t_b + np.where(new, 2, 1) * stop_s
+    dist = np.where(approach, d_a, 0.0) + d_b
+    source = np.where(approach | (~new & known), "courier", "pickup")
+    return {
+        int(i): {
+            "eta_s": round(float(e)),
+            "eta_at": now + timedelta(seconds=float(e)),
+            "distance_m": round(float(d)),
+            "from": str(s),
+        }
+        for i, e, d, s in zip(ids, eta, dist, source)
+    }
@@ -0,0 +1,139 @@
+"""
+Dữ liệu cho bản đồ đơn hàng: lọc theo khung nhìn (bbox) + gom cụm theo lưới ở zoom thấp.
+
+PostgreSQL/PostGIS: lọc bằng `point && ST_MakeEnvelope(...)` trên GiST index hàm
+(migration 0009), không cần thêm cột geometry cạnh các cột lat/lng hiện có:
+    ST_SetSRID(ST_MakePoint(drop_lng, drop_lat), 4326)
+CSDL khác: lọc theo khoảng lat/lng.
+Số feature trả về luôn bị chặn: gom cụm thì tối đa MAX_GRID x MAX_GRID ô,
+điểm lẻ thì tối đa MAX_FEATURES (vượt quá -> tự chuyển sang gom cụm).
+"""
+from django.conf import settings
+from django.db import connection, models
+from django.db.models import Avg, Count, F, Max, Min
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Floor
+
+POINT_COLUMNS = {
+    "drop": ("drop_lat", "drop_lng"),
+    "pickup": ("pickup_lat", "pickup_lng"),
+}
+
+# Phải trùng khớp biểu thức index trong migration 0009 để planner dùng được index.
+POINT_SQL = {
+    name: f'ST_SetSRID(ST_MakePoint("orders_order"."{lng}", "orders_order"."{lat}"), 4326)'
+    for name, (lat, lng) in POINT_COLUMNS.items()
+}
+
+
+def _conf(name, default):
+    return getattr(settings, "ORDER_MAP", {}).get(name, default)
+
+
+def parse_bbox(raw):
+    """'west,south,east,north' -> (w, s, e, n); ValueError nếu sai."""
+    parts = [float(x) for x in (raw or "").split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox phải có dạng west,south,east,north")
+    w, s, e, n = parts
+    if not (-180 <= w < e <= 180 and -90 <= s < n <= 90):
+        raise ValueError("bbox không hợp lệ")
+    return w, s, e, n
+
+
+def in_bbox(queryset, bbox, point="drop"):
+    lat, lng = POINT_COLUMNS[point]
+    w, s, e, n = bbox
+    queryset = queryset.filter(**{f"{lat}__isnull": False, f"{lng}__isnull": False})
+    if connection.vendor == "postgresql":
+        return queryset.alias(in_view=RawSQL(
+            f"{POINT_SQL[point]} && ST_MakeEnvelope(%s, %s, %s, %s, 4326)", (w, s, e, n),
+            output_field=models.BooleanField(),
+        )).filter(in_view=True)
+    return queryset.filter(**{f"{lat}__range": (s, n), f"{lng}__range": (w, e)})
+
+
+def cell_degrees(zoom):
+    """Kích thước ô lưới (độ kinh) ứng với CELL_PX pixel ở mức zoom của web map (tile 256px)."""
+    return 360.0 / (256 * 2 ** zoom) * _conf("CELL_PX", 64)
+
+
+def clusters(queryset, bbox, zoom, point="drop"):
+    """Gom điểm theo ô lưới ngay trong SQL (GROUP BY ô) -> list dict {lat, lng, count, bbox}."""
+    lat, lng = POINT_COLUMNS[point]
+    w, s, e, n = bbox
+    # bbox lớn bất thường so với zoom -> nới ô để số ô không vượt MAX_GRID x MAX_GRID
+    grid = _conf("MAX_GRID", 64)
+    cell = max(cell_degrees(zoom), (e - w) / grid, (n - s) / grid)
+    rows = (
+        in_bbox(queryset, bbox, point).order_by()
+        .annotate(cx=Floor((F(lng) - w) / cell), cy=Floor((F(lat) - s) / cell))
+        .values("cx", "cy")
+        .annotate(
+            count=Count("id"), lat=Avg(lat), lng=Avg(lng),
+            s=Min(lat), n=Max(lat), w=Min(lng), e=Max(lng),
+            first_id=Min("id"),
+        )
+    )
+    return [
+        {"lat": r["lat"], "lng": r["lng"], "count": r["count"], "id": r["first_id"],
+         "bbox": (r["w"], r["s"], r["e"], r["n"])}
+        for r in rows
+    ]
+
+
+POINT_FIELDS = ("id", "code", "customer_name", "status", "cod", "assigned_to_id")
+
+
+def points(queryset, bbox, point="drop", limit=None):
+    """Điểm lẻ trong khung nhìn; lấy limit+1 dòng để biết có bị cắt hay không."""
+    lat, lng = POINT_COLUMNS[point]
+    limit = limit or _conf("MAX_FEATURES", 2000)
+    rows = list(
+        in_bbox(queryset, bbox, point).order_by("-created_at", "-id")
+        .values_list(*POINT_FIELDS, lat, lng)[:limit + 1]
+    )
+    return rows[:limit], len(rows) > limit
+
+
+def feature_collection(queryset, bbox, zoom, point="drop", status_filter=None):
+    """GeoJSON FeatureCollection cho khung nhìn; zoom < CLUSTER_MAX_ZOOM hoặc quá nhiều điểm -> cụm."""
+    if status_filter:
+        queryset = queryset.filter(status__in=status_filter)
+    mode = "points"
+    truncated = False
+    if zoom >= _conf("CLUSTER_MAX_ZOOM", 15):
+        rows, truncated = points(queryset, bbox, point)
+        if truncated and zoom < _conf("MAX_ZOOM", 19):
+            mode = "clusters"
+    else:
+        mode = "clusters"
+
+    if mode == "points":
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [r[-1], r[-2]]},
+                "properties": dict(zip(POINT_FIELDS, r[:-2])),
+            }
+            for r in rows
+        ]
+    else:
+        features = []
+        for c in clusters(queryset, bbox, zoom, point):
+            if c["count"] == 1:
+                props = {"id": c["id"], "cluster": False}
+            else:
+                props = {"cluster": True, "count": c["count"], "bbox": c["bbox"]}
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [c["lng"], c["lat"]]},
+                "properties": props,
+            })
+        truncated = False
+    return {
+        "type": "FeatureCollection",
+        "mode": mode,
+        "truncated": truncated,
+        "features": features,
+    }
@@ -0,0 +1,260 @@
+"""
+Geocode phía server cho địa chỉ TP.HCM.
+
+Thứ tự tra cứu:
+  1. GazetteerIndex trong bộ nhớ (dict theo địa chỉ chuẩn hoá + chỉ mục token/tiền tố)
+  2. bảng GeocodeCache
+  3. chuỗi provider giống trình duyệt: Nominatim (khoanh HCM) -> Photon -> Nominatim toàn cục
+Kết quả (kể cả "không thấy") được lưu lại, nên địa chỉ lặp lại không tốn request mạng.
+"Không thấy" chỉ được lưu khi mọi provider đều trả lời; lỗi mạng / timeout trả UNAVAILABLE
+và không ghi gì, lần sau sẽ thử lại. Gọi provider bị giới hạn RATE lần/giây mỗi tiến trình.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import cache_event
+from .models import GeocodeCache
+from .osrm import get_session
+
+HCMC_BOX = {"W": 106.36, "E": 107.03, "S": 10.28, "N": 11.25}
+
+# viết tắt thường gặp -> dạng đầy đủ (sau khi đã bỏ dấu)
+_ABBREV = {
+    "q": "quan", "p": "phuong", "tp": "thanh pho", "hcm": "ho chi minh",
+    "tphcm": "thanh pho ho chi minh", "sg": "sai gon",
+}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# provider không trả lời được (lỗi mạng, 5xx, hết lượt): khác với "không tìm thấy" (None)
+UNAVAILABLE = object()
+
+
+def _conf(name, default):
+    return getattr(settings, "GEOCODER", {}).get(name, default)
+
+
+def in_hcmc(lat, lng) -> bool:
+    return HCMC_BOX["W"] <= lng <= HCMC_BOX["E"] and HCMC_BOX["S"] <= lat <= HCMC_BOX["N"]
+
+
+def normalize_address(s: str) -> str:
+    """'123 Đường Điện Biên Phủ, P.15, Q. Bình Thạnh' -> '123 duong dien bien phu phuong 15 quan binh thanh'"""
+    s = (s or "").strip().lower().replace("đ", "d")
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    # "p.15" / "q1" -> "p 15" / "q 1"
+    s = re.sub(r"\b([pq])\.?\s*(\d+)", r"\1 \2", s)
+    tokens = [_ABBREV.get(t, t) for t in _TOKEN_RE.findall(s)]
+    return " ".join(tokens)[:255]
+
+
+class GazetteerIndex:
+    """
+    Chỉ mục địa chỉ đã geocode:
+      exact[norm] = (lat, lng)                       O(1)
+      keys (sorted)                                  tiền tố (gợi ý) qua bisect
+      tokens[token] = {norm, ...}                    so khớp không phụ thuộc thứ tự từ
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.keys = []
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def add(self, norm, lat, lng):
+        with self.lock:
+            if norm not in self.exact:
+                bisect.insort(self.keys, norm)
+                for t in set(norm.split()):
+                    self.tokens.setdefault(t, set()).add(norm)
+            self.exact[norm] = (lat, lng)
+
+    def load(self, rows):
+        """rows: iterable (norm, lat, lng); dựng lại toàn bộ chỉ mục."""
+        exact, tokens = {}, {}
+        for norm, lat, lng in rows:
+            exact[norm] = (lat, lng)
+            for t in set(norm.split()):
+                tokens.setdefault(t, set()).add(norm)
+        with self.lock:
+            self.exact, self.tokens, self.keys = exact, tokens, sorted(exact)
+            self.loaded = True
+
+    def lookup(self, norm):
+        hit = self.exact.get(norm)
+        if hit is not None:
+            return hit
+        # cùng tập từ, khác thứ tự ("binh thanh quan" ~ "quan binh thanh")
+        qt = set(norm.split())
+        if not qt:
+            return None
+        sets = sorted((self.tokens.get(t, ()) for t in qt), key=len)
+        if not sets or not sets[0]:
+            return None
+        cands = set(sets[0]).intersection(*sets[1:])
+        for c in cands:
+            if set(c.split()) == qt:
+                return self.exact[c]
+        return None
+
+    def suggest(self, prefix, limit=8):
+        prefix = normalize_address(prefix)
+        if not prefix:
+            return []
+        i = bisect.bisect_left(self.keys, prefix)
+        out = []
+        while i < len(self.keys) and len(out) < limit and self.keys[i].startswith(prefix):
+            k = self.keys[i]
+            out.append((k, *self.exact[k]))
+            i += 1
+        return out
+
+
+gazetteer = GazetteerIndex()
+
+
+def load_gazetteer():
+    """Nạp chỉ mục từ GeocodeCache (một lần mỗi tiến trình)."""
+    if not gazetteer.loaded:
+        gazetteer.load(
+            GeocodeCache.objects.filter(lat__isnull=False)
+            .values_list("query", "lat", "lng").iterator(chunk_size=5000)
+        )
+
+
+class RateLimiter:
+    """Tối đa `rate` lần gọi/giây trên tất cả thread (Nominatim yêu cầu <= 1 req/s)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self, max_wait=None):
+        """Chờ tới lượt. max_wait: nếu phải chờ lâu hơn thì không giữ lượt và trả False."""
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            if max_wait is not None and at - now > max_wait:
+                return False
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+        return True
+
+
+remote_limiter = RateLimiter(_conf("RATE", 1.0))
+
+
+# ---------- providers ----------
+def _nominatim(q, bounded):
+    params = {"format": "jsonv2", "countrycodes": "vn", "limit": 1, "q": q}
+    if bounded:
+        params.update(bounded=1, viewbox=f"{HCMC_BOX['W']},{HCMC_BOX['N']},{HCMC_BOX['E']},{HCMC_BOX['S']}")
+    r = get_session().get(
+        _conf("NOMINATIM_URL", "https://nominatim.openstreetmap.org") + "/search",
+        params=params, headers={"Accept-Language": "vi", "User-Agent": _conf("USER_AGENT", "deliverysys")},
+        timeout=_conf("TIMEOUT", 8),
+    )
+    r.raise_for_status()
+    data = r.json()
+    return (float(data[0]["lat"]), float(data[0]["lon"])) if data else None
+
+
+def _photon(q):
+    r = get_session().get(
+        _conf("PHOTON_URL", "https://photon.komoot.io") + "/api/",
+        params={"q": q, "lang": "vi", "limit": 1}, timeout=_conf("TIMEOUT", 8),
+    )
+    r.raise_for_status()
+    f = (r.json().get("features") or [None])[0]
+    if not f:
+        return None
+    lng, lat = f["geometry"]["coordinates"][:2]
+    return float(lat), float(lng)
+
+
+PROVIDERS = [
+    ("nominatim_hcm", lambda q: _nominatim(q, bounded=True)),
+    ("photon", _photon),
+    ("nominatim", lambda q: _nominatim(q, bounded=False)),
+]
+
+
+def geocode_remote(q):
+    """
+    Thử lần lượt các provider; ưu tiên kết quả nằm trong TP.HCM.
+    Trả (lat, lng, provider) | None (mọi provider trả lời "không thấy") | UNAVAILABLE
+    (không có kết quả và ít nhất 1 provider lỗi mạng -> chưa chắc là không có).
+    """
+    fallback = None
+    failed = False
+    for name, fn in PROVIDERS:
+        try:
+            hit = fn(q)
+        except (requests.RequestException, ValueError, KeyError, IndexError):
+            failed = True
+            continue
+        if hit is None:
+            continue
+        if in_hcmc(*hit):
+            return (*hit, name)
+        fallback = fallback or (*hit, name)
+    if fallback is None and failed:
+        return UNAVAILABLE
+    return fallback
+
+
+# ---------- API ----------
+def geocode(address: str, remote=True):
+    """
+    Trả (lat, lng), None (không tìm thấy) hoặc UNAVAILABLE (provider lỗi / quá RATE, chưa ghi cache).
+    remote=False: chỉ dùng cache, không bao giờ trả UNAVAILABLE.
+    """
+    norm = normalize_address(address)
+    if not norm:
+        return None
+    load_gazetteer()
+    hit = gazetteer.lookup(norm)
+    cache_event("geocode_memory", hit is not None)
+    if hit is not None:
+        return hit
+
+    row = GeocodeCache.objects.filter(query=norm).values_list("lat", "lng", "updated_at").first()
+    if row is not None:
+        lat, lng, updated_at = row
+        if lat is not None:
+            cache_event("geocode_db", True)
+            gazetteer.add(norm, lat, lng)
+            return lat, lng
+        # không thấy lần trước: chỉ thử lại sau NEGATIVE_TTL
+        if updated_at > timezone.now() - timedelta(seconds=_conf("NEGATIVE_TTL", 7 * 24 * 3600)):
+            cache_event("geocode_db", True)
+            return None
+    cache_event("geocode_db", False)
+    if not remote:
+        return None
+
+    if not remote_limiter.wait(_conf("MAX_WAIT", 2.0)):
+        return UNAVAILABLE
+    found = geocode_remote(address)
+    if found is UNAVAILABLE:
+        return UNAVAILABLE
+    lat, lng, provider = found if found else (None, None, "")
+    GeocodeCache.objects.update_or_create(
+        query=norm, defaults={"raw": address[:255], "lat": lat, "lng": lng, "provider": provider},
+    )
+    if lat is None:
+        return None
+    gazetteer.add(norm, lat, lng)
+    return lat, lng
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.eta import learn, profile_path
+from orders.routing import get_graph
+
+
+class Command(BaseCommand):
+    help = "Học speed profile (loại đường x giờ trong tuần) từ đơn đã giao và lưu ra file .npz cho ETA."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="số ngày dữ liệu (mặc định ETA['LEARN_DAYS'])")
+        parser.add_argument("--limit", type=int, default=None, help="tối đa số chuyến dùng để học")
+        parser.add_argument("--output", default=None, help="Đường dẫn file (mặc định settings.ETA['PROFILE_PATH'])")
+
+    def handle(self, *args, **opts):
+        path = opts["output"] or profile_path()
+        t0 = time.perf_counter()
+        graph = get_graph()
+        if graph is None or graph.edge_class is None:
+            self.stderr.write("Chưa có road graph có loại đường (manage.py build_road_graph): chỉ học tốc độ chung theo giờ.")
+        profile, info = learn(days=opts["days"], limit=opts["limit"])
+        profile.save(path)
+        s = profile.summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"{info['trips']}/{info['candidates']} chuyến, detour {s['detour']}, "
+            f"trung bình {s['mean_kmh']} km/h, chậm nhất giờ {s['slowest_hour']} ({s['slowest_kmh']} km/h) "
+            f"-> {path} ({time.perf_counter() - t0:.1f}s)"
+        ))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.routing import RoadGraph, graph_path
+
+
+class Command(BaseCommand):
+    help = "Dựng road graph từ bảng Road và lưu ra file .npz cho engine định tuyến nội bộ."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=None, help="Đường dẫn file (mặc định settings.ROUTING['GRAPH_PATH'])")
+
+    def handle(self, *args, **opts):
+        path = opts["output"] or graph_path()
+        t0 = time.perf_counter()
+        graph = RoadGraph.from_roads()
+        graph.save(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"{graph.n_nodes} đỉnh, {graph.n_edges} cạnh -> {path} ({time.perf_counter() - t0:.1f}s)"
+        ))
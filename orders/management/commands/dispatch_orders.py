@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from orders.dispatch import dispatcher
+
+
+class Command(BaseCommand):
+    help = "Gán hàng loạt các đơn mới chưa có người nhận cho shipper đang trong ca."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None)
+
+    def handle(self, *args, **opts):
+        plan = dispatcher.rebalance(limit=opts["limit"])
+        for uid, ids in sorted(plan.items()):
+            self.stdout.write(f"user {uid}: {len(ids)} đơn")
+        self.stdout.write(self.style.SUCCESS(f"Đã gán {sum(len(v) for v in plan.values())} đơn."))
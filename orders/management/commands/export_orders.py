@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from orders.bulk import export_orders
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = "Xuất đơn hàng ra CSV/NDJSON (đọc theo chunk, không nạp hết vào bộ nhớ)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument("--output", "-o", default="-", help="Đường dẫn file, '-' = stdout")
+        parser.add_argument("--status", default=None)
+
+    def handle(self, *args, **opts):
+        qs = Order.objects.all()
+        if opts["status"]:
+            qs = qs.filter(status=opts["status"])
+        out = sys.stdout if opts["output"] == "-" else open(opts["output"], "w", encoding="utf-8", newline="")
+        try:
+            for chunk in export_orders(qs, opts["format"]):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
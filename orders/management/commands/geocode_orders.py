@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from orders.geocoding import UNAVAILABLE, RateLimiter, gazetteer, geocode, geocode_remote, normalize_address
+from orders.models import GeocodeCache, Order
+from orders import sync
+from orders.snap import snap_orders
+
+
+class Command(BaseCommand):
+    help = "Điền pickup_lat/lng, drop_lat/lng còn thiếu cho đơn hàng bằng geocode (có cache)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Số request geocode song song tối đa")
+        parser.add_argument("--rate", type=float, default=1.0, help="Số request/giây tối đa tới provider (0 = không giới hạn)")
+        parser.add_argument("--limit", type=int, default=None, help="Số đơn tối đa")
+        parser.add_argument("--cache-only", action="store_true", help="Chỉ dùng cache, không gọi mạng")
+
+    def handle(self, *args, **opts):
+        qs = (
+            Order.objects
+            .filter(
+                Q(pickup_lat__isnull=True) & (~Q(pickup_address="") | ~Q(address=""))
+                | Q(drop_lat__isnull=True) & ~Q(drop_address="")
+            )
+            .order_by("id")
+            .only("id", "address", "pickup_address", "pickup_lat", "pickup_lng",
+                  "drop_address", "drop_lat", "drop_lng",
+                  "pickup_snap_lat", "pickup_snap_lng", "drop_snap_lat", "drop_snap_lng", "assigned_to_id")
+        )
+        if opts["limit"]:
+            qs = qs[:opts["limit"]]
+        orders = list(qs)
+
+        # gom địa chỉ trùng: mỗi địa chỉ chuẩn hoá chỉ tra 1 lần
+        wanted = {}
+        for o in orders:
+            if o.pickup_lat is None and (o.pickup_address or o.address):
+                a = o.pickup_address or o.address
+                wanted.setdefault(normalize_address(a), a)
+            if o.drop_lat is None and o.drop_address:
+                wanted.setdefault(normalize_address(o.drop_address), o.drop_address)
+        wanted.pop("", None)
+        self.stdout.write(f"{len(orders)} đơn, {len(wanted)} địa chỉ khác nhau")
+
+        resolved = {}
+        misses = []
+        for norm, raw in wanted.items():
+            hit = geocode(raw, remote=False)
+            if hit:
+                resolved[norm] = hit
+            else:
+                misses.append((norm, raw))
+        self.stdout.write(f"cache: {len(resolved)} hit, {len(misses)} miss")
+
+        failed = 0
+        if misses and not opts["cache_only"]:
+            limiter = RateLimiter(opts["rate"])
+
+            def work(raw):
+                limiter.wait()
+                return geocode_remote(raw)
+
+            with ThreadPoolExecutor(max_workers=max(1, opts["workers"])) as pool:
+                futures = {pool.submit(work, raw): (norm, raw) for norm, raw in misses}
+                for i, fut in enumerate(as_completed(futures), 1):
+                    norm, raw = futures[fut]
+                    found = fut.result()
+                    if found is UNAVAILABLE:
+                        # lỗi mạng: không ghi "không thấy", lần chạy sau thử lại
+                        failed += 1
+                        continue
+                    lat, lng, provider = found if found else (None, None, "")
+                    GeocodeCache.objects.update_or_create(
+                        query=norm, defaults={"raw": raw[:255], "lat": lat, "lng": lng, "provider": provider},
+                    )
+                    if lat is not None:
+                        gazetteer.add(norm, lat, lng)
+                        resolved[norm] = (lat, lng)
+                    if i % 50 == 0:
+                        self.stdout.write(f"  {i}/{len(misses)}")
+            if failed:
+                self.stderr.write(f"{failed} địa chỉ lỗi khi gọi provider, sẽ thử lại lần sau")
+
+        changed = []
+        for o in orders:
+            dirty = False
+            if o.pickup_lat is None:
+                hit = resolved.get(normalize_address(o.pickup_address or o.address))
+                if hit:
+                    o.pickup_lat, o.pickup_lng = hit
+                    dirty = True
+            if o.drop_lat is None:
+                hit = resolved.get(normalize_address(o.drop_address))
+                if hit:
+                    o.drop_lat, o.drop_lng = hit
+                    dirty = True
+            if dirty:
+                changed.append(o)
+        # bulk_update không phát signal -> tự bám đường cho các toạ độ mới (1 query) và ghi nhật ký sync
+        snapped = snap_orders(changed)
+        with transaction.atomic():
+            Order.objects.bulk_update(
+                changed, ["pickup_lat", "pickup_lng", "drop_lat", "drop_lng", *snapped], batch_size=1000,
+            )
+            sync.record_orders(changed)
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật toạ độ cho {len(changed)} đơn."))
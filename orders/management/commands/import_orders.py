@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.bulk import import_orders, iter_records
+from orders.dispatch import dispatcher
+
+
+class Command(BaseCommand):
+    help = "Nhập đơn hàng hàng loạt từ file CSV/NDJSON (đọc dòng chảy, bulk_create theo chunk)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "ndjson"], default=None)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--user", default=None, help="username ghi vào created_by")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        path = opts["path"]
+        fmt = opts["format"] or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+        user = None
+        if opts["user"]:
+            user = get_user_model().objects.filter(username=opts["user"]).first()
+            if user is None:
+                raise CommandError(f"Không có user {opts['user']}")
+
+        t0 = time.perf_counter()
+
+        def progress(r):
+            self.stdout.write(f"  {r['rows']} dòng, tạo {r['created']}, lỗi {r['failed']} "
+                              f"({r['rows'] / (time.perf_counter() - t0):.0f} dòng/s)")
+
+        with open(path, "rb") as f:
+            report = import_orders(
+                iter_records(f, fmt), created_by=user, chunk_size=opts["chunk_size"],
+                dry_run=opts["dry_run"], progress=progress,
+            )
+        for e in report["errors"]:
+            self.stderr.write(f"dòng {e['row']} ({e['code']}): {e['errors']}")
+        if report["file_error"]:
+            self.stderr.write(f"dừng đọc file ở dòng {report['file_error']['row']}: {report['file_error']['error']}")
+        if report["created"] and not opts["dry_run"] and settings.DISPATCH.get("AUTO", False):
+            dispatcher.rebalance()
+        self.stdout.write(self.style.SUCCESS(
+            f"Xong: {report['rows']} dòng, tạo {report['created']}, lỗi {report['failed']}"
+            f"{' (dry-run)' if opts['dry_run'] else ''} trong {time.perf_counter() - t0:.1f}s"
+        ))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.osm_loader import OSMLoadError, load_roads, open_source
+from orders.tiles import bump_version
+
+
+class Command(BaseCommand):
+    help = "Nạp mạng lưới đường từ file OSM (.osm.pbf / .geojson / .geojsonseq) vào bảng Road (COPY + diff)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["pbf", "geojson", "geojsonseq"], default=None)
+        parser.add_argument("--highways", default="", help="chỉ lấy các loại này, vd. primary,secondary,residential")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--delete-missing", action="store_true",
+                            help="xoá đường có osm_id không còn trong file (file là extract đầy đủ); "
+                                 "có --highways thì chỉ xoá trong các loại đó")
+        parser.add_argument("--dry-run", action="store_true", help="chạy hết rồi rollback, chỉ in thống kê")
+
+    def handle(self, *args, **opts):
+        allowed = {h.strip() for h in opts["highways"].split(",") if h.strip()} or None
+        t0 = time.perf_counter()
+
+        def progress(r):
+            self.stdout.write(f"  đã đọc {r['read']} đường ({r['read'] / (time.perf_counter() - t0):.0f}/s)")
+
+        try:
+            report = load_roads(
+                open_source(opts["path"], opts["format"], allowed),
+                batch_size=opts["batch_size"], delete_missing=opts["delete_missing"], highways=allowed,
+                dry_run=opts["dry_run"], progress=progress,
+            )
+        except (OSError, OSMLoadError) as e:
+            raise CommandError(str(e))
+
+        if report["index_created"]:
+            self.stdout.write("Đã tạo GiST index cho orders_road.geom")
+        changed = report["inserted"] + report["updated"] + report["deleted"]
+        if changed and not opts["dry_run"]:
+            bump_version()  # COPY/INSERT hàng loạt không phát signal của Road
+            self.stdout.write("Chạy `manage.py build_road_graph` để cập nhật engine định tuyến nội bộ.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Xong: đọc {report['read']}, thêm {report['inserted']}, sửa {report['updated']}, "
+            f"xoá {report['deleted']}, giữ nguyên {report['unchanged']}"
+            f"{' (dry-run)' if opts['dry_run'] else ''} trong {time.perf_counter() - t0:.1f}s"
+        ))
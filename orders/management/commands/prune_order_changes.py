@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.sync import prune
+
+
+class Command(BaseCommand):
+    help = "Xoá nhật ký thay đổi đơn (OrderChange) cũ hơn SYNC['RETENTION_DAYS'] ngày."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="giữ lại N ngày gần nhất (mặc định theo settings)")
+
+    def handle(self, *args, **opts):
+        n = prune(opts["days"])
+        self.stdout.write(self.style.SUCCESS(f"Đã xoá {n} dòng nhật ký."))
@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from orders.models import Attendance, Order
+from orders.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Tính lại bảng hiệu suất theo ngày (EmployeeDailyStat) từ Order + Attendance."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="day_from", help="YYYY-MM-DD (mặc định: ngày dữ liệu sớm nhất)")
+        parser.add_argument("--to", dest="day_to", help="YYYY-MM-DD (mặc định: hôm nay)")
+        parser.add_argument("--employee", type=int, action="append", help="chỉ tính cho nhân viên này (lặp được)")
+        parser.add_argument("--days-per-batch", type=int, default=31)
+
+    def handle(self, *args, **opts):
+        try:
+            d1 = date.fromisoformat(opts["day_to"]) if opts["day_to"] else timezone.localdate()
+            if opts["day_from"]:
+                d0 = date.fromisoformat(opts["day_from"])
+            else:
+                first = [
+                    Order.objects.aggregate(m=Min("updated_at"))["m"],
+                    Attendance.objects.aggregate(m=Min("check_in"))["m"],
+                ]
+                first = [timezone.localdate(x) for x in first if x is not None]
+                d0 = min(first) if first else d1
+        except ValueError as e:
+            raise CommandError(f"Ngày không hợp lệ: {e}")
+        if d0 > d1:
+            raise CommandError("--from phải trước --to")
+
+        step = timedelta(days=max(1, opts["days_per_batch"]))
+        total, cur = 0, d0
+        while cur <= d1:
+            end = min(cur + step - timedelta(days=1), d1)
+            n = rebuild(cur, end, opts["employee"])
+            total += n
+            self.stdout.write(f"{cur} -> {end}: {n} dòng")
+            cur = end + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Xong: {total} dòng."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from orders.tiles import bump_version, tile_cache
+
+
+class Command(BaseCommand):
+    help = "Quản lý cache tile đường trên đĩa: --bump (bỏ toàn bộ tile cũ), --prune (xoá version cũ)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bump", action="store_true", help="sang version mới (sau khi sửa Road bằng SQL tay)")
+        parser.add_argument("--prune", action="store_true", help="xoá thư mục tile của các version cũ")
+
+    def handle(self, *args, **opts):
+        if opts["bump"]:
+            self.stdout.write(f"Version mới: {bump_version()}")
+        if opts["prune"]:
+            self.stdout.write(f"Đã xoá {tile_cache.prune()} thư mục version cũ.")
+        self.stdout.write(self.style.SUCCESS(f"Version hiện tại: {tile_cache.version()} ({tile_cache.root})"))
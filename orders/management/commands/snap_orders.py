@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from orders.models import Order
+from orders import sync
+from orders.snap import snap_orders
+
+FIELDS = ("pickup_lat", "pickup_lng", "drop_lat", "drop_lng",
+          "pickup_snap_lat", "pickup_snap_lng", "drop_snap_lat", "drop_snap_lng", "assigned_to_id")
+
+
+class Command(BaseCommand):
+    help = "Bám toạ độ pickup/drop của đơn vào đường gần nhất (điền *_snap_lat/lng còn thiếu)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="tính lại cả đơn đã có snap (sau khi nạp lại Road)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        qs = Order.objects.order_by("id").only("id", *FIELDS)
+        if not opts["all"]:
+            qs = qs.filter(
+                Q(pickup_lat__isnull=False, pickup_snap_lat__isnull=True)
+                | Q(drop_lat__isnull=False, drop_snap_lat__isnull=True)
+            )
+        t0 = time.perf_counter()
+        done, last_id = 0, 0
+        while True:
+            batch = list(qs.filter(id__gt=last_id)[:opts["batch_size"]])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            fields = snap_orders(batch, force=opts["all"])
+            if fields:
+                with transaction.atomic():
+                    Order.objects.bulk_update(batch, fields, batch_size=opts["batch_size"])
+                    sync.record_orders(batch)  # bulk_update không phát post_save
+            done += len(batch)
+            self.stdout.write(f"  {done} đơn ({done / (time.perf_counter() - t0):.0f}/s)")
+        self.stdout.write(self.style.SUCCESS(f"Xong: {done} đơn trong {time.perf_counter() - t0:.1f}s"))
@@ -0,0 +1,50 @@
+import csv
+import sys
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.attendance import close_stale_shifts, timesheet
+
+
+class Command(BaseCommand):
+    help = "Xuất bảng công (giờ làm theo ngày / tuần) ra CSV; --close-stale đóng các ca quên check-out."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="day_from", help="YYYY-MM-DD (mặc định: đầu tháng)")
+        parser.add_argument("--to", dest="day_to", help="YYYY-MM-DD (mặc định: hôm nay)")
+        parser.add_argument("--employee", type=int, action="append", help="chỉ xuất nhân viên này (lặp được)")
+        parser.add_argument("--by", choices=("day", "week"), default="day")
+        parser.add_argument("--close-stale", action="store_true", help="đóng ca mở quá MAX_SHIFT_HOURS trước khi tính")
+        parser.add_argument("--output", help="file CSV (mặc định: stdout)")
+
+    def handle(self, *args, **opts):
+        today = timezone.localdate()
+        try:
+            d1 = date.fromisoformat(opts["day_to"]) if opts["day_to"] else today
+            d0 = date.fromisoformat(opts["day_from"]) if opts["day_from"] else d1.replace(day=1)
+        except ValueError as e:
+            raise CommandError(f"Ngày không hợp lệ: {e}")
+        if d0 > d1:
+            raise CommandError("--from phải trước --to")
+
+        if opts["close_stale"]:
+            closed = close_stale_shifts()
+            self.stderr.write(f"Đã đóng {len(closed)} ca quên check-out.")
+
+        sheet = timesheet(d0, d1, opts["employee"])
+        names = dict(get_user_model().objects.filter(id__in=sheet).values_list("id", "username"))
+        out = open(opts["output"], "w", newline="", encoding="utf-8") if opts["output"] else sys.stdout
+        try:
+            w = csv.writer(out)
+            w.writerow(["employee_id", "username", opts["by"], "hours"])
+            key = "days" if opts["by"] == "day" else "weeks"
+            for emp in sorted(sheet):
+                for d, sec in sorted(sheet[emp][key].items()):
+                    w.writerow([emp, names.get(emp, ""), d.isoformat(), round(sec / 3600.0, 2)])
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        self.stderr.write(self.style.SUCCESS(f"Xong: {len(sheet)} nhân viên, {d0} -> {d1}."))
@@ -0,0 +1,254 @@
+"""
+Đo đạc từng request, gộp trong tiến trình, xuất dạng text Prometheus (GET /metrics/, chỉ staff).
+
+MetricsMiddleware (đặt đầu MIDDLEWARE) ghi cho mỗi view (tên route, không phải URL):
+  - thời gian xử lý (histogram), số request theo mã HTTP
+  - số câu SQL + tổng thời gian SQL qua connection.execute_wrapper
+  - thời gian gọi HTTP ra ngoài (OSRM, geocoder) qua TimedSession của osrm.get_session()
+  -> thời gian còn lại ~ Python / serialize. Header Server-Timing (db, http, app) khi bật.
+cache_event(name, hit): đếm hit/miss của các cache (route, roles, jwt, shift, tile, geocode).
+Slow sampler: request chậm hơn SLOW_MS được log (logger "orders.metrics") kèm các câu SQL
+chậm nhất; chỉ SLOW_SAMPLE_RATE request được giữ văn bản SQL để chi phí thấp.
+
+Số liệu nằm trong bộ nhớ của từng worker: chạy nhiều worker thì mỗi lần scrape chỉ thấy
+1 worker (đủ để xem tỉ lệ / phân bố; cần tổng chính xác thì scrape từng worker).
+"""
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "deliverysys_"
+
+
+def _conf(name, default):
+    return getattr(settings, "METRICS", {}).get(name, default)
+
+
+# ---------- registry ----------
+class Registry:
+    """Counter / histogram theo nhãn, 1 khoá cho cả registry (mỗi request vài lần cộng)."""
+
+    def __init__(self, buckets=None):
+        self.lock = threading.Lock()
+        self.buckets = tuple(buckets or DEFAULT_BUCKETS)
+        self.counters = {}    # name -> {labels: value}
+        self.histograms = {}  # name -> {labels: [bucket counts..., +Inf], sum}
+        self.help = {}
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name, labels, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            h = series.get(labels)
+            if h is None:
+                h = series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            h[0][i] += 1
+            h[1] += seconds
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self):
+        with self.lock:
+            counters = {n: dict(s) for n, s in self.counters.items()}
+            histograms = {n: {k: (list(v[0]), v[1]) for k, v in s.items()} for n, s in self.histograms.items()}
+        out = []
+        for name in sorted(counters):
+            out += self._head(name, "counter")
+            for labels, value in sorted(counters[name].items()):
+                out.append(f"{PREFIX}{name}{_labels(labels)} {_num(value)}")
+        for name in sorted(histograms):
+            out += self._head(name, "histogram")
+            for labels, (counts, total) in sorted(histograms[name].items()):
+                acc = 0
+                for le, n in zip((*self.buckets, "+Inf"), counts):
+                    acc += n
+                    out.append(f"{PREFIX}{name}_bucket{_labels(labels + (('le', _num(le)),))} {acc}")
+                out.append(f"{PREFIX}{name}_sum{_labels(labels)} {_num(total)}")
+                out.append(f"{PREFIX}{name}_count{_labels(labels)} {acc}")
+        return "\n".join(out) + "\n"
+
+    def _head(self, name, kind):
+        lines = [f"# HELP {PREFIX}{name} {self.help[name]}"] if name in self.help else []
+        return lines + [f"# TYPE {PREFIX}{name} {kind}"]
+
+
+def _num(v):
+    if isinstance(v, str):
+        return v
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+registry = Registry(_conf("BUCKETS", None))
+registry.describe("http_requests_total", "Request theo view, method, mã HTTP")
+registry.describe("http_request_duration_seconds", "Thời gian xử lý request theo view")
+registry.describe("db_queries_total", "Số câu SQL theo view")
+registry.describe("db_query_seconds_total", "Tổng thời gian SQL theo view")
+registry.describe("outbound_seconds_total", "Tổng thời gian gọi HTTP ra ngoài theo view")
+registry.describe("outbound_requests_total", "Request HTTP ra ngoài theo host, mã HTTP")
+registry.describe("outbound_duration_seconds", "Thời gian request HTTP ra ngoài theo host")
+registry.describe("cache_requests_total", "Lượt đọc cache theo cache, kết quả")
+registry.describe("slow_requests_total", "Request chậm hơn METRICS['SLOW_MS'] theo view")
+
+
+# ---------- trạng thái của request đang chạy (theo thread) ----------
+_local = threading.local()
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_s", "http_s", "http_calls", "sql")
+
+    def __init__(self, capture_sql=False):
+        self.queries = 0
+        self.db_s = 0.0
+        self.http_s = 0.0
+        self.http_calls = 0
+        self.sql = [] if capture_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: gọi cho mọi câu SQL của kết nối trong lúc request chạy
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            dt = time.perf_counter() - t0
+            self.queries += 1
+            self.db_s += dt
+            if self.sql is not None:
+                self.sql.append((dt, sql))
+
+
+def current():
+    """RequestStats của request đang chạy trên thread này (None ngoài request)."""
+    return getattr(_local, "stats", None)
+
+
+# ---------- cache / HTTP ra ngoài ----------
+def cache_event(name, hit):
+    registry.inc("cache_requests_total", (("cache", name), ("result", "hit" if hit else "miss")))
+
+
+def record_outbound(host, status, seconds):
+    registry.inc("outbound_requests_total", (("host", host), ("status", str(status))))
+    registry.observe("outbound_duration_seconds", (("host", host),), seconds)
+    stats = current()
+    if stats is not None:
+        stats.http_s += seconds
+        stats.http_calls += 1
+
+
+class TimedSession(requests.Session):
+    """requests.Session ghi thời gian mỗi lần gọi (tới khi có response, gồm cả body nếu không stream)."""
+
+    def request(self, method, url, *args, **kwargs):
+        t0 = time.perf_counter()
+        status = "error"
+        try:
+            resp = super().request(method, url, *args, **kwargs)
+            status = resp.status_code
+            return resp
+        finally:
+            record_outbound(urlsplit(url).hostname or "?", status, time.perf_counter() - t0)
+
+
+# ---------- middleware ----------
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = _conf("ENABLED", True)
+        self.slow_s = (_conf("SLOW_MS", 1000) or 0) / 1000.0
+        self.sample_rate = _conf("SLOW_SAMPLE_RATE", 0.1) if self.slow_s else 0.0
+        self.server_timing = _conf("SERVER_TIMING", settings.DEBUG)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        stats = RequestStats(capture_sql=self.sample_rate and random.random() < self.sample_rate)
+        _local.stats = stats
+        t0 = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        elapsed = time.perf_counter() - t0
+        view = _view_name(request)
+        self.record(view, request.method, response.status_code, elapsed, stats)
+        if self.server_timing:
+            app_ms = max(elapsed - stats.db_s - stats.http_s, 0) * 1000
+            response["Server-Timing"] = (
+                f'db;dur={stats.db_s * 1000:.1f};desc="{stats.queries} queries", '
+                f"http;dur={stats.http_s * 1000:.1f}, app;dur={app_ms:.1f}"
+            )
+        if self.slow_s and elapsed >= self.slow_s:
+            self.log_slow(request, view, response.status_code, elapsed, stats)
+        return response
+
+    @staticmethod
+    def record(view, method, status, elapsed, stats):
+        v = (("view", view),)
+        registry.inc("http_requests_total", v + (("method", method), ("status", str(status))))
+        registry.observe("http_request_duration_seconds", v, elapsed)
+        if stats.queries:
+            registry.inc("db_queries_total", v, stats.queries)
+            registry.inc("db_query_seconds_total", v, stats.db_s)
+        if stats.http_calls:
+            registry.inc("outbound_seconds_total", v, stats.http_s)
+
+    @staticmethod
+    def log_slow(request, view, status, elapsed, stats):
+        registry.inc("slow_requests_total", (("view", view),))
+        msg = (
+            f"slow request {request.method} {request.path} view={view} status={status} "
+            f"total={elapsed * 1000:.0f}ms db={stats.db_s * 1000:.0f}ms/{stats.queries}q "
+            f"http={stats.http_s * 1000:.0f}ms/{stats.http_calls}"
+        )
+        if stats.sql:
+            top = sorted(stats.sql, key=lambda q: q[0], reverse=True)[:_conf("SLOW_MAX_QUERIES", 10)]
+            msg += "".join(f"\n  {dt * 1000:8.1f}ms  {sql[:500]}" for dt, sql in top)
+        logger.warning(msg)
+
+
+def render():
+    return registry.render()
@@ -0,0 +1,21 @@
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Road',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, null=True)),
+                ('highway', models.CharField(max_length=50, null=True)),
+                ('geom', django.contrib.gis.db.models.fields.LineStringField(srid=4326)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations, models
+
+# Phải trùng khớp orders.search.SEARCH_DOC_SQL
+SEARCH_COLUMNS = ("code", "customer_name", "phone", "address", "pickup_address", "drop_address")
+
+# unaccent() chỉ STABLE nên không dùng trực tiếp trong index được; bọc lại thành IMMUTABLE.
+CREATE_F_UNACCENT = """
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+"""
+
+SEARCH_DOC = "f_unaccent(lower({}))".format(" || ' ' || ".join(f'"{c}"' for c in SEARCH_COLUMNS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_keyset_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.RunSQL(CREATE_F_UNACCENT, "DROP FUNCTION IF EXISTS f_unaccent(text);"),
+        migrations.RunSQL(
+            f"CREATE INDEX order_search_trgm_idx ON orders_order USING gin (({SEARCH_DOC}) gin_trgm_ops);",
+            "DROP INDEX IF EXISTS order_search_trgm_idx;",
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['code'], name='order_code_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['phone'], name='order_phone_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,36 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lat', models.FloatField()),
+                ('lng', models.FloatField()),
+                ('accuracy', models.FloatField(blank=True, null=True, verbose_name='Sai số (m)')),
+                ('speed', models.FloatField(blank=True, null=True, verbose_name='Tốc độ (m/s)')),
+                ('recorded_at', models.DateTimeField(verbose_name='Thời điểm ghi')),
+                ('attendance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='locations', to='orders.attendance', verbose_name='Ca làm')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='locations', to=settings.AUTH_USER_MODEL, verbose_name='Nhân viên')),
+            ],
+            options={
+                'verbose_name': 'Vị trí shipper',
+                'verbose_name_plural': 'Vị trí shipper',
+                'ordering': ['-recorded_at'],
+                'indexes': [
+                    models.Index(fields=['employee', '-recorded_at'], name='courierloc_emp_time_idx'),
+                    models.Index(fields=['attendance', 'recorded_at'], name='courierloc_shift_time_idx'),
+                ],
+            },
+        ),
+    ]
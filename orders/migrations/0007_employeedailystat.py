@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_courierlocation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Ngày')),
+                ('done_count', models.IntegerField(default=0, verbose_name='Đơn hoàn thành')),
+                ('cancel_count', models.IntegerField(default=0, verbose_name='Đơn huỷ')),
+                ('cod_sum', models.BigIntegerField(default=0, verbose_name='Tổng COD (₫)')),
+                ('worked_seconds', models.BigIntegerField(default=0, verbose_name='Thời gian làm (giây)')),
+                ('shift_count', models.IntegerField(default=0, verbose_name='Số ca')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL, verbose_name='Nhân viên')),
+            ],
+            options={
+                'verbose_name': 'Hiệu suất theo ngày',
+                'verbose_name_plural': 'Hiệu suất theo ngày',
+                'ordering': ['-day'],
+                'constraints': [
+                    models.UniqueConstraint(fields=('employee', 'day'), name='dailystat_employee_day_uniq'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_employeedailystat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employeedailystat',
+            index=models.Index(fields=['day', 'employee'], name='dailystat_day_emp_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+# Phải trùng khớp orders.geo.POINT_SQL
+POINT = 'ST_SetSRID(ST_MakePoint("{lng}", "{lat}"), 4326)'
+
+
+def _index(name, lat, lng):
+    return migrations.RunSQL(
+        f"CREATE INDEX {name} ON orders_order USING gist (({POINT.format(lat=lat, lng=lng)})) "
+        f"WHERE {lat} IS NOT NULL AND {lng} IS NOT NULL;",
+        f"DROP INDEX IF EXISTS {name};",
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_dailystat_day_idx'),
+    ]
+
+    operations = [
+        _index("order_drop_point_gist", "drop_lat", "drop_lng"),
+        _index("order_pickup_point_gist", "pickup_lat", "pickup_lng"),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_point_gist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='road',
+            name='osm_id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='road',
+            name='checksum',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_road_osm_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='pickup_snap_lat',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Pickup lat (bám đường)'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='pickup_snap_lng',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Pickup lng (bám đường)'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='drop_snap_lat',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Drop lat (bám đường)'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='drop_snap_lng',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Drop lng (bám đường)'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_order_snap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='check_in_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='check_out_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(condition=models.Q(('check_in_key__isnull', False)), fields=['employee', 'check_in_key'], name='attendance_in_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(condition=models.Q(('check_out_key__isnull', False)), fields=['employee', 'check_out_key'], name='attendance_out_key_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+import orders.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_attendance_idempotency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('txid', models.BigIntegerField(db_default=orders.models.CurrentTxid(), editable=False)),
+                ('kind', models.CharField(choices=[('upsert', 'Tạo / sửa'), ('delete', 'Xoá'), ('prune', 'Mốc dọn nhật ký')], max_length=6)),
+                ('order_id', models.BigIntegerField(null=True)),
+                ('assignee', models.BigIntegerField(null=True, verbose_name='Người nhận sau thay đổi')),
+                ('prev_assignee', models.BigIntegerField(null=True, verbose_name='Người nhận trước thay đổi')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Nhật ký thay đổi đơn',
+                'verbose_name_plural': 'Nhật ký thay đổi đơn',
+                'indexes': [
+                    models.Index(fields=['txid', 'id'], name='orderchange_cursor_idx'),
+                    models.Index(fields=['assignee', 'txid', 'id'], name='orderchange_assignee_idx'),
+                    models.Index(condition=models.Q(('prev_assignee__isnull', False)), fields=['prev_assignee', 'txid', 'id'], name='orderchange_prev_idx'),
+                    models.Index(fields=['created_at'], name='orderchange_created_idx'),
+                    models.Index(condition=models.Q(('kind', 'prune')), fields=['txid'], name='orderchange_prune_idx'),
+                ],
+            },
+        ),
+    ]
@@ -28,6 +28,12 @@ class Order(models.Model):
     drop_lat = models.FloatField("Drop lat", null=True, blank=True)
     drop_lng = models.FloatField("Drop lng", null=True, blank=True)
 
+    # Toạ độ đã bám vào đường gần nhất (orders/snap.py), tính lại khi pickup/drop đổi
+    pickup_snap_lat = models.FloatField("Pickup lat (bám đường)", null=True, blank=True, editable=False)
+    pickup_snap_lng = models.FloatField("Pickup lng (bám đường)", null=True, blank=True, editable=False)
+    drop_snap_lat = models.FloatField("Drop lat (bám đường)", null=True, blank=True, editable=False)
+    drop_snap_lng = models.FloatField("Drop lng (bám đường)", null=True, blank=True, editable=False)
+
     phone = models.CharField("Số điện thoại", max_length=20, blank=True)
     cod = models.PositiveIntegerField("COD (₫)", default=0)
     status = models.CharField("Trạng thái", max_length=12, choices=STATUS_CHOICES, default="new", db_index=True)
@@ -70,8 +76,14 @@ class Order(models.Model):
         verbose_name = "Đơn hàng"
         verbose_name_plural = "Danh sách đơn hàng"
         indexes = [
-            models.Index(fields=["status", "created_at"]),
-            models.Index(fields=["assigned_to", "status"]),
+            # khớp thứ tự phân trang (-created_at, -id) để lọc + sắp xếp chỉ cần đọc index
+            models.Index(fields=["-created_at", "-id"], name="order_created_id_idx"),
+            models.Index(fields=["status", "-created_at", "-id"], name="order_status_created_idx"),
+            models.Index(fields=["assigned_to", "-created_at", "-id"], name="order_assignee_created_idx"),
+            models.Index(fields=["assigned_to", "status", "-created_at", "-id"], name="order_assignee_status_idx"),
+            # LIKE 'abc%' cho đường tắt tìm theo mã đơn / SĐT (xem orders/search.py)
+            models.Index(fields=["code"], name="order_code_prefix_idx", opclasses=["varchar_pattern_ops"]),
+            models.Index(fields=["phone"], name="order_phone_prefix_idx", opclasses=["varchar_pattern_ops"]),
         ]
 
 
@@ -94,6 +106,9 @@ class Attendance(models.Model):
     )
     check_in = models.DateTimeField("Giờ vào ca", auto_now_add=True, db_index=True)
     check_out = models.DateTimeField("Giờ ra ca", null=True, blank=True)
+    # Idempotency-Key của app khi check-in / check-out (gửi lại cùng key -> không tạo ca mới)
+    check_in_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    check_out_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
 
     @property
     def hours(self) -> float | None:
@@ -123,11 +138,153 @@ class Attendance(models.Model):
         ]
         indexes = [
             models.Index(fields=["employee", "check_out"]),
+            models.Index(fields=["employee", "check_in_key"], condition=Q(check_in_key__isnull=False),
+                         name="attendance_in_key_idx"),
+            models.Index(fields=["employee", "check_out_key"], condition=Q(check_out_key__isnull=False),
+                         name="attendance_out_key_idx"),
         ]
+
+
+class CourierLocation(models.Model):
+    """Điểm GPS của shipper trong một ca (đã lọc bớt bằng Douglas-Peucker trước khi lưu)."""
+
+    employee = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="locations",
+        verbose_name="Nhân viên",
+    )
+    attendance = models.ForeignKey(
+        Attendance,
+        null=True, blank=True,
+        on_delete=models.SET_NULL,
+        related_name="locations",
+        verbose_name="Ca làm",
+    )
+    lat = models.FloatField()
+    lng = models.FloatField()
+    accuracy = models.FloatField("Sai số (m)", null=True, blank=True)
+    speed = models.FloatField("Tốc độ (m/s)", null=True, blank=True)
+    recorded_at = models.DateTimeField("Thời điểm ghi")
+
+    def __str__(self):
+        return f"{self.employee_id} {self.recorded_at:%Y-%m-%d %H:%M:%S}"
+
+    class Meta:
+        ordering = ["-recorded_at"]
+        verbose_name = "Vị trí shipper"
+        verbose_name_plural = "Vị trí shipper"
+        indexes = [
+            models.Index(fields=["employee", "-recorded_at"], name="courierloc_emp_time_idx"),
+            models.Index(fields=["attendance", "recorded_at"], name="courierloc_shift_time_idx"),
+        ]
+
+
+class EmployeeDailyStat(models.Model):
+    """
+    Tổng hợp hiệu suất theo nhân viên / ngày (giờ địa phương), cập nhật cộng dồn
+    trong orders/stats.py; dựng lại bằng `manage.py rebuild_daily_stats`.
+    """
+
+    employee = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+        verbose_name="Nhân viên",
+    )
+    day = models.DateField("Ngày")
+    done_count = models.IntegerField("Đơn hoàn thành", default=0)
+    cancel_count = models.IntegerField("Đơn huỷ", default=0)
+    cod_sum = models.BigIntegerField("Tổng COD (₫)", default=0)
+    worked_seconds = models.BigIntegerField("Thời gian làm (giây)", default=0)
+    shift_count = models.IntegerField("Số ca", default=0)
+
+    def __str__(self):
+        return f"{self.employee_id} {self.day}"
+
+    class Meta:
+        ordering = ["-day"]
+        verbose_name = "Hiệu suất theo ngày"
+        verbose_name_plural = "Hiệu suất theo ngày"
+        constraints = [
+            models.UniqueConstraint(fields=["employee", "day"], name="dailystat_employee_day_uniq"),
+        ]
+        indexes = [
+            # bảng xếp hạng: quét theo khoảng ngày cho mọi nhân viên
+            models.Index(fields=["day", "employee"], name="dailystat_day_emp_idx"),
+        ]
+
+
+class GeocodeCache(models.Model):
+    """Kết quả geocode theo địa chỉ đã chuẩn hoá; lat/lng NULL = đã tra nhưng không thấy."""
+
+    query = models.CharField("Địa chỉ chuẩn hoá", max_length=255, unique=True)
+    raw = models.CharField("Địa chỉ gốc", max_length=255, blank=True, default="")
+    lat = models.FloatField(null=True, blank=True)
+    lng = models.FloatField(null=True, blank=True)
+    provider = models.CharField(max_length=30, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.query
+
+    class Meta:
+        verbose_name = "Cache geocode"
+        verbose_name_plural = "Cache geocode"
+
+
 class Road(gis_models.Model):
+    # id way OSM + checksum (tên, loại, toạ độ) để nạp lại theo kiểu diff (xem orders/osm_loader.py)
+    osm_id = gis_models.BigIntegerField(null=True, blank=True, unique=True)
+    checksum = gis_models.CharField(max_length=32, blank=True, default="")
     name = gis_models.CharField(max_length=255, null=True)
     highway = gis_models.CharField(max_length=50, null=True)
     geom = gis_models.LineStringField(srid=4326)
 
     def __str__(self):
         return self.name or "Unnamed Road"
+
+
+class CurrentTxid(models.Func):
+    """txid_current() của PostgreSQL: mã transaction đang ghi (dùng làm con trỏ đồng bộ)."""
+
+    function = "txid_current"
+    template = "%(function)s()"
+    output_field = models.BigIntegerField()
+
+
+class OrderChange(models.Model):
+    """
+    Nhật ký thay đổi đơn cho đồng bộ delta (/orders/api/sync/), ghi trong orders/sync.py.
+    Con trỏ là (txid, id): chỉ đọc các transaction đã kết thúc nên không bỏ sót dòng commit muộn.
+    """
+
+    KIND_CHOICES = [
+        ("upsert", "Tạo / sửa"),
+        ("delete", "Xoá"),
+        ("prune", "Mốc dọn nhật ký"),
+    ]
+
+    txid = models.BigIntegerField(db_default=CurrentTxid(), editable=False)
+    kind = models.CharField(max_length=6, choices=KIND_CHOICES)
+    # không dùng FK: đơn đã xoá / user đã xoá vẫn phải giữ được dòng nhật ký
+    order_id = models.BigIntegerField(null=True)
+    assignee = models.BigIntegerField("Người nhận sau thay đổi", null=True)
+    prev_assignee = models.BigIntegerField("Người nhận trước thay đổi", null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.order_id} @{self.txid}"
+
+    class Meta:
+        verbose_name = "Nhật ký thay đổi đơn"
+        verbose_name_plural = "Nhật ký thay đổi đơn"
+        indexes = [
+            models.Index(fields=["txid", "id"], name="orderchange_cursor_idx"),
+            models.Index(fields=["assignee", "txid", "id"], name="orderchange_assignee_idx"),
+            models.Index(fields=["prev_assignee", "txid", "id"], name="orderchange_prev_idx",
+                         condition=Q(prev_assignee__isnull=False)),
+            models.Index(fields=["created_at"], name="orderchange_created_idx"),
+            models.Index(fields=["txid"], name="orderchange_prune_idx", condition=Q(kind="prune")),
+        ]
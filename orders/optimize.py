@@ -0,0 +1,288 @@
+"""
+Tối ưu thứ tự ghé điểm cho một shipper (bài toán PDP: lấy hàng trước, giao sau).
+
+  1. Ma trận thời gian/quãng đường: OSRM /table nếu được yêu cầu và thành công,
+     ngược lại haversine vector hoá (numpy) x hệ số đường vòng.
+  2. Nearest insertion: lần lượt chèn đơn gần tuyến nhất vào vị trí rẻ nhất
+     (pickup trước drop), O(n) mỗi lần chèn nhờ suffix-min.
+  3. Local search 2-opt + Or-opt (đoạn 1..3 điểm), chỉ nhận bước hợp lệ
+     về thứ tự pickup/drop, dừng khi hết time budget hoặc không cải thiện được.
+Tuyến là đường mở: bắt đầu tại vị trí shipper (đỉnh 0), không quay về.
+"""
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+
+from .osrm import OSRMError, fetch_table
+from .routing import haversine_m
+
+PICKUP, DROP = "pickup", "drop"
+
+
+@dataclass
+class Stop:
+    order_id: int
+    kind: str  # PICKUP | DROP
+    lat: float
+    lng: float
+
+
+def _conf(name, default):
+    return getattr(settings, "ROUTING", {}).get(name, default)
+
+
+def haversine_matrix(points):
+    """(durations, distances) ước lượng từ haversine, ma trận numpy n x n."""
+    pts = np.asarray(points, dtype=np.float64)
+    lat, lng = pts[:, 0], pts[:, 1]
+    dist = haversine_m(lat[:, None], lng[:, None], lat[None, :], lng[None, :]) * _conf("DETOUR_FACTOR", 1.3)
+    dur = dist / (_conf("AVG_SPEED_KMH", 20) / 3.6)
+    return dur, dist
+
+
+def build_matrix(points, source="haversine", profile="driving"):
+    """Trả (durations, distances, nguồn thực tế)."""
+    if source == "osrm" and 1 < len(points) <= _conf("TABLE_MAX_POINTS", 100):
+        try:
+            dur, dist = fetch_table(points, profile)
+            dur = np.asarray([[np.nan if v is None else v for v in row] for row in dur], dtype=np.float64)
+            dist = np.asarray([[np.nan if v is None else v for v in row] for row in dist], dtype=np.float64)
+            if not (np.isnan(dur).any() or np.isnan(dist).any()):
+                return dur, dist, "osrm"
+        except OSRMError:
+            pass
+    dur, dist = haversine_matrix(points)
+    return dur, dist, "haversine"
+
+
+class PickupDeliveryOptimizer:
+    """
+    nodes: 0 = điểm xuất phát, 1..n = các Stop.
+    partner[i] = chỉ số drop của pickup i (hoặc pickup của drop i), -1 nếu không có
+    (đơn đang giao chỉ còn drop).
+    """
+
+    def __init__(self, cost, partner, is_pickup):
+        self.c = cost.tolist() if hasattr(cost, "tolist") else cost
+        self.partner = partner
+        self.is_pickup = is_pickup
+        self.n = len(partner)
+
+    # ---------- helpers ----------
+    def _arc(self, a, b):
+        return self.c[a][b] if b is not None else 0.0
+
+    def cost_of(self, tour):
+        return sum(self.c[a][b] for a, b in zip(tour, tour[1:]))
+
+    def valid(self, tour):
+        pos = {v: i for i, v in enumerate(tour)}
+        return all(
+            pos[v] < pos[self.partner[v]]
+            for v in tour[1:] if self.is_pickup[v] and self.partner[v] >= 0
+        )
+
+    # ---------- construction ----------
+    def nearest_insertion(self, groups):
+        """groups: list tuple đỉnh cần chèn cùng nhau, (p, d) hoặc (d,)."""
+        c = self.c
+        tour = [0]
+        # khoảng cách nhỏ nhất từ mỗi nhóm tới tuyến hiện tại
+        near = [c[0][g[0]] for g in groups]
+        remaining = set(range(len(groups)))
+        while remaining:
+            gi = min(remaining, key=near.__getitem__)
+            remaining.discard(gi)
+            g = groups[gi]
+            tour = self._insert(tour, g)
+            for k in remaining:
+                first = groups[k][0]
+                for v in g:
+                    if c[v][first] < near[k]:
+                        near[k] = c[v][first]
+        return tour
+
+    def _insert(self, tour, g):
+        c = self.c
+        m = len(tour)
+
+        def delta(a_idx, v):
+            a = tour[a_idx]
+            b = tour[a_idx + 1] if a_idx + 1 < m else None
+            return c[a][v] + (c[v][b] - c[a][b] if b is not None else 0.0)
+
+        if len(g) == 1:
+            v = g[0]
+            best = min(range(m), key=lambda i: delta(i, v))
+            return tour[:best + 1] + [v] + tour[best + 1:]
+
+        p, d = g
+        dd = [delta(i, d) for i in range(m)]
+        # suffix-min của dd: vị trí drop tốt nhất ở sau a
+        suf_val = [0.0] * (m + 1)
+        suf_idx = [-1] * (m + 1)
+        suf_val[m] = float("inf")
+        for i in range(m - 1, -1, -1):
+            if dd[i] < suf_val[i + 1]:
+                suf_val[i], suf_idx[i] = dd[i], i
+            else:
+                suf_val[i], suf_idx[i] = suf_val[i + 1], suf_idx[i + 1]
+
+        best = (float("inf"), 0, 0)
+        for a in range(m):
+            b_next = tour[a + 1] if a + 1 < m else None
+            # p, d liền nhau ngay sau a
+            adj = c[tour[a]][p] + c[p][d] + (c[d][b_next] - c[tour[a]][b_next] if b_next is not None else 0.0)
+            if adj < best[0]:
+                best = (adj, a, a)
+            if a + 1 < m:
+                sep = delta(a, p) + suf_val[a + 1]
+                if sep < best[0]:
+                    best = (sep, a, suf_idx[a + 1])
+        _, a, b = best
+        if a == b:
+            return tour[:a + 1] + [p, d] + tour[a + 1:]
+        return tour[:a + 1] + [p] + tour[a + 1:b + 1] + [d] + tour[b + 1:]
+
+    # ---------- local search ----------
+    def two_opt(self, tour, deadline):
+        c, partner, is_pickup = self.c, self.partner, self.is_pickup
+        m = len(tour)
+        improved = False
+        for i in range(1, m - 1):
+            if time.perf_counter() > deadline:
+                break
+            a = tour[i - 1]
+            fwd = rev = 0.0
+            pos_in = {tour[i]: i}
+            for j in range(i + 1, m):
+                v = tour[j]
+                # đảo đoạn chứa cả pickup lẫn drop của một đơn -> sai thứ tự; đoạn dài hơn cũng sai
+                if not is_pickup[v] and partner[v] in pos_in:
+                    break
+                pos_in[v] = j
+                fwd += c[tour[j - 1]][v]
+                rev += c[v][tour[j - 1]]
+                nxt = tour[j + 1] if j + 1 < m else None
+                old = c[a][tour[i]] + fwd + (c[v][nxt] if nxt is not None else 0.0)
+                new = c[a][v] + rev + (c[tour[i]][nxt] if nxt is not None else 0.0)
+                if new < old - 1e-9:
+                    tour[i:j + 1] = tour[i:j + 1][::-1]
+                    improved = True
+                    break
+        return improved
+
+    def or_opt(self, tour, deadline):
+        c, partner, is_pickup = self.c, self.partner, self.is_pickup
+        improved = False
+        for k in (1, 2, 3):
+            i = 1
+            while i + k <= len(tour):
+                if time.perf_counter() > deadline:
+                    return improved
+                m = len(tour)
+                seg = tour[i:i + k]
+                prev, nxt = tour[i - 1], tour[i + k] if i + k < m else None
+                remove_gain = c[prev][seg[0]] + self._arc(seg[-1], nxt) - self._arc(prev, nxt)
+                pos = {v: idx for idx, v in enumerate(tour)}
+                # giới hạn vị trí chèn để giữ đúng thứ tự pickup/drop
+                lo, hi = 0, m - 1
+                for v in seg:
+                    w = partner[v]
+                    if w < 0 or w in seg:
+                        continue
+                    if is_pickup[v]:
+                        hi = min(hi, pos[w] - 1)
+                    else:
+                        lo = max(lo, pos[w])
+                best_delta, best_at = -1e-9, None
+                for at in range(lo, hi + 1):
+                    if i - 1 <= at <= i + k - 1:
+                        continue
+                    x = tour[at]
+                    y = tour[at + 1] if at + 1 < m else None
+                    add = c[x][seg[0]] + self._arc(seg[-1], y) - self._arc(x, y)
+                    delta = add - remove_gain
+                    if delta < best_delta:
+                        best_delta, best_at = delta, at
+                if best_at is None:
+                    i += 1
+                    continue
+                rest = tour[:i] + tour[i + k:]
+                at = best_at if best_at < i else best_at - k
+                tour[:] = rest[:at + 1] + seg + rest[at + 1:]
+                improved = True
+                i += 1
+        return improved
+
+    def solve(self, groups, budget_s=0.8):
+        deadline = time.perf_counter() + budget_s
+        tour = self.nearest_insertion(groups)
+        passes = 0
+        while time.perf_counter() < deadline:
+            passes += 1
+            a = self.two_opt(tour, deadline)
+            b = self.or_opt(tour, deadline)
+            if not (a or b):
+                break
+        return tour, passes
+
+
+def optimize_orders(orders, start=None, matrix="haversine", budget_s=None, profile="driving"):
+    """
+    orders: iterable Order (cần đủ toạ độ). Đơn "shipping" coi như đã lấy hàng -> chỉ còn drop.
+    start: (lat, lng) vị trí shipper; None thì xuất phát ở pickup đầu tiên.
+    """
+    stops, groups = [], []
+    for o in orders:
+        if not o.has_coords:
+            continue
+        if o.status != "shipping":
+            stops.append(Stop(o.id, PICKUP, o.pickup_lat, o.pickup_lng))
+            stops.append(Stop(o.id, DROP, o.drop_lat, o.drop_lng))
+            groups.append((len(stops) - 1, len(stops)))  # đỉnh = index stop + 1
+        else:
+            stops.append(Stop(o.id, DROP, o.drop_lat, o.drop_lng))
+            groups.append((len(stops),))
+    if not stops:
+        return {"sequence": [], "total_distance_m": 0, "total_duration_s": 0, "matrix": matrix}
+    if start is None:
+        start = (stops[0].lat, stops[0].lng)
+
+    points = [start] + [(s.lat, s.lng) for s in stops]
+    dur, dist, source = build_matrix(points, matrix, profile)
+
+    n = len(points)
+    partner = [-1] * n
+    is_pickup = [False] * n
+    for g in groups:
+        if len(g) == 2:
+            p, d = g
+            partner[p], partner[d] = d, p
+            is_pickup[p] = True
+
+    t0 = time.perf_counter()
+    opt = PickupDeliveryOptimizer(dur, partner, is_pickup)
+    budget = _conf("OPTIMIZE_BUDGET_S", 0.8) if budget_s is None else budget_s
+    tour, passes = opt.solve(groups, budget)
+    elapsed = time.perf_counter() - t0
+
+    seq, acc_t, acc_d = [], 0.0, 0.0
+    for a, b in zip(tour, tour[1:]):
+        acc_t += dur[a][b]
+        acc_d += dist[a][b]
+        s = stops[b - 1]
+        seq.append({
+            "order_id": s.order_id, "kind": s.kind, "lat": s.lat, "lng": s.lng,
+            "arrive_s": round(float(acc_t), 1), "distance_m": round(float(acc_d), 1),
+        })
+    return {
+        "sequence": seq,
+        "total_distance_m": round(float(acc_d), 1),
+        "total_duration_s": round(float(acc_t), 1),
+        "matrix": source,
+        "passes": passes,
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }
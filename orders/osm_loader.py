@@ -0,0 +1,281 @@
+"""
+Nạp mạng lưới đường OSM vào bảng Road theo dòng chảy.
+
+Nguồn (đọc tuần tự, bộ nhớ giới hạn theo batch):
+  - .osm.pbf      : cần gói `osmium` (pyosmium); chỉ lấy way có tag highway
+  - .geojsonseq / .ndjson : mỗi dòng 1 Feature (vd. `osmium export -f geojsonseq`)
+  - .geojson      : FeatureCollection; dùng `ijson` nếu có để không nạp cả file
+Ghi: COPY từng batch vào bảng tạm road_stage, sau đó gộp vào orders_road bằng SQL
+trong 1 transaction:
+  - way mới -> INSERT, way đổi (checksum khác) -> UPDATE, way không đổi -> bỏ qua
+  - delete_missing=True: xoá way có osm_id không còn trong file (chỉ dùng với extract đầy đủ);
+    nạp một số loại đường (highways=...) thì chỉ xoá trong các loại đó
+Feature không có id OSM luôn được INSERT (không diff được).
+"""
+import hashlib
+import io
+import json
+import queue
+import re
+import threading
+
+from django.db import connection, transaction
+
+# loại highway không phải đường đi được (điểm, khu vực, chưa xây...)
+SKIP_HIGHWAYS = {
+    "proposed", "construction", "abandoned", "platform", "bus_stop", "elevator",
+    "rest_area", "services", "emergency_bay", "raceway",
+}
+
+_ID_RE = re.compile(r"(\d+)$")
+
+
+class OSMLoadError(Exception):
+    pass
+
+
+def _osm_id(raw):
+    if raw is None:
+        return None
+    if isinstance(raw, int):
+        return raw
+    m = _ID_RE.search(str(raw))  # "way/123", "w123", "123"
+    return int(m.group(1)) if m else None
+
+
+def checksum(name, highway, coords):
+    h = hashlib.md5(f"{name}|{highway}|".encode())
+    h.update(",".join(f"{lng:.7f} {lat:.7f}" for lng, lat in coords).encode())
+    return h.hexdigest()
+
+
+def _keep(highway, allowed):
+    if not highway:
+        return False
+    return highway in allowed if allowed else highway not in SKIP_HIGHWAYS
+
+
+# ---------- đọc nguồn -> (osm_id, name, highway, [(lng, lat), ...]) ----------
+def _from_feature(f, allowed):
+    if not isinstance(f, dict) or f.get("type") != "Feature":
+        return None
+    g = f.get("geometry") or {}
+    props = f.get("properties") or {}
+    tags = props.get("tags") if isinstance(props.get("tags"), dict) else props
+    highway = tags.get("highway")
+    if g.get("type") != "LineString" or not _keep(highway, allowed):
+        return None
+    coords = [(float(c[0]), float(c[1])) for c in g.get("coordinates") or ()]
+    if len(coords) < 2:
+        return None
+    osm_id = _osm_id(f.get("id", props.get("@id", props.get("osm_id"))))
+    return osm_id, (tags.get("name") or None), highway, coords
+
+
+def iter_geojsonseq(fileobj, allowed=None):
+    for line in io.TextIOWrapper(fileobj, encoding="utf-8"):
+        line = line.strip().lstrip("\x1e")  # RFC 8142: record separator
+        if not line:
+            continue
+        try:
+            rec = _from_feature(json.loads(line), allowed)
+        except (ValueError, TypeError, IndexError):
+            continue
+        if rec:
+            yield rec
+
+
+def iter_geojson(fileobj, allowed=None):
+    try:
+        import ijson  # gói tuỳ chọn: đọc FeatureCollection theo dòng chảy
+    except ImportError:
+        features = json.load(fileobj).get("features") or []
+    else:
+        features = ijson.items(fileobj, "features.item", use_float=True)
+    for f in features:
+        rec = _from_feature(f, allowed)
+        if rec:
+            yield rec
+
+
+def iter_pbf(path, allowed=None, maxsize=20000):
+    """pyosmium chạy callback trong thread riêng, đẩy qua hàng đợi có giới hạn -> generator."""
+    try:
+        import osmium
+    except ImportError as e:
+        raise OSMLoadError("Đọc .osm.pbf cần gói osmium (pip install osmium)") from e
+
+    q = queue.Queue(maxsize=maxsize)
+    done = object()
+    errors = []
+
+    class Handler(osmium.SimpleHandler):
+        def way(self, w):
+            highway = w.tags.get("highway")
+            if not _keep(highway, allowed):
+                return
+            try:
+                coords = [(n.lon, n.lat) for n in w.nodes]
+            except osmium.InvalidLocationError:
+                return  # node nằm ngoài extract
+            if len(coords) >= 2:
+                q.put((w.id, w.tags.get("name"), highway, coords))
+
+    def run():
+        try:
+            Handler().apply_file(str(path), locations=True, idx="flex_mem")
+        except Exception as e:  # noqa: BLE001 - chuyển lỗi sang thread chính
+            errors.append(e)
+        finally:
+            q.put(done)
+
+    t = threading.Thread(target=run, name="osm-pbf", daemon=True)
+    t.start()
+    while True:
+        item = q.get()
+        if item is done:
+            break
+        yield item
+    t.join()
+    if errors:
+        raise OSMLoadError(f"Lỗi đọc pbf: {errors[0]}")
+
+
+def open_source(path, fmt=None, allowed=None):
+    """Chọn reader theo đuôi file (hoặc fmt = pbf | geojson | geojsonseq)."""
+    path = str(path)
+    if fmt is None:
+        if path.endswith(".pbf"):
+            fmt = "pbf"
+        elif path.endswith((".geojsonseq", ".geojsonl", ".ndjson", ".jsonl")):
+            fmt = "geojsonseq"
+        else:
+            fmt = "geojson"
+    if fmt == "pbf":
+        return iter_pbf(path, allowed)
+
+    def gen():
+        with open(path, "rb") as f:
+            reader = iter_geojsonseq if fmt == "geojsonseq" else iter_geojson
+            yield from reader(f, allowed)
+
+    return gen()
+
+
+# ---------- ghi ----------
+STAGE_DDL = """
+CREATE TEMP TABLE road_stage (
+    osm_id bigint, name text, highway text, checksum text, geom geometry(LineString, 4326)
+) ON COMMIT DROP
+"""
+
+
+def _copy_escape(v):
+    if v is None:
+        return r"\N"
+    return str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _copy_batch(cursor, batch):
+    buf = io.StringIO()
+    for osm_id, name, highway, coords in batch:
+        wkt = "SRID=4326;LINESTRING(" + ",".join(f"{lng:.7f} {lat:.7f}" for lng, lat in coords) + ")"
+        name = name[:255] if name else None
+        buf.write("\t".join(_copy_escape(v) for v in (
+            osm_id, name, highway[:50], checksum(name, highway, coords), wkt,
+        )))
+        buf.write("\n")
+    buf.seek(0)
+    # psycopg2: copy_expert; psycopg 3: cursor.copy()
+    raw = cursor.cursor if hasattr(cursor, "cursor") else cursor
+    sql = "COPY road_stage (osm_id, name, highway, checksum, geom) FROM STDIN"
+    if hasattr(raw, "copy_expert"):
+        raw.copy_expert(sql, buf)
+    else:
+        with raw.copy(sql) as cp:
+            cp.write(buf.getvalue())
+
+
+MERGE_SQL = {
+    # trùng osm_id trong file (way bị cắt ở biên extract...) -> giữ bản cuối
+    "dedupe": """
+        DELETE FROM road_stage a USING road_stage b
+        WHERE a.osm_id = b.osm_id AND a.ctid < b.ctid
+    """,
+    "updated": """
+        UPDATE orders_road r
+        SET name = s.name, highway = s.highway, geom = s.geom, checksum = s.checksum
+        FROM road_stage s
+        WHERE r.osm_id = s.osm_id AND r.checksum IS DISTINCT FROM s.checksum
+    """,
+    "inserted": """
+        INSERT INTO orders_road (osm_id, name, highway, geom, checksum)
+        SELECT s.osm_id, s.name, s.highway, s.geom, s.checksum
+        FROM road_stage s
+        WHERE s.osm_id IS NULL OR NOT EXISTS (SELECT 1 FROM orders_road r WHERE r.osm_id = s.osm_id)
+    """,
+    "deleted": """
+        DELETE FROM orders_road r
+        WHERE r.osm_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM road_stage s WHERE s.osm_id = r.osm_id)
+          AND (%(highways)s::text[] IS NULL OR r.highway = ANY(%(highways)s::text[]))
+    """,
+}
+
+
+def ensure_gist_index(cursor):
+    """Đảm bảo orders_road.geom có GiST index (migration PostGIS thường đã tạo sẵn)."""
+    cursor.execute(
+        "SELECT 1 FROM pg_indexes WHERE tablename = 'orders_road' AND indexdef ILIKE %s",
+        ["%USING gist%(geom)%"],
+    )
+    if cursor.fetchone() is None:
+        cursor.execute("CREATE INDEX road_geom_gist ON orders_road USING gist (geom)")
+        return True
+    return False
+
+
+def load_roads(records, batch_size=5000, delete_missing=False, highways=None, dry_run=False, progress=None):
+    """
+    records: iterable (osm_id, name, highway, coords). Trả báo cáo
+    {"read", "inserted", "updated", "deleted", "unchanged", "index_created"}.
+    highways: các loại đường records đã được lọc theo (open_source(..., allowed)); delete_missing
+    chỉ xoá Road thuộc các loại này, không đụng loại không nạp.
+    """
+    if connection.vendor != "postgresql":
+        raise OSMLoadError("Nạp Road cần PostgreSQL/PostGIS")
+    report = {"read": 0, "inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "index_created": False}
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(STAGE_DDL)
+        batch = []
+        for rec in records:
+            batch.append(rec)
+            if len(batch) >= batch_size:
+                _copy_batch(cur, batch)
+                report["read"] += len(batch)
+                batch = []
+                if progress:
+                    progress(report)
+        if batch:
+            _copy_batch(cur, batch)
+            report["read"] += len(batch)
+            if progress:
+                progress(report)
+
+        cur.execute("CREATE INDEX ON road_stage (osm_id)")
+        cur.execute("ANALYZE road_stage")
+        cur.execute(MERGE_SQL["dedupe"])
+        cur.execute("SELECT count(*) FROM road_stage")
+        staged = cur.fetchone()[0]
+        steps = ("updated", "inserted", "deleted") if delete_missing else ("updated", "inserted")
+        params = {"highways": sorted(highways) if highways else None}
+        for step in steps:
+            cur.execute(MERGE_SQL[step], params if step == "deleted" else None)
+            report[step] = cur.rowcount
+        report["unchanged"] = staged - report["inserted"] - report["updated"]
+        report["index_created"] = ensure_gist_index(cur)
+        if dry_run:
+            transaction.set_rollback(True)
+    if not dry_run:
+        with connection.cursor() as cur:
+            cur.execute("ANALYZE orders_road")
+    return report
@@ -0,0 +1,71 @@
+import threading
+
+import requests
+from django.conf import settings
+
+from .metrics import TimedSession
+
+
+class OSRMError(Exception):
+    """OSRM trả lỗi hoặc không gọi được."""
+
+
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    """Session dùng chung (keep-alive, connection pool) cho mỗi thread, có đo thời gian (metrics)."""
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = TimedSession()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        _local.session = s
+    return s
+
+
+def fetch_route(pickup, drop, profile: str = "driving") -> dict:
+    """
+    Gọi OSRM /route cho pickup -> drop, pickup/drop là (lat, lng).
+    Trả {"distance_m", "duration_s", "geometry"}; lỗi thì raise OSRMError.
+    """
+    (plat, plng), (dlat, dlng) = pickup, drop
+    base = settings.OSRM_URL.rstrip("/")
+    url = f"{base}/route/v1/{profile}/{plng},{plat};{dlng},{dlat}"
+    try:
+        r = get_session().get(
+            url,
+            params={"overview": "full", "geometries": "geojson"},
+            timeout=settings.OSRM_TIMEOUT,
+        )
+        data = r.json()
+    except (requests.RequestException, ValueError) as e:
+        raise OSRMError(str(e)) from e
+    if data.get("code") != "Ok" or not data.get("routes"):
+        raise OSRMError(data.get("message") or data.get("code") or "OSRM error")
+
+    route = data["routes"][0]
+    return {
+        "distance_m": route["distance"],
+        "duration_s": route["duration"],
+        "geometry": route["geometry"],  # GeoJSON LineString
+    }
+
+
+def fetch_table(points, profile: str = "driving") -> tuple[list, list]:
+    """
+    Gọi OSRM /table cho danh sách (lat, lng).
+    Trả (durations, distances) dạng ma trận n x n (giây, mét); lỗi thì raise OSRMError.
+    """
+    base = settings.OSRM_URL.rstrip("/")
+    coords = ";".join(f"{lng},{lat}" for lat, lng in points)
+    url = f"{base}/table/v1/{profile}/{coords}"
+    try:
+        r = get_session().get(url, params={"annotations": "duration,distance"}, timeout=settings.OSRM_TIMEOUT)
+        data = r.json()
+    except (requests.RequestException, ValueError) as e:
+        raise OSRMError(str(e)) from e
+    if data.get("code") != "Ok" or not data.get("durations") or not data.get("distances"):
+        raise OSRMError(data.get("message") or data.get("code") or "OSRM error")
+    return data["durations"], data["distances"]
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Phân trang keyset theo (created_at, id): mỗi trang là 1 range scan trên index,
+    thời gian không tăng theo độ sâu trang như LIMIT/OFFSET.
+    """
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
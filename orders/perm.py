@@ -1,8 +1,87 @@
+"""
+Phân quyền theo vai trò (Group) và quyền trên từng đơn.
+
+roles(user) nạp tên group 1 lần cho mỗi request (lưu trên đối tượng user của request)
+và cache theo user trong Django cache -> is_admin / is_employee không query DB mỗi lần gọi.
+Cache bị xoá khi group của user thay đổi (m2m_changed) hoặc group bị đổi tên / xoá (signals.py).
+"""
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+
+from .metrics import cache_event
+
+ADMIN_GROUP = "Admin"
+EMPLOYEE_GROUP = "NhanVien"
+
+_REQUEST_ATTR = "_roles_cache"
+
+
+def _conf(name, default):
+    return getattr(settings, "PERMS", {}).get(name, default)
+
+
+def _cache():
+    return caches[_conf("CACHE_ALIAS", "default")]
+
+
+def _key(user_id):
+    return f"roles:{user_id}"
+
+
+def cached_roles(user_id):
+    """frozenset tên group theo user id, qua cache (không cần đối tượng User)."""
+    key = _key(user_id)
+    names = _cache().get(key)
+    cache_event("roles", names is not None)
+    if names is None:
+        names = frozenset(Group.objects.filter(user__id=user_id).values_list("name", flat=True))
+        _cache().set(key, names, _conf("ROLE_TTL", 300))
+    return names
+
+
+def roles(user):
+    """frozenset tên group của user (rỗng nếu chưa đăng nhập)."""
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    names = getattr(user, _REQUEST_ATTR, None)
+    if names is None:
+        names = cached_roles(user.pk)
+        setattr(user, _REQUEST_ATTR, names)
+    return names
+
+
+def preload_roles(user, names):
+    """Gắn sẵn vai trò cho user của request (vd. lấy từ claim JWT)."""
+    setattr(user, _REQUEST_ATTR, frozenset(names))
+
+
+def forget_roles(user_ids, user=None):
+    """Xoá cache vai trò (gọi từ signal khi group thay đổi)."""
+    keys = [_key(uid) for uid in user_ids]
+    if keys:
+        _cache().delete_many(keys)
+    if user is not None and _REQUEST_ATTR in user.__dict__:
+        del user.__dict__[_REQUEST_ATTR]
+
+
 def is_admin(user):
     """Kiểm tra xem user có quyền quản lý toàn hệ thống không."""
-    return user.is_staff or user.groups.filter(name='Admin').exists()
+    return user.is_staff or ADMIN_GROUP in roles(user)
 
 
 def is_employee(user):
     """Kiểm tra xem user là nhân viên giao hàng."""
-    return user.groups.filter(name='NhanVien').exists()
+    return EMPLOYEE_GROUP in roles(user)
+
+
+def sees_all_orders(user):
+    """Staff / superuser thấy mọi đơn; user khác chỉ thấy đơn gán cho mình."""
+    return bool(user.is_staff or user.is_superuser)
+
+
+def can_access_order(user, order):
+    """Quyền xem một đơn: staff, người được gán, hoặc người tạo."""
+    if sees_all_orders(user):
+        return True
+    return user.id is not None and user.id in (order.assigned_to_id, order.created_by_id)
@@ -0,0 +1,151 @@
+"""
+Đẩy thay đổi đơn hàng (trạng thái, người nhận) tới trình duyệt / app qua SSE.
+
+Luồng: signal Order -> publish_order_event() -> broker -> hàng đợi asyncio của
+từng kết nối -> view async order_events (chạy dưới ASGI, deliverysys/asgi.py).
+
+Broker chọn qua settings.REALTIME["BACKEND"]:
+  - InProcessBroker: fan-out trong tiến trình, đủ cho 1 worker ASGI.
+  - RedisBroker: publish qua Redis pub/sub để nhiều worker cùng nhận (cần gói redis).
+Người nhận được lọc giống OrderViewSet.get_queryset: staff thấy mọi đơn, nhân viên
+chỉ thấy đơn gán cho mình (kể cả sự kiện đơn vừa bị chuyển sang người khác).
+Mỗi kết nối nhàn rỗi chỉ tốn 1 asyncio.Queue nhỏ, không có thread riêng.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+
+def _conf(name, default):
+    return getattr(settings, "REALTIME", {}).get(name, default)
+
+
+class Subscription:
+    def __init__(self, user_id, is_staff, maxsize):
+        self.user_id = user_id
+        self.is_staff = is_staff
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflow = False
+
+    def _put(self, event):
+        if self.queue.full():
+            # client đọc không kịp: bỏ sự kiện cũ nhất, báo client tải lại toàn bộ
+            self.queue.get_nowait()
+            self.overflow = True
+        self.queue.put_nowait(event)
+
+    def push(self, event):
+        # publish có thể chạy ở thread khác (view sync, signal) -> chuyển về loop của kết nối
+        self.loop.call_soon_threadsafe(self._put, event)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_user = {}  # user_id -> {Subscription}
+        self.staff = set()
+
+    def subscribe(self, user_id, is_staff=False) -> Subscription:
+        sub = Subscription(user_id, is_staff, _conf("QUEUE_SIZE", 100))
+        with self.lock:
+            if is_staff:
+                self.staff.add(sub)
+            else:
+                self.by_user.setdefault(user_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.staff.discard(sub)
+            subs = self.by_user.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self.by_user[sub.user_id]
+
+    def recipients(self, event):
+        with self.lock:
+            targets = set(self.staff)
+            for uid in {event.get("assigned_to"), event.get("prev_assigned_to")}:
+                if uid is not None:
+                    targets |= self.by_user.get(uid, set())
+        return targets
+
+    def deliver(self, event):
+        for sub in self.recipients(event):
+            sub.push(event)
+
+    def publish(self, event):
+        self.deliver(event)
+
+    def connections(self) -> int:
+        with self.lock:
+            return len(self.staff) + sum(len(s) for s in self.by_user.values())
+
+
+class RedisBroker(InProcessBroker):
+    """publish -> Redis; mỗi worker có 1 task nghe kênh và fan-out cho kết nối của nó."""
+
+    def __init__(self):
+        super().__init__()
+        import redis  # gói tuỳ chọn
+
+        self.url = _conf("REDIS_URL", "redis://127.0.0.1:6379/0")
+        self.channel = _conf("CHANNEL", "deliverysys:orders")
+        self.client = redis.Redis.from_url(self.url)
+        self.listener = None
+
+    def publish(self, event):
+        self.client.publish(self.channel, json.dumps(event, cls=DjangoJSONEncoder))
+
+    def subscribe(self, user_id, is_staff=False):
+        sub = super().subscribe(user_id, is_staff)
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.get_running_loop().create_task(self._listen())
+        return sub
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        async with client.pubsub() as ps:
+            await ps.subscribe(self.channel)
+            async for msg in ps.listen():
+                if msg.get("type") == "message":
+                    self.deliver(json.loads(msg["data"]))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(_conf("BACKEND", "orders.realtime.InProcessBroker"))()
+    return _broker
+
+
+def publish_order_event(kind, order_id, status, assigned_to, prev_assigned_to=None, code=None, updated_at=None):
+    get_broker().publish({
+        "type": kind,  # created | updated | deleted
+        "id": order_id,
+        "code": code,
+        "status": status,
+        "assigned_to": assigned_to,
+        "prev_assigned_to": prev_assigned_to if prev_assigned_to != assigned_to else None,
+        "updated_at": updated_at,
+    })
+
+
+def sse_format(event, event_id=None) -> str:
+    data = json.dumps(event, cls=DjangoJSONEncoder, ensure_ascii=False)
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: order\ndata: {data}\n\n"
@@ -0,0 +1,127 @@
+"""
+Cache tuyến đường pickup -> drop 2 tầng:
+  - tầng 1: LRU trong tiến trình (nhanh nhất, giới hạn số phần tử + TTL)
+  - tầng 2: Django cache framework (dùng chung giữa các worker, vd. Redis)
+Khoá = profile + toạ độ làm tròn (PRECISION chữ số thập phân, 4 ~ 11 m),
+nên các lần tải lại trang chi tiết đơn không gọi lại OSRM.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import cache_event
+from .osrm import fetch_route
+
+# mọi profile có thể nằm trong cache (route API chỉ nhận các profile này)
+ROUTE_PROFILES = ("driving", "cycling", "walking")
+
+
+def _conf(name, default):
+    return getattr(settings, "ROUTE_CACHE", {}).get(name, default)
+
+
+class RouteCache:
+    def __init__(self, alias=None, precision=None, ttl=None, maxsize=None):
+        self.alias = alias or _conf("ALIAS", "default")
+        self.precision = _conf("PRECISION", 4) if precision is None else precision
+        self.ttl = _conf("TTL", 24 * 3600) if ttl is None else ttl
+        self.maxsize = _conf("LOCAL_MAXSIZE", 2048) if maxsize is None else maxsize
+        self._lru = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits_local = 0
+        self.hits_shared = 0
+        self.misses = 0
+
+    # --- khoá ---
+    def make_key(self, pickup, drop, profile="driving") -> str:
+        p = self.precision
+        (plat, plng), (dlat, dlng) = pickup, drop
+        return f"route:{profile}:{plat:.{p}f},{plng:.{p}f};{dlat:.{p}f},{dlng:.{p}f}"
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    # --- tầng 1: LRU ---
+    def _local_get(self, key):
+        with self._lock:
+            item = self._lru.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._lru[key]
+                return None
+            self._lru.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value):
+        with self._lock:
+            self._lru[key] = (time.monotonic() + self.ttl, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+    # --- API ---
+    def get(self, pickup, drop, profile="driving"):
+        key = self.make_key(pickup, drop, profile)
+        value = self._local_get(key)
+        if value is not None:
+            self.hits_local += 1
+            cache_event("route_local", True)
+            return value
+        cache_event("route_local", False)
+        value = self.shared.get(key)
+        if value is not None:
+            self.hits_shared += 1
+            cache_event("route_shared", True)
+            self._local_set(key, value)
+            return value
+        self.misses += 1
+        cache_event("route_shared", False)
+        return None
+
+    def set(self, pickup, drop, value, profile="driving"):
+        key = self.make_key(pickup, drop, profile)
+        self._local_set(key, value)
+        self.shared.set(key, value, self.ttl)
+
+    def get_or_fetch(self, pickup, drop, profile="driving", fetch=fetch_route):
+        """Trả (route, hit). Miss thì gọi fetch(pickup, drop, profile) và lưu lại."""
+        value = self.get(pickup, drop, profile)
+        if value is not None:
+            return value, True
+        value = fetch(pickup, drop, profile)
+        self.set(pickup, drop, value, profile)
+        return value, False
+
+    def invalidate(self, pickup, drop, profiles=ROUTE_PROFILES):
+        for profile in profiles:
+            key = self.make_key(pickup, drop, profile)
+            with self._lock:
+                self._lru.pop(key, None)
+            self.shared.delete(key)
+
+    def clear_local(self):
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self) -> dict:
+        hits = self.hits_local + self.hits_shared
+        total = hits + self.misses
+        return {
+            "hits_local": self.hits_local,
+            "hits_shared": self.hits_shared,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else None,
+            "local_size": len(self._lru),
+            "local_maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "precision": self.precision,
+        }
+
+
+route_cache = RouteCache()
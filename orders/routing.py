@@ -0,0 +1,330 @@
+"""
+Engine định tuyến nội bộ dựa trên bảng Road (không cần gọi OSRM).
+
+Đồ thị lưu dạng CSR (mảng numpy):
+  node_lat/node_lng[n]          toạ độ đỉnh
+  indptr[n+1], indices[m]       danh sách kề
+  length_m[m], duration_s[m]    trọng số cạnh
+  edge_class[m]                 chỉ số loại đường (HIGHWAY_CLASSES), dùng cho ETA (orders/eta.py)
+Tìm đường bằng A* (heuristic haversine), tuyến ngắn nhất theo mét hoặc theo giây.
+Đồ thị được lưu ra file .npz để worker khởi động nhanh, không phải đọc lại Road; mọi
+đường được coi là 2 chiều (chưa đọc tag oneway). Worker nạp lại file sau build_road_graph.
+"""
+import heapq
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EARTH_R = 6371000.0
+
+# Tốc độ trung bình (km/h) theo loại đường OSM; có thể ghi đè qua settings.ROUTING["SPEEDS"]
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 70, "motorway_link": 45,
+    "trunk": 45, "trunk_link": 35,
+    "primary": 35, "primary_link": 30,
+    "secondary": 30, "secondary_link": 25,
+    "tertiary": 25, "tertiary_link": 22,
+    "unclassified": 20, "residential": 20,
+    "living_street": 12, "service": 12,
+    "track": 10, "path": 8,
+}
+DEFAULT_SPEED_KMH = 18
+# thứ tự cố định: chỉ số lưu trong edge_class và trong speed profile của ETA; loại lạ -> "other"
+HIGHWAY_CLASSES = (*HIGHWAY_SPEEDS_KMH, "other")
+_CLASS_INDEX = {h: i for i, h in enumerate(HIGHWAY_CLASSES)}
+
+
+def highway_class(highway) -> int:
+    return _CLASS_INDEX.get(highway or "", _CLASS_INDEX["other"])
+
+# Đường không cho xe máy/ô tô đi
+EXCLUDED_HIGHWAYS = {"footway", "pedestrian", "steps", "cycleway", "bridleway", "corridor", "construction", "proposed"}
+
+
+def _conf(name, default):
+    return getattr(settings, "ROUTING", {}).get(name, default)
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Khoảng cách (m); nhận số thực hoặc mảng numpy."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_R * np.arcsin(np.sqrt(a))
+
+
+def _hav(lat1, lng1, lat2, lng2):
+    # bản thuần Python cho vòng lặp A* (nhanh hơn numpy với scalar)
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_R * math.asin(math.sqrt(a))
+
+
+class RoadGraph:
+    def __init__(self, node_lat, node_lng, indptr, indices, length_m, duration_s, edge_class=None):
+        self.node_lat = np.asarray(node_lat, dtype=np.float64)
+        self.node_lng = np.asarray(node_lng, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.length_m = np.asarray(length_m, dtype=np.float32)
+        self.duration_s = np.asarray(duration_s, dtype=np.float32)
+        # file .npz cũ không có loại đường -> None (ETA coi mọi cạnh là "other")
+        self.edge_class = None if edge_class is None else np.asarray(edge_class, dtype=np.int8)
+        self._lists = None
+        # tốc độ lớn nhất (m/s) để heuristic theo thời gian vẫn admissible
+        with np.errstate(divide="ignore", invalid="ignore"):
+            v = self.length_m / self.duration_s
+        self.max_speed_ms = float(np.nanmax(v)) if len(v) else 1.0
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_lat)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    # ---------- build ----------
+    @classmethod
+    def from_edges(cls, coords, edges):
+        """coords: [(lat, lng)], edges: [(u, v, length_m, duration_s[, class])] (có hướng)."""
+        n = len(coords)
+        lat = np.fromiter((c[0] for c in coords), dtype=np.float64, count=n)
+        lng = np.fromiter((c[1] for c in coords), dtype=np.float64, count=n)
+        if edges:
+            e = np.asarray(edges, dtype=np.float64)
+            order = np.argsort(e[:, 0], kind="stable")
+            e = e[order]
+            src = e[:, 0].astype(np.int64)
+            indptr = np.zeros(n + 1, dtype=np.int64)
+            np.add.at(indptr, src + 1, 1)
+            indptr = np.cumsum(indptr)
+            edge_class = e[:, 4] if e.shape[1] > 4 else None
+            return cls(lat, lng, indptr, e[:, 1], e[:, 2], e[:, 3], edge_class)
+        return cls(lat, lng, np.zeros(n + 1), [], [], [], [])
+
+    @classmethod
+    def from_roads(cls, roads=None, speeds=None, precision=7):
+        """
+        Dựng đồ thị từ Road. Các điểm trùng toạ độ (làm tròn `precision` chữ số)
+        được gộp thành một đỉnh, nên các đoạn đường giao nhau tự nối với nhau.
+        """
+        speeds = {**HIGHWAY_SPEEDS_KMH, **(speeds or _conf("SPEEDS", {}))}
+        if roads is None:
+            from .models import Road
+
+            roads = Road.objects.exclude(highway__in=EXCLUDED_HIGHWAYS).values_list("highway", "geom").iterator(chunk_size=2000)
+
+        node_ids = {}
+        coords = []
+        edges = []
+
+        def node(lng, lat):
+            key = (round(lat, precision), round(lng, precision))
+            i = node_ids.get(key)
+            if i is None:
+                i = node_ids[key] = len(coords)
+                coords.append(key)
+            return i
+
+        for highway, geom in roads:
+            pts = list(geom.coords) if hasattr(geom, "coords") else list(geom)
+            speed_ms = speeds.get(highway or "", DEFAULT_SPEED_KMH) / 3.6
+            cls_idx = highway_class(highway)
+            prev = None
+            for lng, lat in pts:
+                cur = node(lng, lat)
+                if prev is not None and prev != cur:
+                    d = _hav(coords[prev][0], coords[prev][1], coords[cur][0], coords[cur][1])
+                    t = d / speed_ms
+                    edges.append((prev, cur, d, t, cls_idx))
+                    edges.append((cur, prev, d, t, cls_idx))
+                prev = cur
+        return cls.from_edges(coords, edges)
+
+    # ---------- serialize ----------
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        extra = {} if self.edge_class is None else {"edge_class": self.edge_class}
+        # ghi file tạm rồi os.replace -> worker đang nạp lại không đọc phải file dở dang
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    node_lat=self.node_lat, node_lng=self.node_lng,
+                    indptr=self.indptr, indices=self.indices,
+                    length_m=self.length_m, duration_s=self.duration_s,
+                    **extra,
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(
+                z["node_lat"], z["node_lng"], z["indptr"], z["indices"], z["length_m"], z["duration_s"],
+                z["edge_class"] if "edge_class" in z.files else None,
+            )
+
+    # ---------- query ----------
+    def nearest_node(self, lat, lng) -> int:
+        # equirectangular đủ chính xác cho phạm vi một thành phố
+        dx = (self.node_lng - lng) * math.cos(math.radians(lat))
+        dy = self.node_lat - lat
+        return int(np.argmin(dx * dx + dy * dy))
+
+    def _adj(self):
+        if self._lists is None:
+            self._lists = (
+                self.indptr.tolist(), self.indices.tolist(),
+                self.length_m.tolist(), self.duration_s.tolist(),
+                self.node_lat.tolist(), self.node_lng.tolist(),
+            )
+        return self._lists
+
+    def astar(self, src: int, dst: int, weight: str = "duration"):
+        """Trả list đỉnh từ src tới dst, hoặc None nếu không tới được."""
+        indptr, indices, length, duration, lat, lng = self._adj()
+        w = duration if weight == "duration" else length
+        scale = 1.0 / self.max_speed_ms if weight == "duration" else 1.0
+        tlat, tlng = lat[dst], lng[dst]
+
+        g = {src: 0.0}
+        parent = {src: -1}
+        heap = [(0.0, src)]
+        closed = set()
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u == dst:
+                path = []
+                while u != -1:
+                    path.append(u)
+                    u = parent[u]
+                return path[::-1]
+            if u in closed:
+                continue
+            closed.add(u)
+            gu = g[u]
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = gu + w[k]
+                if nd < g.get(v, math.inf):
+                    g[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd + _hav(lat[v], lng[v], tlat, tlng) * scale, v))
+        return None
+
+    def path_edges(self, path, weight: str = "duration") -> list[int]:
+        """Chỉ số cạnh dọc theo path (chọn cạnh song song tốt nhất giữa 2 đỉnh liền nhau)."""
+        indptr, indices, length, duration, _, _ = self._adj()
+        w = duration if weight == "duration" else length
+        return [
+            min((k for k in range(indptr[u], indptr[u + 1]) if indices[k] == v), key=w.__getitem__)
+            for u, v in zip(path, path[1:])
+        ]
+
+    def class_lengths(self, pickup, drop, weight: str = "duration"):
+        """Số mét theo từng loại đường (mảng len(HIGHWAY_CLASSES)) của tuyến pickup -> drop, None nếu không tới được."""
+        path = self.astar(self.nearest_node(*pickup), self.nearest_node(*drop), weight)
+        if path is None:
+            return None
+        edges = np.asarray(self.path_edges(path, weight), dtype=np.int64)
+        out = np.zeros(len(HIGHWAY_CLASSES), dtype=np.float64)
+        if len(edges):
+            cls_idx = self.edge_class[edges] if self.edge_class is not None else _CLASS_INDEX["other"]
+            np.add.at(out, cls_idx, self.length_m[edges])
+        return out
+
+    def route(self, pickup, drop, weight: str = "duration") -> dict | None:
+        """Cùng định dạng với osrm.fetch_route: distance_m, duration_s, geometry."""
+        src = self.nearest_node(*pickup)
+        dst = self.nearest_node(*drop)
+        path = self.astar(src, dst, weight)
+        if path is None:
+            return None
+        _, _, length, duration, lat, lng = self._adj()
+        dist = dur = 0.0
+        for k in self.path_edges(path, weight):
+            dist += length[k]
+            dur += duration[k]
+        return {
+            "distance_m": round(dist, 1),
+            "duration_s": round(dur, 1),
+            "geometry": {"type": "LineString", "coordinates": [[lng[i], lat[i]] for i in path]},
+        }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+_graph_checked = 0.0
+_graph_mtime = None
+
+
+def graph_path() -> Path:
+    return Path(_conf("GRAPH_PATH", Path(settings.BASE_DIR) / "var" / "roadgraph.npz"))
+
+
+def get_graph() -> RoadGraph | None:
+    """
+    Đồ thị dùng chung trong worker; nạp lại khi file đổi (kiểm tra mỗi RELOAD_S giây, sau
+    build_road_graph). Không có file -> None. SegmentIndex của snap dựng lại theo graph mới.
+    """
+    global _graph, _graph_checked, _graph_mtime
+    now = time.monotonic()
+    if now - _graph_checked < _conf("RELOAD_S", 60):
+        return _graph
+    with _graph_lock:
+        if now - _graph_checked < _conf("RELOAD_S", 60):
+            return _graph
+        _graph_checked = now
+        path = graph_path()
+        try:
+            st = path.stat()
+            mtime = (st.st_ino, st.st_mtime_ns)  # os.replace luôn tạo inode mới
+        except FileNotFoundError:
+            _graph = _graph_mtime = None
+            return None
+        if mtime != _graph_mtime:
+            try:
+                _graph = RoadGraph.load(path)
+                _graph_mtime = mtime
+            except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+                logger.warning("Không nạp được road graph %s: %s", path, e)
+    return _graph
+
+
+def reset_graph():
+    global _graph, _graph_checked, _graph_mtime
+    _graph, _graph_checked, _graph_mtime = None, 0.0, None
+
+
+def local_route(pickup, drop, profile: str = "driving") -> dict:
+    """
+    Hàm fetch tương thích route_cache.get_or_fetch; raise OSRMError khi không tìm được.
+    Graph chỉ có tốc độ ô tô (và coi mọi đường là 2 chiều) -> profile khác cũng raise để gọi OSRM.
+    """
+    from .osrm import OSRMError
+
+    if profile != "driving":
+        raise OSRMError(f"Engine nội bộ không hỗ trợ profile {profile}")
+    graph = get_graph()
+    if graph is None:
+        raise OSRMError("Chưa có road graph (chạy manage.py build_road_graph)")
+    route = graph.route(pickup, drop)
+    if route is None:
+        raise OSRMError("NoRoute")
+    return route
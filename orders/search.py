@@ -0,0 +1,106 @@
+"""
+Tìm kiếm đơn hàng.
+
+PostgreSQL: so khớp không dấu, không phân biệt hoa thường trên một "document"
+ghép từ các cột text, tăng tốc bằng GIN index pg_trgm (migration 0005):
+    f_unaccent(lower(code || ' ' || customer_name || ...)) gin_trgm_ops
+"Nguyễn" và "nguyen" cho cùng kết quả. Từ giống mã đơn / số điện thoại được OR thêm
+điều kiện LIKE 'term%' (btree varchar_pattern_ops) và các đơn khớp tiền tố xếp đầu.
+CSDL khác: quay về icontains như SearchFilter mặc định.
+"""
+import re
+import unicodedata
+
+from django.contrib.auth import get_user_model
+from django.db import connection, models
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+SEARCH_COLUMNS = ("code", "customer_name", "phone", "address", "pickup_address", "drop_address")
+
+# Phải trùng khớp biểu thức index trong migration 0005 để planner dùng được index.
+SEARCH_DOC_SQL = "f_unaccent(lower({}))".format(
+    " || ' ' || ".join(f'"orders_order"."{c}"' for c in SEARCH_COLUMNS)
+)
+
+_CODE_LIKE = re.compile(r"^(?=.*\d)[\w-]+$")  # 1 từ có chữ số: mã đơn / SĐT
+
+
+def fold(s: str) -> str:
+    """Bỏ dấu + chữ thường, tương đương f_unaccent(lower(s)) phía PostgreSQL."""
+    s = (s or "").lower().replace("đ", "d")
+    s = unicodedata.normalize("NFD", s)
+    return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+
+
+def _use_trigram() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def _user_ids(term):
+    return get_user_model().objects.filter(username__icontains=term).values("id")
+
+
+def search_orders(queryset, query: str, ranked: bool = False):
+    """
+    Lọc queryset theo chuỗi tìm kiếm (mọi từ đều phải khớp).
+    ranked=True: thêm cột search_rank và sắp xếp theo độ liên quan.
+    """
+    terms = [t for t in (query or "").replace(",", " ").split() if t]
+    if not terms:
+        return queryset
+
+    # 1 từ giống mã đơn / số điện thoại: OR thêm điều kiện tiền tố (btree), cùng 1 query
+    prefix = None
+    if len(terms) == 1 and _CODE_LIKE.match(terms[0]):
+        t = terms[0]
+        prefix = Q(code__startswith=t.upper()) | Q(code__startswith=t) | Q(phone__startswith=t)
+
+    if not _use_trigram():
+        for t in terms:
+            cond = Q()
+            for c in SEARCH_COLUMNS:
+                cond |= Q(**{f"{c}__icontains": t})
+            cond |= Q(assigned_to__in=_user_ids(t))
+            queryset = queryset.filter(cond | prefix if prefix is not None else cond)
+        if ranked and prefix is not None:
+            queryset = queryset.annotate(prefix_hit=_prefix_rank(terms[0], prefix)) \
+                .order_by("-prefix_hit", "-created_at", "-id")
+        return queryset
+
+    queryset = queryset.alias(search_doc=RawSQL(SEARCH_DOC_SQL, [], output_field=models.TextField()))
+    for t in terms:
+        cond = Q(search_doc__contains=fold(t)) | Q(assigned_to__in=_user_ids(t))
+        queryset = queryset.filter(cond | prefix if prefix is not None else cond)
+    if ranked:
+        folded = fold(" ".join(terms))
+        queryset = queryset.annotate(
+            search_rank=RawSQL(f"word_similarity(%s, {SEARCH_DOC_SQL})", [folded], output_field=FloatField()),
+            code_hit=Case(When(code__iexact=terms[0], then=Value(1)), default=Value(0), output_field=IntegerField()),
+        )
+        order = ("-code_hit", "-search_rank", "-created_at", "-id")
+        if prefix is not None:
+            queryset = queryset.annotate(prefix_hit=_prefix_rank(terms[0], prefix))
+            order = ("-prefix_hit",) + order
+        queryset = queryset.order_by(*order)
+    return queryset
+
+
+def _prefix_rank(t, prefix):
+    """2 = trùng khớp mã đơn / SĐT, 1 = khớp tiền tố, 0 = chỉ khớp toàn văn."""
+    return Case(
+        When(Q(code__iexact=t) | Q(phone=t), then=Value(2)),
+        When(prefix, then=Value(1)),
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+class OrderSearchFilter(filters.SearchFilter):
+    """SearchFilter của DRF nhưng dùng backend trigram ở trên (không sắp xếp lại)."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "")
+        if not query.strip():
+            return queryset
+        return search_orders(queryset, query)
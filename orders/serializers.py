@@ -1,3 +1,6 @@
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Order
 
@@ -11,11 +14,68 @@ class OrderSerializer(serializers.ModelSerializer):
             "id", "code", "customer_name",
             "pickup_address", "pickup_lat", "pickup_lng",
             "drop_address", "drop_lat", "drop_lng",
+            "pickup_snap_lat", "pickup_snap_lng", "drop_snap_lat", "drop_snap_lng",
             "address", "phone", "status", "cod",
             "assigned_to", "assigned_to_username",
             "created_at", "updated_at"
         ]
-        read_only_fields = ["created_at", "updated_at", "assigned_to_username"]
+        read_only_fields = [
+            "created_at", "updated_at", "assigned_to_username",
+            "pickup_snap_lat", "pickup_snap_lng", "drop_snap_lat", "drop_snap_lng",
+        ]
 
     def get_assigned_to_username(self, obj):
+        # ưu tiên giá trị annotate sẵn (không tốn query)
+        if hasattr(obj, "assigned_to_username"):
+            return obj.assigned_to_username
         return obj.assigned_to.username if obj.assigned_to else None
+
+
+# ---------- Fast path cho list ----------
+# Đọc thẳng tuple từ values_list() và dựng dict theo "plan" tính sẵn 1 lần,
+# không tạo model instance / field object của DRF cho từng dòng.
+# Kết quả phải giống hệt OrderSerializer(many=True).data.
+
+def _iso_datetime(value):
+    # giống DateTimeField.to_representation của DRF (ISO 8601, theo TIME_ZONE hiện tại)
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def _build_plan():
+    columns, converters = [], []
+    for name in OrderSerializer.Meta.fields:
+        columns.append(name)
+        if name == "assigned_to_username":
+            converters.append(None)
+            continue
+        field = Order._meta.get_field(name)
+        converters.append(_iso_datetime if isinstance(field, models.DateTimeField) else None)
+    convert = [(i, fn) for i, fn in enumerate(converters) if fn is not None]
+    return tuple(columns), tuple(convert)
+
+
+ORDER_LIST_COLUMNS, _ORDER_LIST_CONVERT = _build_plan()
+
+
+def order_list_rows(queryset):
+    """values_list (named) chứa đúng các cột của OrderSerializer; username lấy qua JOIN."""
+    return queryset.annotate(assigned_to_username=F("assigned_to__username")).values_list(
+        *ORDER_LIST_COLUMNS, named=True
+    )
+
+
+def serialize_order_rows(rows):
+    columns, convert = ORDER_LIST_COLUMNS, _ORDER_LIST_CONVERT
+    out = []
+    for row in rows:
+        if convert:
+            row = list(row)
+            for i, fn in convert:
+                row[i] = fn(row[i])
+        out.append(dict(zip(columns, row)))
+    return out
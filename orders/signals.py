@@ -0,0 +1,217 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .dispatch import dispatcher
+from .models import Attendance, Order, Road
+from .perm import forget_roles
+from .realtime import publish_order_event
+from . import stats, sync
+from .route_cache import route_cache
+from .snap import snap_orders
+from .tiles import bump_version as bump_tile_version
+from .tracking import shift_cache
+
+User = get_user_model()
+
+COORD_FIELDS = ("pickup_lat", "pickup_lng", "drop_lat", "drop_lng")
+STAT_FIELDS = ("status", "assigned_to_id", "cod", "updated_at")
+SHIFT_FIELDS = ("employee_id", "check_in", "check_out")
+
+
+def _coords(instance):
+    # Đọc qua __dict__ để không kích hoạt query với field bị defer (.only()).
+    return tuple(instance.__dict__.get(f) for f in COORD_FIELDS)
+
+
+def _loaded(instance, fields):
+    """Giá trị các field nếu đều đã nạp, None nếu có field bị defer (sẽ đọc lại ở pre_save)."""
+    d = instance.__dict__
+    return tuple(d[f] for f in fields) if all(f in d for f in fields) else None
+
+
+@receiver(post_init, sender=Order)
+def remember_route_coords(sender, instance, **kwargs):
+    instance._route_coords_orig = _coords(instance)
+    instance._push_orig = (instance.__dict__.get("status"), instance.__dict__.get("assigned_to_id"))
+    instance._stat_orig = _loaded(instance, STAT_FIELDS)
+
+
+@receiver(post_init, sender=Attendance)
+def remember_shift(sender, instance, **kwargs):
+    instance._shift_orig = _loaded(instance, SHIFT_FIELDS)
+
+
+@receiver(pre_save, sender=Order)
+def snap_route_points(sender, instance, update_fields=None, **kwargs):
+    """Toạ độ pickup/drop mới hoặc vừa đổi -> bám vào đường gần nhất, lưu cùng lần save."""
+    if not all(f in instance.__dict__ for f in COORD_FIELDS):
+        return  # toạ độ bị defer -> lần save này không đụng tới
+    if update_fields is not None and not set(update_fields) & set(COORD_FIELDS):
+        return
+    old = getattr(instance, "_route_coords_orig", None)
+    moved = not instance._state.adding and old is not None and old != _coords(instance)
+    changed = snap_orders([instance], force=moved)
+    if changed and update_fields is not None:
+        # update_fields của save() không mở rộng được từ signal -> ghi riêng sau khi lưu
+        instance._snap_pending = changed
+
+
+@receiver(post_save, sender=Order)
+def save_pending_snap(sender, instance, **kwargs):
+    fields = instance.__dict__.pop("_snap_pending", None)
+    if fields:
+        Order.objects.filter(pk=instance.pk).update(**{f: getattr(instance, f) for f in fields})
+
+
+@receiver(pre_save, sender=Order)
+def load_stat_orig(sender, instance, **kwargs):
+    if not instance._state.adding and getattr(instance, "_stat_orig", None) is None:
+        instance._stat_orig = Order.objects.filter(pk=instance.pk).values_list(*STAT_FIELDS).first()
+
+
+@receiver(pre_save, sender=Order)
+def remember_sync_assignee(sender, instance, **kwargs):
+    # chạy sau load_stat_orig: _stat_orig đã có assigned_to_id trước khi lưu
+    orig = getattr(instance, "_stat_orig", None)
+    instance._sync_prev_assignee = orig[1] if orig else None
+
+
+@receiver(pre_save, sender=Attendance)
+def load_shift_orig(sender, instance, **kwargs):
+    if not instance._state.adding and getattr(instance, "_shift_orig", None) is None:
+        instance._shift_orig = Attendance.objects.filter(pk=instance.pk).values_list(*SHIFT_FIELDS).first()
+
+
+@receiver(post_save, sender=Order)
+def update_order_stats(sender, instance, created, **kwargs):
+    """Đơn vào/ra trạng thái done/cancel -> cộng/trừ vào rollup theo ngày (cùng transaction)."""
+    new = stats.order_state(instance)
+    stats.apply_order_change(None if created else instance._stat_orig, new)
+    instance._stat_orig = new
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_stats(sender, instance, **kwargs):
+    stats.apply_order_change(getattr(instance, "_stat_orig", None) or stats.order_state(instance), None)
+
+
+@receiver(post_save, sender=Attendance)
+def update_shift_stats(sender, instance, created, **kwargs):
+    """Đóng ca (Attendance.close / check-out) -> cộng giờ làm theo từng ngày."""
+    new = stats.shift_state(instance)
+    stats.apply_shift_change(None if created else instance._shift_orig, new)
+    instance._shift_orig = new
+
+
+@receiver(post_delete, sender=Attendance)
+def remove_shift_stats(sender, instance, **kwargs):
+    stats.apply_shift_change(getattr(instance, "_shift_orig", None) or stats.shift_state(instance), None)
+
+
+@receiver(post_save, sender=Order)
+def invalidate_route_cache(sender, instance, created, **kwargs):
+    """Đổi toạ độ pickup/drop -> bỏ tuyến cũ (mọi profile) khỏi cache."""
+    old = getattr(instance, "_route_coords_orig", None)
+    new = _coords(instance)
+    if not created and old and old != new and None not in old:
+        route_cache.invalidate((old[0], old[1]), (old[2], old[3]))
+    instance._route_coords_orig = new
+
+
+@receiver(post_save, sender=Order)
+def auto_dispatch(sender, instance, created, **kwargs):
+    """Đơn mới chưa có người nhận -> gán shipper gần nhất sau khi commit."""
+    if created and instance.status == "new" and not instance.assigned_to_id \
+            and settings.DISPATCH.get("AUTO", False):
+        transaction.on_commit(lambda: dispatcher.assign(instance))
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_changed(sender, instance, **kwargs):
+    # mở/đóng ca -> danh sách shipper sẵn sàng thay đổi
+    dispatcher.mark_dirty()
+    shift_cache.invalidate(instance.employee_id)
+
+
+@receiver(post_save, sender=Order)
+def push_order_change(sender, instance, created, **kwargs):
+    """Đổi trạng thái / người nhận -> đẩy sự kiện SSE sau khi commit."""
+    old_status, old_assignee = getattr(instance, "_push_orig", (None, None))
+    status, assignee = instance.status, instance.assigned_to_id
+    instance._push_orig = (status, assignee)
+    if not created and (old_status, old_assignee) == (status, assignee):
+        return
+    args = dict(
+        kind="created" if created else "updated", order_id=instance.pk, code=instance.code,
+        status=status, assigned_to=assignee, prev_assigned_to=old_assignee, updated_at=instance.updated_at,
+    )
+    transaction.on_commit(lambda: publish_order_event(**args))
+
+
+@receiver(post_delete, sender=Order)
+def push_order_delete(sender, instance, **kwargs):
+    args = dict(kind="deleted", order_id=instance.pk, code=instance.code,
+                status=instance.status, assigned_to=instance.assigned_to_id)
+    transaction.on_commit(lambda: publish_order_event(**args))
+
+
+@receiver(post_save, sender=Road)
+@receiver(post_delete, sender=Road)
+def invalidate_road_tiles(sender, **kwargs):
+    # tile đường cũ trên đĩa không còn đúng -> sang version mới sau khi commit;
+    # sửa nhiều Road trong 1 transaction chỉ bump 1 lần
+    pending = transaction.get_connection().run_on_commit
+    if any(entry[1] is bump_tile_version for entry in pending):
+        return
+    transaction.on_commit(bump_tile_version)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # group.user_set.clear(): post_clear không có pk_set -> lấy danh sách trước khi xoá
+        instance._roles_clear_ids = list(instance.user_set.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:  # user.groups.add/remove/clear
+        forget_roles([instance.pk], instance)
+    elif action == "post_clear":
+        forget_roles(instance.__dict__.pop("_roles_clear_ids", []))
+    else:  # group.user_set.add/remove
+        forget_roles(pk_set or ())
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_members(sender, instance, **kwargs):
+    if instance.pk:
+        instance._roles_member_ids = list(instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Group)
+def forget_group_members(sender, instance, **kwargs):
+    forget_roles(instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_roles(sender, instance, created, **kwargs):
+    # đổi tên group -> vai trò của mọi thành viên đổi theo
+    if not created:
+        forget_roles(instance.__dict__.pop("_roles_member_ids", []))
+
+
+@receiver(post_save, sender=Order)
+def log_order_change(sender, instance, created, **kwargs):
+    """Ghi nhật ký cho /orders/api/sync/ (cùng transaction với thay đổi)."""
+    prev = instance.__dict__.pop("_sync_prev_assignee", None)
+    assignee = instance.assigned_to_id
+    sync.record([("upsert", instance.pk, assignee, prev if prev != assignee else None)])
+
+
+@receiver(post_delete, sender=Order)
+def log_order_delete(sender, instance, **kwargs):
+    sync.record([("delete", instance.pk, instance.__dict__.get("assigned_to_id"), None)])
@@ -0,0 +1,201 @@
+"""
+Bám điểm vào đường gần nhất (snap-to-road) phía server.
+
+  1. PostGIS: KNN `geom <-> point` trên GiST index của orders_road (LIMIT 1),
+     điểm bám = ST_ClosestPoint; nhiều điểm gộp 1 query (unnest + LATERAL).
+  2. Dự phòng trong bộ nhớ: SegmentIndex - lưới đều các đoạn thẳng dựng từ road graph
+     (.npz của orders/routing.py), tính hình chiếu bằng numpy.
+Kết quả được lưu vào Order.*_snap_lat/lng khi toạ độ thay đổi (signal pre_save),
+nên trang chi tiết không phải snap lại mỗi lần xem.
+"""
+import math
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from .routing import EXCLUDED_HIGHWAYS, get_graph
+
+EARTH_R = 6371000.0
+_M_PER_DEG = math.pi * EARTH_R / 180
+
+
+def _conf(name, default):
+    return getattr(settings, "SNAP", {}).get(name, default)
+
+
+# ---------- dự phòng trong bộ nhớ ----------
+class SegmentIndex:
+    """Lưới đều (cell_deg) -> mảng id đoạn thẳng có bbox chạm ô đó."""
+
+    def __init__(self, ax, ay, bx, by, cell_deg=0.002):
+        # x = lng, y = lat
+        self.ax, self.ay, self.bx, self.by = (np.asarray(v, dtype=np.float64) for v in (ax, ay, bx, by))
+        self.cell = cell_deg
+        cells = {}
+        x0 = np.floor(np.minimum(self.ax, self.bx) / cell_deg).astype(np.int64)
+        x1 = np.floor(np.maximum(self.ax, self.bx) / cell_deg).astype(np.int64)
+        y0 = np.floor(np.minimum(self.ay, self.by) / cell_deg).astype(np.int64)
+        y1 = np.floor(np.maximum(self.ay, self.by) / cell_deg).astype(np.int64)
+        for i in range(len(self.ax)):
+            for cx in range(x0[i], x1[i] + 1):
+                for cy in range(y0[i], y1[i] + 1):
+                    cells.setdefault((cx, cy), []).append(i)
+        self.cells = {k: np.asarray(v, dtype=np.int64) for k, v in cells.items()}
+
+    @classmethod
+    def from_graph(cls, graph, cell_deg=0.002):
+        n = graph.n_nodes
+        src = np.repeat(np.arange(n), np.diff(graph.indptr))
+        dst = graph.indices.astype(np.int64)
+        pairs = np.unique(np.stack([np.minimum(src, dst), np.maximum(src, dst)], axis=1), axis=0) \
+            if len(src) else np.zeros((0, 2), dtype=np.int64)
+        a, b = pairs[:, 0], pairs[:, 1]
+        return cls(graph.node_lng[a], graph.node_lat[a], graph.node_lng[b], graph.node_lat[b], cell_deg)
+
+    def __len__(self):
+        return len(self.ax)
+
+    def _candidates(self, lat, lng, ring):
+        cx, cy = math.floor(lng / self.cell), math.floor(lat / self.cell)
+        found = [
+            self.cells[(i, j)]
+            for i in range(cx - ring, cx + ring + 1)
+            for j in range(cy - ring, cy + ring + 1)
+            if (i, j) in self.cells
+        ]
+        return np.unique(np.concatenate(found)) if found else None
+
+    def nearest(self, lat, lng, max_m):
+        """Trả (lat, lng, distance_m) của điểm gần nhất trên đoạn thẳng trong bán kính max_m, hoặc None."""
+        max_ring = max(1, math.ceil(max_m / (self.cell * _M_PER_DEG)))
+        ids = self._candidates(lat, lng, max_ring)
+        if ids is None:
+            return None
+        # chiếu equirectangular quanh điểm cần snap (mét)
+        kx = _M_PER_DEG * math.cos(math.radians(lat))
+        ax, ay = (self.ax[ids] - lng) * kx, (self.ay[ids] - lat) * _M_PER_DEG
+        bx, by = (self.bx[ids] - lng) * kx, (self.by[ids] - lat) * _M_PER_DEG
+        dx, dy = bx - ax, by - ay
+        seg2 = dx * dx + dy * dy
+        t = np.where(seg2 > 0, -(ax * dx + ay * dy) / np.where(seg2 > 0, seg2, 1), 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        px, py = ax + t * dx, ay + t * dy
+        d2 = px * px + py * py
+        k = int(np.argmin(d2))
+        dist = math.sqrt(d2[k])
+        if dist > max_m:
+            return None
+        return float(lat + py[k] / _M_PER_DEG), float(lng + px[k] / kx), dist
+
+
+_index = None
+_index_graph = None
+_index_lock = threading.Lock()
+
+
+def get_segment_index():
+    """Dựng SegmentIndex từ road graph đang dùng (dựng lại khi graph được nạp lại)."""
+    global _index, _index_graph
+    graph = get_graph()
+    if graph is None:
+        return None
+    if _index is None or _index_graph is not graph:
+        with _index_lock:
+            if _index is None or _index_graph is not graph:
+                _index = SegmentIndex.from_graph(graph, _conf("CELL_DEG", 0.002))
+                _index_graph = graph
+    return _index
+
+
+# ---------- PostGIS ----------
+SNAP_SQL = """
+SELECT q.i, ST_Y(s.p), ST_X(s.p), s.d
+FROM (
+    SELECT u.i, ST_SetSRID(ST_MakePoint(u.lng, u.lat), 4326) AS pt
+    FROM unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS u(lat, lng, i)
+) q
+CROSS JOIN LATERAL (
+    SELECT ST_ClosestPoint(r.geom, q.pt) AS p,
+           ST_Distance(r.geom::geography, q.pt::geography) AS d
+    FROM orders_road r
+    WHERE r.highway IS NULL OR r.highway <> ALL(%s)
+    ORDER BY r.geom <-> q.pt
+    LIMIT 1
+) s
+"""
+
+
+def _snap_db(points):
+    lats = [p[0] for p in points]
+    lngs = [p[1] for p in points]
+    # savepoint: lỗi (chưa có bảng/PostGIS) không làm hỏng transaction của request đang lưu Order
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(SNAP_SQL, [lats, lngs, sorted(EXCLUDED_HIGHWAYS)])
+        return {int(i) - 1: (lat, lng, d) for i, lat, lng, d in cur.fetchall()}
+
+
+# ---------- API ----------
+def snap_many(points, max_m=None):
+    """
+    points: [(lat, lng), ...] -> list cùng độ dài, mỗi phần tử (lat, lng, distance_m, source) | None.
+    None = không có đường nào trong bán kính max_m.
+    """
+    max_m = max_m if max_m is not None else _conf("MAX_DISTANCE_M", 200)
+    out = [None] * len(points)
+    if not points:
+        return out
+    if connection.vendor == "postgresql" and _conf("USE_DB", True):
+        try:
+            for i, (lat, lng, d) in _snap_db(points).items():
+                if d is not None and d <= max_m:
+                    out[i] = (lat, lng, d, "postgis")
+            return out
+        except DatabaseError:
+            pass  # chưa có bảng/PostGIS -> dùng chỉ mục trong bộ nhớ
+    index = get_segment_index()
+    if index is None or not len(index):
+        return out
+    for i, (lat, lng) in enumerate(points):
+        hit = index.nearest(lat, lng, max_m)
+        if hit is not None:
+            out[i] = (*hit, "memory")
+    return out
+
+
+def snap_point(lat, lng, max_m=None):
+    return snap_many([(lat, lng)], max_m)[0]
+
+
+SNAP_FIELDS = {
+    "pickup": ("pickup_lat", "pickup_lng", "pickup_snap_lat", "pickup_snap_lng"),
+    "drop": ("drop_lat", "drop_lng", "drop_snap_lat", "drop_snap_lng"),
+}
+
+
+def snap_orders(orders, force=False):
+    """
+    Điền *_snap_lat/lng cho các Order (chưa lưu). force=False: chỉ điểm chưa có snap.
+    Trả list tên field đã đổi (để dùng với bulk_update / update_fields).
+    """
+    todo = []
+    changed = set()
+    for o in orders:
+        for lat_f, lng_f, slat_f, slng_f in SNAP_FIELDS.values():
+            lat, lng = getattr(o, lat_f), getattr(o, lng_f)
+            if lat is None or lng is None:
+                if getattr(o, slat_f) is not None:
+                    setattr(o, slat_f, None)
+                    setattr(o, slng_f, None)
+                    changed.update((slat_f, slng_f))
+                continue
+            if force or getattr(o, slat_f) is None:
+                todo.append((o, slat_f, slng_f, (lat, lng)))
+    if not todo:
+        return sorted(changed)
+    for (o, slat_f, slng_f, _), hit in zip(todo, snap_many([t[3] for t in todo])):
+        setattr(o, slat_f, hit[0] if hit else None)
+        setattr(o, slng_f, hit[1] if hit else None)
+        changed.update((slat_f, slng_f))
+    return sorted(changed)
@@ -0,0 +1,311 @@
+"""
+Tổng hợp hiệu suất nhân viên theo ngày (bảng EmployeeDailyStat).
+
+Cập nhật cộng dồn, cùng transaction với thay đổi gốc:
+  - Order: đơn ở trạng thái done/cancel được tính vào (người nhận, ngày của updated_at);
+    khi trạng thái / người nhận / COD / ngày đổi thì trừ phần cũ, cộng phần mới.
+  - Attendance: ca đã đóng cộng shift_count vào ngày check-in, thời gian làm
+    được tách theo từng ngày (qua nửa đêm giờ địa phương).
+performance_stats chỉ cần cộng các dòng trong khoảng ngày + phần ca đang mở.
+Các đường ghi không phát signal tự cộng: bulk_create khi import gọi record_orders(),
+check-in/out bằng SQL (attendance.py) gọi apply_shift_change();
+lệch số liệu (sửa DB tay, update_fields bỏ updated_at...) sửa bằng `manage.py rebuild_daily_stats`.
+"""
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import PercentRank, Rank, TruncDate
+from django.utils import timezone
+
+from .models import Attendance, EmployeeDailyStat, Order
+
+CLOSED_STATUSES = ("done", "cancel")
+STAT_FIELDS = ("done_count", "cancel_count", "cod_sum", "worked_seconds", "shift_count")
+LEADERBOARD_SORTS = ("done", "cod", "orders_per_hour")
+
+
+def _conf(name, default):
+    return getattr(settings, "STATS", {}).get(name, default)
+
+
+def local_day(dt):
+    return timezone.localdate(dt)
+
+
+def day_bounds(day):
+    """[00:00 ngày day, 00:00 ngày hôm sau) theo giờ địa phương."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, dt_time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), dt_time.min), tz)
+    return start, end
+
+
+def split_by_day(start, end):
+    """Tách khoảng [start, end) tại nửa đêm giờ địa phương -> [(ngày, giây), ...]."""
+    out = []
+    cur = start
+    while cur < end:
+        day = local_day(cur)
+        nxt = min(day_bounds(day)[1], end)
+        out.append((day, int((nxt - cur).total_seconds())))
+        cur = nxt
+    return out
+
+
+# ---------- ghi cộng dồn ----------
+def bump(employee_id, day, **deltas):
+    """Cộng deltas vào dòng (employee, day); tạo dòng nếu chưa có. An toàn khi chạy song song."""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas or employee_id is None:
+        return
+    expr = {k: F(k) + v for k, v in deltas.items()}
+    qs = EmployeeDailyStat.objects.filter(employee_id=employee_id, day=day)
+    if qs.update(**expr):
+        return
+    try:
+        with transaction.atomic():
+            EmployeeDailyStat.objects.create(employee_id=employee_id, day=day, **deltas)
+    except IntegrityError:
+        # request khác vừa tạo dòng này
+        qs.update(**expr)
+
+
+def _order_part(state):
+    """state = (status, assigned_to_id, cod, updated_at) -> (employee, day, deltas) | None."""
+    if state is None:
+        return None
+    status, assignee, cod, updated_at = state
+    if status not in CLOSED_STATUSES or assignee is None or updated_at is None:
+        return None
+    if status == "done":
+        deltas = {"done_count": 1, "cod_sum": cod or 0}
+    else:
+        deltas = {"cancel_count": 1}
+    return assignee, local_day(updated_at), deltas
+
+
+def order_state(order):
+    return order.status, order.assigned_to_id, order.cod, order.updated_at
+
+
+def apply_order_change(old, new):
+    """old/new: order_state(...) trước và sau khi lưu (None = chưa có / đã xoá)."""
+    before, after = _order_part(old), _order_part(new)
+    if before == after:
+        return
+    if before is not None:
+        emp, day, deltas = before
+        bump(emp, day, **{k: -v for k, v in deltas.items()})
+    if after is not None:
+        emp, day, deltas = after
+        bump(emp, day, **deltas)
+
+
+def record_orders(orders):
+    """Đơn vừa bulk_create (không có post_save): gộp theo (nhân viên, ngày) rồi cộng 1 lần."""
+    acc = defaultdict(lambda: defaultdict(int))
+    for o in orders:
+        part = _order_part(order_state(o))
+        if part is not None:
+            emp, day, deltas = part
+            for k, v in deltas.items():
+                acc[(emp, day)][k] += v
+    for (emp, day), deltas in acc.items():
+        bump(emp, day, **deltas)
+
+
+def _shift_parts(employee_id, check_in, check_out):
+    if employee_id is None or check_in is None or check_out is None or check_out <= check_in:
+        return []
+    parts = [(local_day(check_in), {"shift_count": 1})]
+    parts += [(day, {"worked_seconds": sec}) for day, sec in split_by_day(check_in, check_out)]
+    return [(employee_id, day, d) for day, d in parts]
+
+
+def shift_state(att):
+    return att.employee_id, att.check_in, att.check_out
+
+
+def apply_shift_change(old, new):
+    """old/new: shift_state(...) trước và sau khi lưu; chỉ ca đã đóng mới được tính."""
+    if old == new:
+        return
+    for emp, day, deltas in _shift_parts(*old) if old else ():
+        bump(emp, day, **{k: -v for k, v in deltas.items()})
+    for emp, day, deltas in _shift_parts(*new) if new else ():
+        bump(emp, day, **deltas)
+
+
+# ---------- đọc ----------
+def summarize(employee_id, dfrom, dto):
+    """
+    Tổng hợp theo ngày địa phương trong [ngày của dfrom, ngày của dto]:
+    cộng các dòng rollup + thời gian của ca đang mở (phần nằm trong khoảng).
+    """
+    d0, d1 = local_day(dfrom), local_day(dto)
+    agg = EmployeeDailyStat.objects.filter(employee_id=employee_id, day__range=(d0, d1)).aggregate(
+        **{k: Sum(k) for k in STAT_FIELDS}
+    )
+    out = {k: agg[k] or 0 for k in STAT_FIELDS}
+
+    open_in = (
+        Attendance.objects.filter(employee_id=employee_id, check_out__isnull=True)
+        .values_list("check_in", flat=True).first()
+    )
+    if open_in is not None:
+        now = timezone.now()
+        out["worked_seconds"] += sum(sec for day, sec in split_by_day(open_in, now) if d0 <= day <= d1)
+        if d0 <= local_day(open_in) <= d1:
+            out["shift_count"] += 1
+    return out
+
+
+def _open_shift_seconds(d0, d1, now):
+    """Ca đang mở giao với [d0, d1] -> {employee_id: (giây trong khoảng, ca bắt đầu trong khoảng?)}."""
+    out = {}
+    for emp, check_in in Attendance.objects.filter(check_out__isnull=True).values_list("employee_id", "check_in"):
+        sec = sum(s for day, s in split_by_day(check_in, now) if d0 <= day <= d1)
+        if sec:
+            out[emp] = (sec, d0 <= local_day(check_in) <= d1)
+    return out
+
+
+def _rank_desc(rows, key, rank_name, pct_name):
+    """
+    rank() theo key giảm dần + percent_rank() theo key tăng dần, giống hàm cửa sổ SQL
+    (đồng hạng cùng rank; None xếp cuối).
+    """
+    rows.sort(key=lambda r: (r[key] is None, -(r[key] or 0)))
+    n = len(rows)
+    i = 0
+    while i < n:
+        j = i
+        while j < n and rows[j][key] == rows[i][key]:
+            j += 1
+        lower = n - j  # số dòng nhỏ hơn nhóm đồng hạng này
+        for r in rows[i:j]:
+            r[rank_name] = i + 1
+            r[pct_name] = round(lower / (n - 1), 4) if n > 1 else 0.0
+        i = j
+
+
+def leaderboard(dfrom, dto, sort="done", limit=None):
+    """
+    Bảng xếp hạng mọi nhân viên trong [ngày của dfrom, ngày của dto]:
+    1 query GROUP BY trên EmployeeDailyStat, rank + percentile theo done/COD bằng hàm cửa sổ.
+    orders_per_hour cần cộng giờ của ca đang mở nên được xếp hạng sau, trong Python.
+    Kết quả cache theo khoảng ngày (thêm phút hiện tại nếu khoảng chứa hôm nay).
+    percentile: 1.0 = cao nhất, 0.0 = thấp nhất.
+    """
+    if sort not in LEADERBOARD_SORTS:
+        raise ValueError(f"sort phải thuộc {LEADERBOARD_SORTS}")
+    d0, d1 = local_day(dfrom), local_day(dto)
+    now = timezone.now()
+    today = local_day(now)
+    live = d1 >= today
+    # khoảng có hôm nay: khoá theo phút để số liệu ca đang mở không cũ quá TTL
+    bucket = now.strftime("%Y%m%d%H%M") if live else "closed"
+    key = f"leaderboard:{d0}:{d1}:{bucket}"
+    cache = caches[_conf("CACHE_ALIAS", "default")]
+    rows = cache.get(key)
+    if rows is None:
+        done, cod = Sum("done_count"), Sum("cod_sum")
+        qs = (
+            EmployeeDailyStat.objects.filter(day__range=(d0, d1))
+            .values("employee_id")
+            .annotate(
+                username=F("employee__username"),
+                done=done, cancel=Sum("cancel_count"), cod=cod,
+                worked_seconds=Sum("worked_seconds"), shifts=Sum("shift_count"),
+                done_rank=Window(Rank(), order_by=done.desc()),
+                done_pct=Window(PercentRank(), order_by=done.asc()),
+                cod_rank=Window(Rank(), order_by=cod.desc()),
+                cod_pct=Window(PercentRank(), order_by=cod.asc()),
+            )
+            .order_by("done_rank", "employee_id")
+        )
+        rows = [dict(r) for r in qs]
+        extra = _open_shift_seconds(d0, d1, now) if live else {}
+        seen = {r["employee_id"] for r in rows}
+        if extra:
+            # nhân viên mới vào ca lần đầu trong khoảng: chưa có dòng rollup nào
+            from django.contrib.auth import get_user_model
+
+            names = dict(
+                get_user_model().objects.filter(id__in=set(extra) - seen).values_list("id", "username")
+            )
+            for emp, name in names.items():
+                rows.append({
+                    "employee_id": emp, "username": name, "done": 0, "cancel": 0, "cod": 0,
+                    "worked_seconds": 0, "shifts": 0, "done_rank": None, "done_pct": None,
+                    "cod_rank": None, "cod_pct": None,
+                })
+        for r in rows:
+            if r["employee_id"] in extra:
+                sec, started = extra[r["employee_id"]]
+                r["worked_seconds"] += sec
+                r["shifts"] += int(started)
+            hours = r["worked_seconds"] / 3600.0
+            r["worked_hours"] = round(hours, 2)
+            r["orders_per_hour"] = round(r["done"] / hours, 2) if hours > 0 else None
+            for k in ("done_pct", "cod_pct"):
+                if r[k] is not None:
+                    r[k] = round(r[k], 4)
+        _rank_desc(rows, "orders_per_hour", "oph_rank", "oph_pct")
+        if any(r["done_rank"] is None for r in rows):
+            # có nhân viên thêm ngoài query -> tính lại rank done/COD cho cả danh sách
+            _rank_desc(rows, "cod", "cod_rank", "cod_pct")
+            _rank_desc(rows, "done", "done_rank", "done_pct")
+        cache.set(key, rows, _conf("LEADERBOARD_TTL_LIVE", 60) if live else _conf("LEADERBOARD_TTL", 3600))
+
+    order = {"done": "done_rank", "cod": "cod_rank", "orders_per_hour": "oph_rank"}[sort]
+    rows = sorted(rows, key=lambda r: (r[order], r["employee_id"]))
+    return rows[:limit] if limit else rows
+
+
+# ---------- dựng lại ----------
+def rebuild(day_from, day_to, employee_ids=None):
+    """Tính lại toàn bộ rollup trong [day_from, day_to] từ Order + Attendance. Trả số dòng đã ghi."""
+    start, end = day_bounds(day_from)[0], day_bounds(day_to)[1]
+    acc = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+
+    orders = Order.objects.filter(
+        status__in=CLOSED_STATUSES, assigned_to__isnull=False, updated_at__gte=start, updated_at__lt=end,
+    )
+    shifts = Attendance.objects.filter(check_out__isnull=False, check_in__lt=end, check_out__gt=start)
+    existing = EmployeeDailyStat.objects.filter(day__range=(day_from, day_to))
+    if employee_ids:
+        orders = orders.filter(assigned_to_id__in=employee_ids)
+        shifts = shifts.filter(employee_id__in=employee_ids)
+        existing = existing.filter(employee_id__in=employee_ids)
+
+    rows = (
+        orders.annotate(day=TruncDate("updated_at", tzinfo=timezone.get_current_timezone()))
+        .values("assigned_to_id", "day")
+        .annotate(
+            done=Count("id", filter=Q(status="done")),
+            cancel=Count("id", filter=Q(status="cancel")),
+            cod=Sum("cod", filter=Q(status="done")),
+        )
+    )
+    for r in rows:
+        a = acc[(r["assigned_to_id"], r["day"])]
+        a["done_count"] += r["done"]
+        a["cancel_count"] += r["cancel"]
+        a["cod_sum"] += r["cod"] or 0
+
+    for emp, check_in, check_out in shifts.values_list("employee_id", "check_in", "check_out").iterator():
+        for e, day, deltas in _shift_parts(emp, check_in, check_out):
+            if day_from <= day <= day_to:
+                for k, v in deltas.items():
+                    acc[(e, day)][k] += v
+
+    objs = [EmployeeDailyStat(employee_id=emp, day=day, **vals) for (emp, day), vals in acc.items()]
+    with transaction.atomic():
+        existing.delete()
+        EmployeeDailyStat.objects.bulk_create(objs, batch_size=2000)
+    return len(objs)
@@ -0,0 +1,155 @@
+"""
+Đồng bộ delta cho app shipper (GET /orders/api/sync/?since=<token>).
+
+Mọi thay đổi Order ghi 1 dòng OrderChange cùng transaction (signal; các đường ghi hàng loạt
+không phát signal gọi record() trực tiếp). Token = "<txid>.<id>" của dòng cuối đã trả:
+  - chỉ đọc dòng của transaction có txid < xmin của snapshot hiện tại (mọi transaction
+    nhỏ hơn đã kết thúc) -> transaction commit muộn không bị con trỏ vượt qua
+  - token rỗng / cũ hơn mốc dọn nhật ký (prune) -> "reset": client tải lại toàn bộ
+Kết quả gộp theo đơn: đơn còn xem được -> gửi dòng hiện tại; không còn (đã xoá,
+đã gán cho người khác) -> chỉ gửi id trong "removed".
+
+list_version(): phiên bản danh sách đơn đọc từ cuối bảng OrderChange (chung cho mọi worker,
+theo PK nên không quét bảng Order) -> ETag của list API. Ghi thẳng SQL không qua record()
+thì không đổi phiên bản.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Order, OrderChange
+from .perm import sees_all_orders
+from .serializers import order_list_rows, serialize_order_rows
+
+
+def _conf(name, default):
+    return getattr(settings, "SYNC", {}).get(name, default)
+
+
+# ---------- ghi ----------
+def record(changes):
+    """changes: iterable (kind, order_id, assignee, prev_assignee)."""
+    rows = [
+        OrderChange(kind=kind, order_id=oid, assignee=assignee, prev_assignee=prev)
+        for kind, oid, assignee, prev in changes
+    ]
+    if rows:
+        OrderChange.objects.bulk_create(rows, batch_size=2000)
+
+
+def record_orders(orders, prev_assignee=None):
+    """Đơn vừa bulk_create / bulk_update / update() (không có post_save)."""
+    record(("upsert", o.pk, o.assigned_to_id, prev_assignee) for o in orders)
+
+
+# ---------- phiên bản danh sách (ETag) ----------
+LIST_VERSION_SQL = """
+SELECT c.id, c.created_at,
+       (SELECT count(*) FROM orders_orderchange r WHERE r.id > c.id - %s)
+FROM orders_orderchange c
+ORDER BY c.id DESC
+LIMIT 1
+"""
+
+
+def list_version():
+    """
+    -> (chuỗi phiên bản, thời điểm thay đổi cuối | None); 1 query theo PK.
+    id lớn nhất chưa đủ: transaction lấy id nhỏ hơn có thể commit sau -> kèm số dòng trong
+    ETAG_WINDOW id cuối, dòng commit muộn làm số này tăng.
+    """
+    with connection.cursor() as cur:
+        cur.execute(LIST_VERSION_SQL, [_conf("ETAG_WINDOW", 1000)])
+        row = cur.fetchone()
+    if row is None:
+        return "0", None
+    last_id, changed_at, recent = row
+    return f"{last_id}.{recent}", changed_at
+
+
+# ---------- token ----------
+def _snapshot_xmin():
+    with connection.cursor() as cur:
+        cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return cur.fetchone()[0]
+
+
+def format_token(txid, change_id):
+    return f"{txid}.{change_id}"
+
+
+def parse_token(raw):
+    """'<txid>.<id>' -> (txid, id); ValueError nếu sai."""
+    txid, _, change_id = (raw or "").partition(".")
+    return int(txid), int(change_id or 0)
+
+
+def current_token():
+    """Token cho client vừa tải toàn bộ danh sách: chỉ nhận thay đổi từ thời điểm này."""
+    return format_token(_snapshot_xmin(), 0)
+
+
+def _expired(txid):
+    return OrderChange.objects.filter(kind="prune", txid__gt=txid).exists()
+
+
+# ---------- đọc ----------
+def changes_since(user, token, limit=None):
+    """
+    -> {"reset": True, "next"} nếu client phải tải lại toàn bộ, ngược lại
+    {"next", "more", "upserts": [dòng như list API], "removed": [id]}.
+    """
+    limit = limit or _conf("MAX_CHANGES", 500)
+    try:
+        since = parse_token(token)
+    except ValueError:
+        since = None
+    if since is None or _expired(since[0]):
+        return {"reset": True, "next": current_token()}
+
+    xmin = _snapshot_xmin()
+    txid, change_id = since
+    qs = (
+        OrderChange.objects.exclude(kind="prune")
+        .filter(txid__lt=xmin)
+        .filter(Q(txid__gt=txid) | Q(txid=txid, id__gt=change_id))
+    )
+    visible = Order.objects.all()
+    if not sees_all_orders(user):
+        qs = qs.filter(Q(assignee=user.id) | Q(prev_assignee=user.id))
+        visible = visible.filter(assigned_to=user)
+    page = list(qs.order_by("txid", "id").values_list("txid", "id", "order_id")[:limit + 1])
+    more = len(page) > limit
+    page = page[:limit]
+
+    if more:
+        nxt = format_token(page[-1][0], page[-1][1])
+    else:
+        # đã đọc hết mọi transaction < xmin
+        nxt = format_token(max(xmin, txid), 0 if xmin > txid else change_id)
+    touched = {oid for _, _, oid in page}
+    upserts = serialize_order_rows(order_list_rows(visible.filter(id__in=touched).order_by("id"))) if touched else []
+    seen = {r["id"] for r in upserts}
+    return {
+        "next": nxt,
+        "more": more,
+        "upserts": upserts,
+        "removed": sorted(touched - seen),
+    }
+
+
+# ---------- dọn ----------
+def prune(days=None):
+    """Xoá nhật ký cũ hơn RETENTION_DAYS, để lại mốc "prune" (client cũ hơn mốc -> reset)."""
+    cutoff = timezone.now() - timedelta(days=days or _conf("RETENTION_DAYS", 30))
+    with transaction.atomic():
+        last = OrderChange.objects.filter(created_at__lt=cutoff).aggregate(t=Max("txid"))["t"]
+        if last is None:
+            return 0
+        n, _ = OrderChange.objects.filter(txid__lte=last).delete()
+        # dòng mốc có txid của transaction này (> mọi dòng vừa xoá)
+        OrderChange.objects.create(kind="prune")
+    return n
@@ -0,0 +1,205 @@
+"""
+Tile mạng lưới đường (bảng Road) theo sơ đồ /z/x/y của web map.
+
+  - Mỗi zoom chỉ lấy các loại highway đủ quan trọng (HIGHWAY_MIN_ZOOM).
+  - Hình học được cắt theo khung tile (+ lề) và đơn giản hoá với sai số ~TOLERANCE_PX pixel.
+  - Định dạng: GeoJSON (EPSG:4326) hoặc Mapbox Vector Tile (ST_AsMVT, PostGIS >= 3.0).
+  - Tile đã sinh được ghi ra đĩa: CACHE_DIR/<version>/<z>/<x>/<y>.<ext>.
+    Road thay đổi -> bump_version() -> tile cũ không còn được đọc (dọn bằng prune()).
+Version lưu trong file để mọi worker trên cùng máy thấy ngay.
+"""
+import math
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import cache_event
+
+FORMATS = {"geojson": "application/geo+json", "pbf": "application/vnd.mapbox-vector-tile"}
+
+# zoom tối thiểu để hiện từng loại đường
+HIGHWAY_MIN_ZOOM = {
+    "motorway": 0, "trunk": 0,
+    "motorway_link": 10, "trunk_link": 10, "primary": 10,
+    "primary_link": 12, "secondary": 12,
+    "secondary_link": 13, "tertiary": 13, "tertiary_link": 13,
+    "unclassified": 14, "residential": 14, "living_street": 15, "service": 15,
+}
+MAX_ZOOM = 22
+
+
+def _conf(name, default):
+    return getattr(settings, "TILES", {}).get(name, default)
+
+
+def highways_for_zoom(z):
+    return sorted(h for h, mz in HIGHWAY_MIN_ZOOM.items() if z >= mz)
+
+
+def tile_bounds(z, x, y):
+    """Tile XYZ -> (west, south, east, north) theo độ."""
+    n = 2 ** z
+
+    def lat(t):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * t / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+# ---------- version / cache trên đĩa ----------
+class TileCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._version = None
+        self._mtime = None
+
+    @property
+    def root(self) -> Path:
+        return Path(_conf("CACHE_DIR", settings.BASE_DIR / "var" / "tiles"))
+
+    def _version_file(self):
+        return self.root / "VERSION"
+
+    def version(self) -> int:
+        f = self._version_file()
+        try:
+            st = f.stat()
+        except FileNotFoundError:
+            return 0
+        mtime = (st.st_ino, st.st_mtime_ns)  # os.replace luôn tạo inode mới
+        if mtime != self._mtime:
+            try:
+                self._version = int(f.read_text().strip() or 0)
+            except (OSError, ValueError):
+                self._version = 0
+            self._mtime = mtime
+        return self._version
+
+    def bump(self):
+        with self.lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            v = self.version() + 1
+            self._write(self._version_file(), str(v).encode())
+            return v
+
+    def path(self, z, x, y, fmt, version=None):
+        v = self.version() if version is None else version
+        return self.root / str(v) / str(z) / str(x) / f"{y}.{fmt}"
+
+    def get(self, z, x, y, fmt):
+        try:
+            return self.path(z, x, y, fmt).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, z, x, y, fmt, data, version):
+        if version != self.version():
+            return  # Road vừa đổi trong lúc sinh tile -> không ghi bản cũ
+        p = self.path(z, x, y, fmt, version)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        self._write(p, data)
+
+    @staticmethod
+    def _write(path, data):
+        # ghi file tạm rồi os.replace -> không worker nào đọc phải file dở dang
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def prune(self):
+        """Xoá thư mục của các version cũ. Trả số thư mục đã xoá."""
+        current = str(self.version())
+        n = 0
+        if not self.root.exists():
+            return 0
+        for d in self.root.iterdir():
+            if d.is_dir() and d.name != current:
+                shutil.rmtree(d, ignore_errors=True)
+                n += 1
+        return n
+
+
+tile_cache = TileCache()
+
+
+def bump_version():
+    """Gọi khi Road thay đổi (signal) hoặc sau khi nạp hàng loạt (bulk_create không phát signal)."""
+    return tile_cache.bump()
+
+
+# ---------- sinh tile ----------
+def _tolerance_deg(z):
+    return 360.0 / (256 * 2 ** z) * _conf("TOLERANCE_PX", 1.0)
+
+
+def _geojson_tile(z, x, y):
+    w, s, e, n = tile_bounds(z, x, y)
+    pad = (e - w) * _conf("BUFFER", 0.05)
+    sql = """
+        SELECT COALESCE(json_build_object(
+            'type', 'FeatureCollection',
+            'features', json_agg(json_build_object(
+                'type', 'Feature',
+                'geometry', ST_AsGeoJSON(t.g, 6)::json,
+                'properties', json_build_object('id', t.id, 'name', t.name, 'highway', t.highway)
+            ))
+        )::text, '{"type":"FeatureCollection","features":[]}')
+        FROM (
+            SELECT r.id, r.name, r.highway,
+                   ST_SimplifyPreserveTopology(ST_ClipByBox2D(r.geom, env.b), %s) AS g
+            FROM orders_road r, (SELECT ST_MakeEnvelope(%s, %s, %s, %s, 4326) AS b) env
+            WHERE r.geom && env.b AND r.highway = ANY(%s)
+        ) t
+        WHERE NOT ST_IsEmpty(t.g)
+    """
+    with connection.cursor() as cur:
+        cur.execute(sql, [_tolerance_deg(z), w - pad, s - pad, e + pad, n + pad, highways_for_zoom(z)])
+        return cur.fetchone()[0].encode()
+
+
+def _mvt_tile(z, x, y):
+    extent = _conf("MVT_EXTENT", 4096)
+    sql = """
+        SELECT ST_AsMVT(t, 'roads', %s, 'g')
+        FROM (
+            SELECT r.id, r.name, r.highway,
+                   ST_AsMVTGeom(
+                       ST_Transform(ST_SimplifyPreserveTopology(r.geom, %s), 3857),
+                       ST_TileEnvelope(%s, %s, %s), %s, %s, true
+                   ) AS g
+            FROM orders_road r
+            WHERE r.geom && ST_Transform(ST_TileEnvelope(%s, %s, %s), 4326) AND r.highway = ANY(%s)
+        ) t
+        WHERE t.g IS NOT NULL
+    """
+    buffer = int(extent * _conf("BUFFER", 0.05))
+    with connection.cursor() as cur:
+        cur.execute(sql, [extent, _tolerance_deg(z), z, x, y, extent, buffer, z, x, y, highways_for_zoom(z)])
+        return bytes(cur.fetchone()[0] or b"")
+
+
+def render_tile(z, x, y, fmt="geojson"):
+    """Trả (bytes, version, hit). Đọc cache đĩa trước, không có thì sinh từ PostGIS rồi ghi lại."""
+    version = tile_cache.version()
+    data = tile_cache.get(z, x, y, fmt)
+    cache_event("tile", data is not None)
+    if data is not None:
+        return data, version, True
+    data = _mvt_tile(z, x, y) if fmt == "pbf" else _geojson_tile(z, x, y)
+    if z <= _conf("CACHE_MAX_ZOOM", 18):
+        tile_cache.put(z, x, y, fmt, data, version)
+    return data, version, False
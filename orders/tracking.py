@@ -0,0 +1,295 @@
+"""
+Nhận GPS tần suất cao từ app shipper.
+
+  - Mỗi request chỉ append vào bộ đệm trong bộ nhớ (không INSERT);
+    thread nền flush bằng bulk_create mỗi FLUSH_S giây hoặc khi đủ FLUSH_SIZE điểm.
+  - Trước khi lưu, track của từng shipper được rút gọn bằng Douglas-Peucker (EPSILON_M).
+  - Vị trí mới nhất của mỗi shipper giữ trong ring buffer (deque maxlen) -> đọc O(1),
+    đồng thời cập nhật vào dispatcher để gán đơn theo vị trí thật.
+  - Ca đang mở của shipper được cache theo user, bỏ cache khi Attendance thay đổi.
+Điểm còn trong bộ đệm sẽ mất nếu tiến trình chết đột ngột (đánh đổi để không INSERT mỗi request).
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections, transaction
+
+from .dispatch import dispatcher
+from .metrics import cache_event
+from .models import Attendance, CourierLocation
+
+logger = logging.getLogger(__name__)
+
+
+def _conf(name, default):
+    return getattr(settings, "TRACKING", {}).get(name, default)
+
+
+@dataclass(slots=True)
+class Ping:
+    lat: float
+    lng: float
+    t: datetime
+    accuracy: float | None = None
+    speed: float | None = None
+
+
+# ---------- Douglas-Peucker ----------
+def douglas_peucker(points, epsilon_m):
+    """
+    Rút gọn polyline [(lat, lng, ...)] giữ sai lệch <= epsilon_m (mét).
+    Chiếu equirectangular quanh điểm đầu (đủ chính xác trong phạm vi thành phố). Trả list index giữ lại.
+    """
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+    lat0 = math.radians(points[0][0])
+    k = 111_320.0
+    xy = [(p[1] * k * math.cos(lat0), p[0] * k) for p in points]
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        (ax, ay), (bx, by) = xy[a], xy[b]
+        dx, dy = bx - ax, by - ay
+        seg2 = dx * dx + dy * dy
+        best, best_i = -1.0, -1
+        for i in range(a + 1, b):
+            px, py = xy[i]
+            if seg2 == 0:
+                d = math.hypot(px - ax, py - ay)
+            else:
+                tt = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / seg2))
+                d = math.hypot(px - (ax + tt * dx), py - (ay + tt * dy))
+            if d > best:
+                best, best_i = d, i
+        if best > epsilon_m:
+            keep[best_i] = True
+            stack.append((a, best_i))
+            stack.append((best_i, b))
+    return [i for i in range(n) if keep[i]]
+
+
+# ---------- ca đang mở ----------
+class ShiftCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}  # user_id -> (attendance_id | None, expires_at)
+
+    def get(self, user_id):
+        now = time.monotonic()
+        hit = self.data.get(user_id)
+        if hit and hit[1] > now:
+            cache_event("shift", True)
+            return hit[0]
+        cache_event("shift", False)
+        att_id = (
+            Attendance.objects.filter(employee_id=user_id, check_out__isnull=True)
+            .values_list("id", flat=True).first()
+        )
+        with self.lock:
+            self.data[user_id] = (att_id, now + _conf("SHIFT_CACHE_S", 60))
+        return att_id
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.data.pop(user_id, None)
+
+
+# ---------- bộ đệm + flush ----------
+class LocationBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(list)  # (user_id, attendance_id) -> [Ping]
+        self.count = 0
+        self.latest = {}  # user_id -> deque[Ping]
+        self.stats = {"received": 0, "stored": 0, "flushes": 0, "failed_flushes": 0, "dropped": 0}
+        self._thread = None
+        self._wake = threading.Event()
+
+    def add(self, user_id, attendance_id, pings):
+        if not pings:
+            return
+        pings = sorted(pings, key=lambda p: p.t)
+        with self.lock:
+            self.pending[(user_id, attendance_id)].extend(pings)
+            self.count += len(pings)
+            self.stats["received"] += len(pings)
+            ring = self.latest.get(user_id)
+            if ring is None:
+                ring = self.latest[user_id] = deque(maxlen=_conf("RING_SIZE", 32))
+            prev = ring[-1] if ring else None
+            if prev is None or pings[0].t >= prev.t:
+                ring.extend(pings)
+            else:
+                # lô gửi bù khi mất mạng: trộn theo t, điểm cũ không thành "vị trí mới nhất"
+                merged = sorted([*ring, *pings], key=lambda p: p.t)
+                ring.clear()
+                ring.extend(merged)
+            latest = ring[-1] if ring[-1] is not prev else None
+            full = self.count >= _conf("FLUSH_SIZE", 5000)
+        if latest is not None:
+            dispatcher.set_position(user_id, latest.lat, latest.lng)
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def last(self, user_id, n=1):
+        ring = self.latest.get(user_id)
+        if not ring:
+            return []
+        return list(ring)[-n:]
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending, self.count = self.pending, defaultdict(list), 0
+        if not batch:
+            return 0
+        eps = _conf("EPSILON_M", 10)
+        groups = {}
+        for (uid, att_id), pings in batch.items():
+            pings.sort(key=lambda p: p.t)
+            groups[(uid, att_id)] = [
+                CourierLocation(
+                    employee_id=uid, attendance_id=att_id, lat=p.lat, lng=p.lng,
+                    accuracy=p.accuracy, speed=p.speed, recorded_at=p.t,
+                )
+                for p in (pings[i] for i in douglas_peucker([(p.lat, p.lng) for p in pings], eps))
+            ]
+        try:
+            CourierLocation.objects.bulk_create([o for objs in groups.values() for o in objs], batch_size=2000)
+            stored = sum(len(objs) for objs in groups.values())
+        except (OperationalError, InterfaceError):
+            # DB mất kết nối / quá tải: giữ cả lô cho lần flush sau
+            return self._flush_failed(batch)
+        except DatabaseError:
+            # lỗi dữ liệu (vd. ca / user vừa bị xoá -> vi phạm khoá ngoại): thử lại từng shipper,
+            # bỏ nhóm hỏng để 1 nhóm không chặn mãi cả bộ đệm
+            logger.warning("GPS flush lỗi dữ liệu, ghi lại theo từng shipper", exc_info=True)
+            stored = 0
+            keys = list(groups)
+            for n, key in enumerate(keys):
+                for o in groups[key]:
+                    o.pk = None
+                try:
+                    with transaction.atomic():
+                        CourierLocation.objects.bulk_create(groups[key], batch_size=2000)
+                except (OperationalError, InterfaceError):
+                    self.stats["stored"] += stored
+                    return self._flush_failed(defaultdict(list, {k: batch[k] for k in keys[n:]}))
+                except DatabaseError:
+                    self.stats["dropped"] += len(batch[key])
+                    logger.exception("GPS: bỏ %d điểm của shipper %s (ca %s)", len(batch[key]), *key)
+                    continue
+                stored += len(groups[key])
+        self.stats["stored"] += stored
+        self.stats["flushes"] += 1
+        return stored
+
+    def _flush_failed(self, batch):
+        dropped = self._requeue(batch)
+        self.stats["failed_flushes"] += 1
+        logger.exception("GPS flush lỗi: %d điểm chờ ghi lại, bỏ %d điểm cũ nhất", self.count, dropped)
+        return 0
+
+    def _requeue(self, batch):
+        """Trả lô chưa ghi được về bộ đệm, tối đa MAX_PENDING điểm (bỏ điểm cũ nhất). Trả số điểm bị bỏ."""
+        cap = _conf("MAX_PENDING", 50000)
+        with self.lock:
+            for key, pings in self.pending.items():
+                batch[key].extend(pings)
+            total = sum(len(v) for v in batch.values())
+            dropped = max(total - cap, 0)
+            if dropped:
+                keep = sorted(((p.t, key, p) for key, pings in batch.items() for p in pings),
+                              key=lambda x: x[0])[dropped:]
+                batch = defaultdict(list)
+                for _, key, p in keep:
+                    batch[key].append(p)
+            self.pending, self.count = batch, total - dropped
+            self.stats["dropped"] += dropped
+        return dropped
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self.lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="gps-flush", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(_conf("FLUSH_S", 5))
+            self._wake.clear()
+            failed = self.stats["failed_flushes"]
+            try:
+                self.flush()
+                if self.stats["failed_flushes"] > failed:
+                    # DB đang lỗi: bộ đệm đầy sẽ đánh thức liên tục, chờ hết chu kỳ rồi mới thử lại
+                    time.sleep(_conf("FLUSH_S", 5))
+            except Exception:  # noqa: BLE001 - thread nền không được chết; lần sau flush tiếp
+                logger.exception("GPS flush lỗi")
+            finally:
+                close_old_connections()
+
+
+shift_cache = ShiftCache()
+location_buffer = LocationBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        location_buffer.flush()
+    except Exception:  # noqa: BLE001
+        pass
+
+
+def parse_pings(items, max_points=500):
+    """Chuyển payload [{lat, lng, t, acc, speed}] -> [Ping]; t là ISO 8601 hoặc epoch (giây/ms)."""
+    from django.utils.dateparse import parse_datetime
+
+    if not isinstance(items, list):
+        raise ValueError("points phải là danh sách")
+    if len(items) > max_points:
+        raise ValueError(f"Tối đa {max_points} điểm mỗi lần gửi")
+    now = datetime.now(tz=dt_timezone.utc)
+    max_age = timedelta(seconds=_conf("MAX_PING_AGE_S", 24 * 3600))
+    max_ahead = timedelta(seconds=_conf("MAX_PING_AHEAD_S", 300))
+    out = []
+    for it in items:
+        lat, lng = float(it["lat"]), float(it["lng"])
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError("Toạ độ không hợp lệ")
+        t = it.get("t")
+        if isinstance(t, bool):
+            raise ValueError("t không hợp lệ")
+        if isinstance(t, (int, float)):
+            try:
+                t = datetime.fromtimestamp(t / 1000 if t > 1e11 else t, tz=dt_timezone.utc)
+            except (OverflowError, OSError, ValueError):
+                raise ValueError("t không hợp lệ")
+        elif isinstance(t, str):
+            t = parse_datetime(t)
+            if t is None:
+                raise ValueError("t không hợp lệ")
+            if t.tzinfo is None:
+                t = t.replace(tzinfo=dt_timezone.utc)
+        else:
+            t = now
+        if not (now - max_age <= t <= now + max_ahead):
+            raise ValueError("t nằm ngoài khoảng thời gian cho phép")
+        acc, speed = it.get("acc"), it.get("speed")
+        out.append(Ping(lat, lng, t, float(acc) if acc is not None else None,
+                        float(speed) if speed is not None else None))
+    return out
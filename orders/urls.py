@@ -4,11 +4,23 @@ from .views import (
     OrderViewSet,
     order_list,
     attendance_api,
+    timesheet_api,
     track_order,
+    eta_api,
     performance_stats,
+    performance_leaderboard,
     map_view,
     my_orders,
     order_detail_page,
+    route_cache_stats,
+    dispatch_orders,
+    geocode_api,
+    order_events,
+    locations_api,
+    orders_map,
+    road_tile,
+    snap_api,
+    sync_api,
 )
 
 router = DefaultRouter()
@@ -26,6 +38,18 @@ urlpatterns = [
     # API
     path("api/", include(router.urls)),
     path("api/attendance/",  attendance_api,     name="attendance_api"),
+    path("api/timesheet/",   timesheet_api,      name="timesheet"),
     path("api/track/",       track_order,        name="track_order"),
+    path("api/eta/",         eta_api,            name="eta"),
     path("api/performance/", performance_stats,  name="performance_stats"),
+    path("api/performance/leaderboard/", performance_leaderboard, name="performance_leaderboard"),
+    path("api/route-cache/", route_cache_stats,  name="route_cache_stats"),
+    path("api/dispatch/",    dispatch_orders,    name="dispatch_orders"),
+    path("api/geocode/",     geocode_api,        name="geocode"),
+    path("api/events/",      order_events,       name="order_events"),
+    path("api/locations/",   locations_api,      name="locations"),
+    path("api/map/",         orders_map,         name="orders_map"),
+    path("api/snap/",        snap_api,           name="snap"),
+    path("api/sync/",        sync_api,           name="sync"),
+    path("api/tiles/roads/<int:z>/<int:x>/<int:y>.<str:fmt>", road_tile, name="road_tile"),
 ]
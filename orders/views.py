@@ -1,27 +1,76 @@
+import asyncio
+import hashlib
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import timedelta
 
-import requests
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.db import IntegrityError, transaction
-from django.db.models import Count, Sum, Q, F, ExpressionWrapper, DurationField
-from django.db.models.functions import Coalesce
+from django.db import IntegrityError
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
-from django.utils.dateparse import parse_datetime
-from django.utils.timezone import now
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import localdate, now
 
 from rest_framework import viewsets, filters, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.throttling import UserRateThrottle
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
 from django_filters.rest_framework import DjangoFilterBackend
 
+from accounts.tokens import ClaimsJWTAuthentication
+
+from . import metrics
+from .attendance import AttendanceError, check_in, check_out, timesheet
+from .bulk import export_orders, import_orders, iter_records
+from .dispatch import dispatcher
+from .eta import ETA_FIELDS, get_profile, order_etas
+from .geo import POINT_COLUMNS, feature_collection, parse_bbox
+from .geocoding import UNAVAILABLE, gazetteer, geocode, load_gazetteer
 from .models import Order, Attendance
-from .serializers import OrderSerializer
+from .optimize import optimize_orders
+from .pagination import OrderCursorPagination
+from .perm import can_access_order, sees_all_orders
+from .realtime import get_broker, sse_format
+from .osrm import OSRMError
+from .route_cache import ROUTE_PROFILES, route_cache
+from .routing import local_route
+from .search import OrderSearchFilter, search_orders
+from .serializers import OrderSerializer, order_list_rows, serialize_order_rows
+from .snap import snap_many
+from .stats import LEADERBOARD_SORTS, leaderboard, summarize
+from .sync import changes_since, list_version
+from .tiles import FORMATS as TILE_FORMATS, render_tile, tile_cache, valid_tile
+from .tracking import location_buffer, parse_pings, shift_cache
 
 User = get_user_model()
 
+# Pool dùng chung cho các request batch: thread sống lâu nên mỗi thread giữ
+# được session HTTP keep-alive của mình (xem osrm.get_session).
+_route_pool = ThreadPoolExecutor(max_workers=settings.ROUTING.get("BATCH_WORKERS", 8), thread_name_prefix="route")
+
+
+def _resolve_route(pickup, drop, profile="driving", engine="osrm"):
+    """Trả (route, nguồn): nguồn là "local", "hit" hoặc "miss". Lỗi -> OSRMError."""
+    if engine == "local":
+        try:
+            return local_route(pickup, drop, profile), "local"
+        except OSRMError:
+            pass  # chưa có graph / không tới được / profile khác driving -> dùng OSRM
+    route, hit = route_cache.get_or_fetch(pickup, drop, profile)
+    return route, "hit" if hit else "miss"
+
 
 # ---------- PERMISSIONS ----------
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -36,8 +85,9 @@ class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = OrderCursorPagination
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderSearchFilter, filters.OrderingFilter]
     filterset_fields = ["status", "assigned_to"]
     search_fields = ["code", "customer_name", "phone", "address", "assigned_to__username"]
     ordering_fields = ["created_at", "updated_at", "id", "code", "cod"]
@@ -45,8 +95,77 @@ class OrderViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        qs = super().get_queryset()
-        return qs if (user.is_staff or user.is_superuser) else qs.filter(assigned_to=user)
+        qs = super().get_queryset().select_related("assigned_to")
+        return qs if sees_all_orders(user) else qs.filter(assigned_to=user)
+
+    def list(self, request, *args, **kwargs):
+        """
+        List nhanh: đọc tuple bằng values_list + JOIN username, không qua ModelSerializer.
+        Hỗ trợ GET có điều kiện (ETag / Last-Modified) theo sync.list_version(): đổi khi bất kỳ
+        đơn nào đổi, đọc cuối bảng OrderChange theo PK nên không quét bảng Order ở mỗi trang.
+        """
+        qs = self.filter_queryset(self.get_queryset())
+
+        version, changed_at = list_version()
+        raw = f"{request.user.pk}|{request.get_full_path()}|{version}"
+        etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+        last_ts = int(changed_at.timestamp()) if changed_at else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_ts)
+        if not_modified is not None:
+            return not_modified
+
+        page = self.paginate_queryset(order_list_rows(qs))
+        if page is not None:
+            resp = self.get_paginated_response(serialize_order_rows(page))
+        else:
+            resp = Response(serialize_order_rows(order_list_rows(qs)))
+        resp["ETag"] = etag
+        if last_ts is not None:
+            resp["Last-Modified"] = http_date(last_ts)
+        return resp
+
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        """
+        Nhập đơn từ file (multipart, field "file"): ?fmt=csv|ndjson (mặc định theo đuôi file),
+        &dry_run=1 chỉ kiểm tra. Cột như export; assigned_to là username hoặc id.
+        """
+        f = request.FILES.get("file")
+        if not f:
+            return Response({"detail": "Thiếu file."}, status=400)
+        fmt = request.GET.get("fmt") or ("ndjson" if f.name.endswith((".ndjson", ".jsonl")) else "csv")
+        if fmt not in ("csv", "ndjson"):
+            return Response({"detail": "fmt phải là csv hoặc ndjson"}, status=400)
+        dry_run = request.GET.get("dry_run") in ("1", "true")
+        report = import_orders(iter_records(f.file, fmt), created_by=request.user, dry_run=dry_run)
+        if report["created"] and not dry_run and settings.DISPATCH.get("AUTO", False):
+            dispatcher.rebalance()  # bulk_create không phát post_save
+        return Response(report, status=200 if not (report["failed"] or report["file_error"]) else 207)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Xuất các đơn theo bộ lọc hiện tại (status, assigned_to, search) dạng ?fmt=csv|ndjson, stream."""
+        fmt = request.GET.get("fmt") or "csv"
+        if fmt not in ("csv", "ndjson"):
+            return Response({"detail": "fmt phải là csv hoặc ndjson"}, status=400)
+        qs = self.filter_queryset(self.get_queryset())
+        content_type = "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson"
+        resp = StreamingHttpResponse(export_orders(qs, fmt), content_type=content_type)
+        resp["Content-Disposition"] = f'attachment; filename="orders.{fmt}"'
+        return resp
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """Tìm kiếm có xếp hạng: ?q=...&limit=20 (tối đa 100). Mã đơn/SĐT khớp chính xác đứng đầu."""
+        q = (request.GET.get("q") or "").strip()
+        if not q:
+            return Response({"detail": "Thiếu từ khoá."}, status=400)
+        try:
+            limit = min(int(request.GET.get("limit") or 20), 100)
+        except ValueError:
+            return Response({"detail": "limit không hợp lệ"}, status=400)
+        qs = search_orders(self.get_queryset(), q, ranked=True)[:limit]
+        return Response(serialize_order_rows(order_list_rows(qs)))
 
     def perform_create(self, serializer):
         try:
@@ -57,32 +176,378 @@ class OrderViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"], permission_classes=[IsAuthenticated])
     def route(self, request, pk=None):
         """
-        Trả tuyến đường pickup -> drop ở dạng GeoJSON (OSRM).
+        Trả tuyến đường pickup -> drop ở dạng GeoJSON (OSRM hoặc engine nội bộ).
         Yêu cầu: order.pickup_lat/lng và order.drop_lat/lng phải có.
+        ?engine=local|osrm (mặc định settings.ROUTING["ENGINE"]).
         Quyền xem: admin, người được gán, hoặc người tạo.
         """
         order = get_object_or_404(Order, pk=pk)
-        u = request.user
-        if not (u.is_staff or order.assigned_to_id == u.id or order.created_by_id == u.id):
+        if not can_access_order(request.user, order):
             return Response({"detail": "Forbidden"}, status=403)
 
         need = [order.pickup_lat, order.pickup_lng, order.drop_lat, order.drop_lng]
         if any(v is None for v in need):
             return Response({"detail": "Thiếu toạ độ pickup/drop"}, status=400)
 
-        coords = f"{order.pickup_lng},{order.pickup_lat};{order.drop_lng},{order.drop_lat}"
-        url = f"https://router.project-osrm.org/route/v1/driving/{coords}"
-        r = requests.get(url, params={"overview": "full", "geometries": "geojson"}, timeout=10)
-        data = r.json()
-        if data.get("code") != "Ok":
-            return Response({"detail": "OSRM error", "osrm": data}, status=502)
+        profile = request.GET.get("profile") or "driving"
+        if profile not in ROUTE_PROFILES:
+            return Response({"detail": "profile không hợp lệ"}, status=400)
+        engine = request.GET.get("engine") or settings.ROUTING.get("ENGINE", "osrm")
+        pickup, drop = order.route_coords()
+        try:
+            route, source = _resolve_route(pickup, drop, profile, engine)
+        except OSRMError as e:
+            return Response({"detail": "OSRM error", "osrm": str(e)}, status=502)
+
+        resp = Response(route)
+        if source == "local":
+            resp["X-Route-Engine"] = "local"
+        else:
+            resp["X-Route-Cache"] = source
+        return resp
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def routes(self, request):
+        """
+        Tuyến đường cho nhiều đơn cùng lúc, trả NDJSON (mỗi dòng 1 đơn, đơn nào xong trước trả trước).
+        Lọc: ?ids=1,2,3 | ?assigned_to=me|<id> | ?status=shipping. &geometry=0 để bỏ geometry.
+        Đơn lỗi vẫn có dòng riêng {"id", "ok": false, "error"}; các đơn khác không bị ảnh hưởng.
+        """
+        profile = request.GET.get("profile") or "driving"
+        if profile not in ROUTE_PROFILES:
+            return Response({"detail": "profile không hợp lệ"}, status=400)
+        engine = request.GET.get("engine") or settings.ROUTING.get("ENGINE", "osrm")
+        with_geometry = request.GET.get("geometry") != "0"
+        limit = settings.ROUTING.get("BATCH_LIMIT", 200)
+
+        qs = self.get_queryset()
+        ids = request.GET.get("ids")
+        if ids:
+            try:
+                qs = qs.filter(id__in=[int(x) for x in ids.split(",") if x.strip()])
+            except ValueError:
+                return Response({"detail": "ids không hợp lệ"}, status=400)
+        assigned = request.GET.get("assigned_to")
+        if assigned:
+            if assigned != "me" and not assigned.isdigit():
+                return Response({"detail": "assigned_to không hợp lệ"}, status=400)
+            qs = qs.filter(assigned_to=request.user.id if assigned == "me" else int(assigned))
+        if request.GET.get("status"):
+            qs = qs.filter(status=request.GET["status"])
+        if not (ids or assigned):
+            qs = qs.filter(assigned_to=request.user)
+
+        rows = list(qs.values_list("id", "pickup_lat", "pickup_lng", "drop_lat", "drop_lng")[:limit])
+
+        def work(row):
+            oid, plat, plng, dlat, dlng = row
+            if None in (plat, plng, dlat, dlng):
+                return {"id": oid, "ok": False, "error": "Thiếu toạ độ pickup/drop"}
+            try:
+                route, source = _resolve_route((plat, plng), (dlat, dlng), profile, engine)
+            except OSRMError as e:
+                return {"id": oid, "ok": False, "error": str(e)}
+            if not with_geometry:
+                route = {k: v for k, v in route.items() if k != "geometry"}
+            return {"id": oid, "ok": True, "source": source, **route}
+
+        def stream():
+            futures = [_route_pool.submit(work, row) for row in rows]
+            for fut in as_completed(futures):
+                yield json.dumps(fut.result(), cls=JSONEncoder, ensure_ascii=False) + "\n"
+
+        resp = StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+        resp["X-Total-Count"] = str(len(rows))
+        return resp
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def optimize(self, request):
+        """
+        Thứ tự ghé điểm tối ưu cho các đơn đang mở (new/shipping) của một shipper.
+        ?assigned_to=<id> (admin; mặc định là chính mình) &start=lat,lng
+        &matrix=haversine|osrm &budget_ms=800. Pickup luôn đứng trước drop của cùng đơn.
+        """
+        u = request.user
+        courier = request.GET.get("assigned_to") or "me"
+        if courier == "me":
+            courier_id = u.id
+        elif courier.isdigit() and (u.is_staff or int(courier) == u.id):
+            courier_id = int(courier)
+        else:
+            return Response({"detail": "Forbidden"}, status=403)
+
+        start = None
+        if request.GET.get("start"):
+            try:
+                lat, lng = (float(x) for x in request.GET["start"].split(","))
+                start = (lat, lng)
+            except ValueError:
+                return Response({"detail": "start phải có dạng lat,lng"}, status=400)
+        try:
+            budget_ms = min(int(request.GET.get("budget_ms") or 800), 5000)
+        except ValueError:
+            return Response({"detail": "budget_ms không hợp lệ"}, status=400)
+
+        orders = (
+            Order.objects
+            .filter(assigned_to_id=courier_id, status__in=["new", "shipping"])
+            .exclude(pickup_lat=None).exclude(pickup_lng=None)
+            .exclude(drop_lat=None).exclude(drop_lng=None)
+            .only("id", "status", "pickup_lat", "pickup_lng", "drop_lat", "drop_lng")
+            .order_by("created_at")[:settings.ROUTING.get("OPTIMIZE_LIMIT", 300)]
+        )
+        result = optimize_orders(
+            orders, start=start,
+            matrix=request.GET.get("matrix") or "haversine",
+            budget_s=budget_ms / 1000,
+        )
+        return Response({"assigned_to": courier_id, **result})
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def route_cache_stats(request):
+    """Tỉ lệ hit của cache tuyến đường (theo worker hiện tại)."""
+    return Response(route_cache.stats())
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """Số liệu Prometheus của worker hiện tại (xem orders/metrics.py)."""
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+# ---------- DISPATCH ----------
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+def dispatch_orders(request):
+    """Gán hàng loạt các đơn "new" chưa có người nhận cho shipper đang trong ca."""
+    try:
+        limit = int(request.data.get("limit") or 0) or None
+    except (TypeError, ValueError):
+        return Response({"detail": "limit không hợp lệ"}, status=400)
+    plan = dispatcher.rebalance(limit=limit)
+    return Response({
+        "assigned": sum(len(v) for v in plan.values()),
+        "couriers": {str(uid): ids for uid, ids in plan.items()},
+    })
+
+
+# ---------- GEOCODE ----------
+class GeocodeThrottle(UserRateThrottle):
+    scope = "geocode"
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def geocode_api(request):
+    """
+    ?q=<địa chỉ>  -> {"lat", "lng"} (cache trước, provider sau); không thấy -> 404;
+                     provider lỗi / quá giới hạn -> 503 (trình duyệt tự thử provider khác).
+    ?prefix=<...> -> gợi ý từ các địa chỉ đã geocode.
+    ?q bị giới hạn theo user: REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]["geocode"].
+    """
+    prefix = (request.GET.get("prefix") or "").strip()
+    if prefix:
+        load_gazetteer()
+        return Response([
+            {"address": a, "lat": lat, "lng": lng} for a, lat, lng in gazetteer.suggest(prefix)
+        ])
+    q = (request.GET.get("q") or "").strip()
+    if not q:
+        return Response({"detail": "Thiếu địa chỉ."}, status=400)
+    throttle = GeocodeThrottle()
+    if not throttle.allow_request(request, None):
+        return Response({"detail": "Quá nhiều yêu cầu geocode, thử lại sau."}, status=429,
+                        headers={"Retry-After": str(int(throttle.wait() or 1))})
+    hit = geocode(q)
+    if hit is UNAVAILABLE:
+        return Response({"detail": "Dịch vụ geocode đang bận, thử lại sau."}, status=503,
+                        headers={"Retry-After": "5"})
+    if hit is None:
+        return Response({"detail": "Không tìm thấy địa chỉ."}, status=404)
+    return Response({"lat": hit[0], "lng": hit[1]})
+
+
+# ---------- MAP (GeoJSON theo khung nhìn) ----------
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def orders_map(request):
+    """
+    ?bbox=west,south,east,north&zoom=<0..22>[&point=drop|pickup][&status=new,shipping]
+    -> GeoJSON FeatureCollection; zoom thấp trả cụm {cluster, count, bbox}, zoom cao trả từng đơn.
+    """
+    try:
+        bbox = parse_bbox(request.GET.get("bbox"))
+        zoom = int(request.GET.get("zoom") or 12)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=400)
+    zoom = max(0, min(zoom, 22))
+    point = request.GET.get("point") or "drop"
+    if point not in POINT_COLUMNS:
+        return Response({"detail": "point phải là drop hoặc pickup"}, status=400)
+    statuses = [x for x in (request.GET.get("status") or "").split(",") if x]
+
+    u = request.user
+    qs = Order.objects.all() if sees_all_orders(u) else Order.objects.filter(assigned_to=u)
+    return Response(feature_collection(qs, bbox, zoom, point, statuses))
+
+
+# ---------- DELTA SYNC ----------
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def sync_api(request):
+    """
+    Thay đổi đơn kể từ ?since=<token> (cùng phạm vi với danh sách đơn của user).
+    {"next", "more", "upserts": [...], "removed": [id]}; more=true -> gọi tiếp với next.
+    {"reset": true, "next"}: token thiếu / quá cũ -> lưu next, tải lại toàn bộ /api/orders/,
+    lần sau sync từ next (thay đổi trong lúc tải sẽ được gửi lại, ghi đè là an toàn).
+    """
+    return Response(changes_since(request.user, request.GET.get("since")))
 
-        route = data["routes"][0]
-        return Response({
-            "distance_m": route["distance"],
-            "duration_s": route["duration"],
-            "geometry": route["geometry"],  # GeoJSON LineString
-        })
+
+# ---------- SNAP-TO-ROAD ----------
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def snap_api(request):
+    """
+    ?lat=&lng=            -> {"lat", "lng", "distance_m", "source"}; không có đường gần -> 404.
+    ?points=lat,lng;...   -> [{"lat", "lng", "distance_m", "source"} | null, ...] (tối đa MAX_POINTS).
+    Toạ độ phải hữu hạn, lat trong -90..90, lng trong -180..180 (không thì 400).
+    """
+    try:
+        if request.GET.get("points"):
+            pts = [tuple(float(v) for v in p.split(",")) for p in request.GET["points"].split(";") if p]
+            if any(len(p) != 2 for p in pts):
+                raise ValueError
+        else:
+            pts = [(float(request.GET["lat"]), float(request.GET["lng"]))]
+        if not all(math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180
+                   for lat, lng in pts):
+            raise ValueError
+    except (KeyError, ValueError):
+        return Response({"detail": "Cần lat/lng hoặc points=lat,lng;lat,lng"}, status=400)
+    if len(pts) > settings.SNAP.get("MAX_POINTS", 100):
+        return Response({"detail": "Quá nhiều điểm."}, status=400)
+
+    out = [
+        {"lat": h[0], "lng": h[1], "distance_m": round(h[2], 1), "source": h[3]} if h else None
+        for h in snap_many(pts)
+    ]
+    if "points" in request.GET:
+        return Response(out)
+    if out[0] is None:
+        return Response({"detail": "Không có đường trong bán kính cho phép."}, status=404)
+    return Response(out[0])
+
+
+# ---------- TILE ĐƯỜNG (Road) ----------
+def road_tile(request, z, x, y, fmt):
+    """
+    /orders/api/tiles/roads/<z>/<x>/<y>.geojson|pbf; tile đã sinh được cache trên đĩa.
+    ETag chỉ phụ thuộc version + toạ độ tile nên trả 304 trước khi đọc / sinh tile.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"detail": "Chưa đăng nhập."}, status=401)
+    if fmt not in TILE_FORMATS or not valid_tile(z, x, y):
+        return JsonResponse({"detail": "Tile không hợp lệ."}, status=404)
+    etag = quote_etag(f"{tile_cache.version()}-{z}-{x}-{y}-{fmt}")
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    data, version, hit = render_tile(z, x, y, fmt)
+    resp = HttpResponse(data, content_type=TILE_FORMATS[fmt])
+    resp["ETag"] = quote_etag(f"{version}-{z}-{x}-{y}-{fmt}")  # version có thể vừa đổi
+    resp["Cache-Control"] = "private, max-age=300"
+    resp["X-Tile-Cache"] = "HIT" if hit else "MISS"
+    return resp
+
+
+# ---------- GPS SHIPPER ----------
+def _ping_json(uid, p):
+    return {"user_id": uid, "lat": p.lat, "lng": p.lng, "t": p.t, "acc": p.accuracy, "speed": p.speed}
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+def locations_api(request):
+    """
+    POST {"points": [{"lat", "lng", "t", "acc", "speed"}, ...]} -> 202; chỉ nhận khi đang trong ca.
+    GET -> vị trí mới nhất của mình; staff: của mọi shipper đang trong ca (?user=<id> để lọc).
+    """
+    u = request.user
+    if request.method == "POST":
+        att_id = shift_cache.get(u.id)
+        if att_id is None:
+            return Response({"detail": "Chưa check-in."}, status=409)
+        try:
+            pings = parse_pings(request.data.get("points"), settings.TRACKING.get("MAX_POINTS", 500))
+        except (KeyError, TypeError, ValueError) as e:
+            return Response({"detail": f"Dữ liệu không hợp lệ: {e}"}, status=400)
+        location_buffer.add(u.id, att_id, pings)
+        return Response({"accepted": len(pings)}, status=202)
+
+    if not sees_all_orders(u):
+        return Response([_ping_json(u.id, p) for p in location_buffer.last(u.id)])
+    user_ids = (
+        [int(request.GET["user"])] if (request.GET.get("user") or "").isdigit()
+        else Attendance.objects.filter(check_out__isnull=True).values_list("employee_id", flat=True)
+    )
+    return Response([
+        _ping_json(uid, p) for uid in user_ids for p in location_buffer.last(uid)
+    ])
+
+
+# ---------- REALTIME (SSE, cần chạy dưới ASGI) ----------
+async def _sse_user(request):
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+    # app mobile: Authorization: Bearer <access token>
+    try:
+        res = await sync_to_async(ClaimsJWTAuthentication().authenticate)(request)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    return res[0] if res else None
+
+
+async def order_events(request):
+    """
+    Luồng server-sent events các thay đổi đơn hàng mà user được xem.
+    Mỗi sự kiện: event: order, data: {"type", "id", "code", "status", "assigned_to", ...}.
+    {"type": "resync"} nghĩa là client đọc chậm, đã mất sự kiện -> tải lại danh sách.
+    """
+    user = await _sse_user(request)
+    if user is None:
+        return JsonResponse({"detail": "Chưa đăng nhập."}, status=401)
+
+    broker = get_broker()
+    sub = broker.subscribe(user.id, sees_all_orders(user))
+    heartbeat = settings.REALTIME.get("HEARTBEAT_S", 15)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            n = 0
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # giữ kết nối qua proxy
+                    continue
+                if sub.overflow:
+                    sub.overflow = False
+                    yield sse_format({"type": "resync"})
+                n += 1
+                yield sse_format(event, n)
+        finally:
+            broker.unsubscribe(sub)
+
+    resp = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # nginx: không buffer
+    return resp
 
 
 # ---------- UI PAGES ----------
@@ -97,16 +562,15 @@ def order_list(request):
 
 @login_required
 def map_view(request):
-    # Trang map tổng quát cũ (nếu đang dùng)
-    orders = Order.objects.exclude(address__isnull=True).exclude(address="")
-    return render(request, "orders/map.html", {"orders": orders})
+    # Trang map tổng quát; marker đơn hàng tải theo khung nhìn qua /orders/api/map/
+    return render(request, "orders/map.html")
 
 
 @login_required
 def my_orders(request):
     # Admin thấy tất cả. Nhân viên thấy đơn gán cho mình.
     u = request.user
-    qs = Order.objects.all().order_by('-created_at') if u.is_staff else \
+    qs = Order.objects.all().order_by('-created_at') if sees_all_orders(u) else \
          Order.objects.filter(assigned_to=u).order_by('-created_at')
     return render(request, "orders/my_orders.html", {"orders": qs})
 
@@ -115,8 +579,7 @@ def my_orders(request):
 def order_detail_page(request, pk):
     # Trang chi tiết đơn + map + gọi /api/orders/{id}/route/
     o = get_object_or_404(Order, pk=pk)
-    u = request.user
-    if not (u.is_staff or o.assigned_to_id == u.id or o.created_by_id == u.id):
+    if not can_access_order(request.user, o):
         from django.http import HttpResponseForbidden
         return HttpResponseForbidden("Forbidden")
     return render(request, "orders/order_detail.html", {"order": o})
@@ -126,38 +589,72 @@ def order_detail_page(request, pk):
 @api_view(["GET", "POST"])
 @permission_classes([IsAuthenticated])
 def attendance_api(request):
+    """
+    GET: 100 ca gần nhất. POST {"action": "in" | "out"}: mỗi thao tác 1 câu SQL.
+    Header Idempotency-Key (hoặc "key" trong body): app gửi lại cùng key khi mất mạng
+    -> nhận lại kết quả cũ (replayed: true) thay vì lỗi.
+    """
     user = request.user
     if request.method == "GET":
-        qs = Attendance.objects.filter(employee=user).order_by("-check_in")[:100]
-        data = []
-        for a in qs:
-            hours = None if not a.check_out else round((a.check_out - a.check_in).total_seconds() / 3600.0, 2)
-            data.append({
-                "id": a.id,
-                "check_in": a.check_in,
-                "check_out": a.check_out,
-                "hours": hours,
-            })
-        return Response(data)
+        rows = (
+            Attendance.objects.filter(employee=user).order_by("-check_in")
+            .annotate(worked=ExpressionWrapper(F("check_out") - F("check_in"), output_field=DurationField()))
+            .values_list("id", "check_in", "check_out", "worked")[:100]
+        )
+        return Response([
+            {"id": i, "check_in": ci, "check_out": co,
+             "hours": None if w is None else round(w.total_seconds() / 3600.0, 2)}
+            for i, ci, co, w in rows
+        ])
 
     action_name = str(request.data.get("action") or "").lower()
-    if action_name == "in":
-        open_shift = Attendance.objects.filter(employee=user, check_out__isnull=True).last()
-        if open_shift:
-            return Response({"detail": "Đã check-in."}, status=400)
-        with transaction.atomic():
-            Attendance.objects.create(employee=user, check_in=now())
-        return Response({"detail": "checked-in"})
+    if action_name not in ("in", "out"):
+        return Response({"detail": "action không hợp lệ"}, status=400)
+    key = request.headers.get("Idempotency-Key") or request.data.get("key")
+    try:
+        shift = (check_in if action_name == "in" else check_out)(user.id, key)
+    except AttendanceError as e:
+        return Response({"detail": str(e)}, status=400)
+    return Response({"detail": "checked-in" if action_name == "in" else "checked-out", **shift})
 
-    if action_name == "out":
-        open_shift = Attendance.objects.filter(employee=user, check_out__isnull=True).last()
-        if not open_shift:
-            return Response({"detail": "Chưa check-in."}, status=400)
-        open_shift.check_out = now()
-        open_shift.save(update_fields=["check_out"])
-        return Response({"detail": "checked-out"})
 
-    return Response({"detail": "action không hợp lệ"}, status=400)
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def timesheet_api(request):
+    """
+    Bảng công ?from=YYYY-MM-DD&to=YYYY-MM-DD[&employee=id,id]: giờ làm theo ngày và theo tuần
+    (ca qua nửa đêm tách theo giờ địa phương; ca quên check-out tính tối đa MAX_SHIFT_HOURS).
+    """
+    today = localdate()
+    try:
+        d0 = parse_date(request.GET.get("from") or "") or today.replace(day=1)
+        d1 = parse_date(request.GET.get("to") or "") or today
+        emps = [int(x) for x in (request.GET.get("employee") or "").split(",") if x]
+    except ValueError:
+        return Response({"detail": "Tham số không hợp lệ."}, status=400)
+    if d0 > d1:
+        return Response({"detail": "from phải trước to."}, status=400)
+    if (d1 - d0).days > settings.ATTENDANCE.get("MAX_TIMESHEET_DAYS", 62):
+        return Response({"detail": "Khoảng ngày quá dài."}, status=400)
+
+    sheet = timesheet(d0, d1, emps or None)
+    names = dict(User.objects.filter(id__in=sheet).values_list("id", "username"))
+
+    def hours(sec):
+        return round(sec / 3600.0, 2)
+
+    return Response({
+        "from": d0, "to": d1,
+        "results": [
+            {
+                "employee_id": emp, "username": names.get(emp),
+                "total_hours": hours(e["total"]),
+                "days": {str(d): hours(sec) for d, sec in sorted(e["days"].items())},
+                "weeks": {str(w): hours(sec) for w, sec in sorted(e["weeks"].items())},
+            }
+            for emp, e in sorted(sheet.items())
+        ],
+    })
 
 
 # ---------- TRACK ORDER ----------
@@ -167,10 +664,10 @@ def track_order(request):
     code = (request.GET.get("code") or "").strip()
     if not code:
         return Response({"detail": "Thiếu mã đơn."}, status=400)
-    order = get_object_or_404(Order, code=code)
-    u = request.user
-    if not (u.is_staff or order.assigned_to_id == u.id or order.created_by_id == u.id):
+    order = get_object_or_404(Order.objects.select_related("assigned_to"), code=code)
+    if not can_access_order(request.user, order):
         return Response({"detail": "Không có quyền xem đơn này."}, status=403)
+    eta = order_etas([tuple(getattr(order, f) for f in ETA_FIELDS)]).get(order.id)
     return Response({
         "code": order.code,
         "customer_name": order.customer_name,
@@ -181,6 +678,30 @@ def track_order(request):
         "assigned_to": getattr(order.assigned_to, "username", None),
         "created_at": order.created_at,
         "updated_at": order.updated_at,
+        "eta": eta,  # None nếu đơn đã kết thúc / thiếu toạ độ
+    })
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def eta_api(request):
+    """
+    ETA mọi đơn đang mở (new / shipping) mà user được xem, tính 1 lượt từ speed profile
+    (không gọi OSRM). ?ids=1,2,3 để giới hạn; tối đa ETA["MAX_ORDERS"] đơn.
+    """
+    qs = Order.objects.filter(status__in=("new", "shipping"))
+    if not sees_all_orders(request.user):
+        qs = qs.filter(assigned_to=request.user)
+    if request.GET.get("ids"):
+        try:
+            qs = qs.filter(id__in=[int(x) for x in request.GET["ids"].split(",") if x])
+        except ValueError:
+            return Response({"detail": "ids không hợp lệ"}, status=400)
+    rows = list(qs.order_by("id").values_list("code", *ETA_FIELDS)[:settings.ETA.get("MAX_ORDERS", 2000)])
+    etas = order_etas([r[1:] for r in rows])
+    return Response({
+        "profile": get_profile().summary(),
+        "results": [{"id": r[1], "code": r[0], "status": r[2], **etas[r[1]]} for r in rows if r[1] in etas],
     })
 
 
@@ -188,24 +709,28 @@ def track_order(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def performance_stats(request):
-    """Hiệu suất theo khoảng thời gian."""
+    """
+    Hiệu suất theo khoảng thời gian (làm tròn theo ngày giờ địa phương).
+    Đọc từ bảng tổng hợp EmployeeDailyStat + ca đang mở, không quét lại Order/Attendance.
+    orders.closed = số đơn đã kết thúc (done + cancel) trong khoảng; rollup chỉ đếm đơn đã đóng
+    nên không còn trường "total" (mọi đơn được giao) như trước.
+    """
     u = request.user
     now_dt = now()
     dfrom = parse_datetime(request.GET.get("from") or "") or (now_dt - timedelta(days=30))
     dto = parse_datetime(request.GET.get("to") or "") or now_dt
-
-    oq = Order.objects.filter(assigned_to=u, updated_at__range=(dfrom, dto))
-    agg = oq.aggregate(
-        total=Count("id"),
-        done=Count("id", filter=Q(status="done")),
-        cod_sum=Coalesce(Sum("cod", filter=Q(status="done")), 0),
-    )
-
-    dur_expr = ExpressionWrapper(Coalesce(F("check_out"), dto) - F("check_in"), output_field=DurationField())
-    att_q = Attendance.objects.filter(employee=u)
-    att_agg = att_q.aggregate(worked=Coalesce(Sum(dur_expr), timedelta(0)))
-    worked_hours = round((att_agg["worked"].total_seconds() / 3600.0), 2) if att_agg["worked"] else 0.0
-    done = agg["done"] or 0
+    if dfrom > dto:
+        return Response({"detail": "from phải trước to."}, status=400)
+
+    st = summarize(u.id, dfrom, dto)
+    agg = {
+        "closed": st["done_count"] + st["cancel_count"],
+        "done": st["done_count"],
+        "cancel": st["cancel_count"],
+        "cod_sum": st["cod_sum"],
+    }
+    worked_hours = round(st["worked_seconds"] / 3600.0, 2)
+    done = agg["done"]
     orders_per_hour = round(done / worked_hours, 2) if worked_hours > 0 else None
 
     return Response({
@@ -213,6 +738,33 @@ def performance_stats(request):
         "result": {
             "user": u.username,
             "orders": agg,
-            "attendance": {"worked_hours": worked_hours, "orders_per_hour": orders_per_hour},
+            "attendance": {
+                "worked_hours": worked_hours,
+                "shifts": st["shift_count"],
+                "orders_per_hour": orders_per_hour,
+            },
         }
     })
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def performance_leaderboard(request):
+    """
+    Bảng xếp hạng hiệu suất mọi nhân viên (?from=&to=&sort=done|cod|orders_per_hour&limit=).
+    Mỗi dòng có rank + percentile theo done, COD và orders/hour.
+    """
+    now_dt = now()
+    dfrom = parse_datetime(request.GET.get("from") or "") or (now_dt - timedelta(days=30))
+    dto = parse_datetime(request.GET.get("to") or "") or now_dt
+    if dfrom > dto:
+        return Response({"detail": "from phải trước to."}, status=400)
+    sort = request.GET.get("sort") or "done"
+    if sort not in LEADERBOARD_SORTS:
+        return Response({"detail": f"sort phải thuộc {list(LEADERBOARD_SORTS)}"}, status=400)
+    try:
+        limit = int(request.GET.get("limit") or 0) or None
+    except ValueError:
+        return Response({"detail": "limit không hợp lệ"}, status=400)
+    rows = leaderboard(dfrom, dto, sort=sort, limit=limit)
+    return Response({"from": dfrom, "to": dto, "sort": sort, "count": len(rows), "results": rows})
@@ -7,6 +7,45 @@ document.addEventListener("DOMContentLoaded", () => {
     attribution: '&copy; <a href="https://openstreetmap.org">OpenStreetMap</a>'
   }).addTo(map);
 
+  // ===== Lớp đường nội bộ (tile GeoJSON từ bảng Road, vẽ bằng canvas) =====
+  const HIGHWAY_STYLE = {
+    motorway: ["#e8590c", 4], trunk: ["#f08c00", 3.5], primary: ["#f59f00", 3],
+    secondary: ["#fab005", 2.5], tertiary: ["#ffd43b", 2],
+  };
+  const RoadTiles = L.GridLayer.extend({
+    createTile(coords, done){
+      const size = this.getTileSize();
+      const tile = L.DomUtil.create("canvas", "leaflet-tile");
+      tile.width = size.x; tile.height = size.y;
+      const origin = coords.scaleBy(size);
+      fetch(`/orders/api/tiles/roads/${coords.z}/${coords.x}/${coords.y}.geojson`, { credentials: "same-origin" })
+        .then(r => r.ok ? r.json() : { features: [] })
+        .then(fc => {
+          const ctx = tile.getContext("2d");
+          ctx.lineCap = ctx.lineJoin = "round";
+          (fc.features || []).forEach(f => {
+            const [color, width] = HIGHWAY_STYLE[f.properties.highway] || ["#868e96", 1.2];
+            const g = f.geometry;
+            const lines = g.type === "LineString" ? [g.coordinates]
+                        : g.type === "MultiLineString" ? g.coordinates : [];
+            ctx.strokeStyle = color; ctx.lineWidth = width;
+            lines.forEach(line => {
+              ctx.beginPath();
+              line.forEach(([lng, lat], i) => {
+                const p = map.project([lat, lng], coords.z).subtract(origin);
+                i ? ctx.lineTo(p.x, p.y) : ctx.moveTo(p.x, p.y);
+              });
+              ctx.stroke();
+            });
+          });
+          done(null, tile);
+        })
+        .catch(err => done(err, tile));
+      return tile;
+    }
+  });
+  L.control.layers(null, { "Mạng lưới đường (nội bộ)": new RoadTiles({ maxZoom: 19 }) }).addTo(map);
+
   // ===== UI refs =====
   const wpListEl  = document.getElementById("wpList");
   const statsEl   = document.getElementById("stats");
@@ -93,36 +132,91 @@ document.addEventListener("DOMContentLoaded", () => {
     encodeHash();
   }
 
-  // ===== Markers từ đơn hàng (click -> thêm waypoint) =====
-  fetch("/orders/api/orders/?format=json", { credentials: "same-origin" })
-    .then(r => r.json())
-    .then(data => {
-      const bounds = L.latLngBounds();
-      data.forEach(o => {
-        const lat = o.lat || o.latitude;
-        const lng = o.lng || o.longitude;
-        if (!lat || !lng) return;
-        const m = L.marker([lat,lng]).addTo(map)
-          .bindPopup(
-            `<div class="popup-title">${o.customer_name||""}</div>
-             <div><b>Mã:</b> ${o.code||""}</div>
-             <div><b>Trạng thái:</b> ${o.status||""}</div>
-             <div><b>COD:</b> ${Number(o.cod||0).toLocaleString("vi-VN")} ₫</div>
-             <hr style="margin:6px 0"/>
-             <button id="add-${o.id}" style="padding:6px 10px;border:0;border-radius:6px;background:#2563eb;color:#fff;cursor:pointer">Thêm làm điểm dừng</button>`
-          );
-        m.on("popupopen", () => {
-          const btn = document.getElementById(`add-${o.id}`);
-          if (btn) btn.onclick = () => {
-            addWaypoint(lat, lng, `${o.customer_name||""} (${o.code||""})`);
-            map.closePopup();
-          };
-        });
-        bounds.extend([lat,lng]);
+  // ===== Markers từ đơn hàng theo khung nhìn (click -> thêm waypoint) =====
+  // Server lọc theo bbox + gom cụm ở zoom thấp -> số marker luôn giới hạn.
+  const ORDERS_LAYER = L.layerGroup().addTo(map);
+  let ORDERS_CTRL = null;
+  let ORDERS_TIMER = null;
+
+  function orderPopup(o, lat, lng){
+    const m = L.marker([lat,lng]).bindPopup(
+      `<div class="popup-title">${o.customer_name||""}</div>
+       <div><b>Mã:</b> ${o.code||""}</div>
+       <div><b>Trạng thái:</b> ${o.status||""}</div>
+       <div><b>COD:</b> ${Number(o.cod||0).toLocaleString("vi-VN")} ₫</div>
+       <hr style="margin:6px 0"/>
+       <button id="add-${o.id}" style="padding:6px 10px;border:0;border-radius:6px;background:#2563eb;color:#fff;cursor:pointer">Thêm làm điểm dừng</button>`
+    );
+    m.on("popupopen", () => {
+      const btn = document.getElementById(`add-${o.id}`);
+      if (btn) btn.onclick = () => {
+        addWaypoint(lat, lng, `${o.customer_name||""} (${o.code||""})`);
+        map.closePopup();
+      };
+    });
+    return m;
+  }
+
+  function clusterMarker(p, lat, lng){
+    const size = Math.min(56, 24 + Math.log2(p.count) * 4);
+    const icon = L.divIcon({
+      className: "", iconSize: [size, size],
+      html: `<div style="width:${size}px;height:${size}px;border-radius:50%;background:rgba(37,99,235,.85);color:#fff;display:flex;align-items:center;justify-content:center;font:600 12px system-ui">${p.count}</div>`
+    });
+    return L.marker([lat,lng], {icon}).on("click", () => {
+      const [w,s,e,n] = p.bbox;
+      map.fitBounds([[s,w],[n,e]], {padding:[40,40], maxZoom: map.getZoom() + 3});
+    });
+  }
+
+  async function loadOrders(){
+    if (ORDERS_CTRL) ORDERS_CTRL.abort();
+    ORDERS_CTRL = new AbortController();
+    const b = map.getBounds();
+    const bbox = [
+      Math.max(-180, b.getWest()), Math.max(-90, b.getSouth()),
+      Math.min(180, b.getEast()), Math.min(90, b.getNorth())
+    ].map(x => x.toFixed(6)).join(",");
+    try{
+      const url = `/orders/api/map/?format=json&bbox=${bbox}&zoom=${map.getZoom()}`;
+      const fc = await (await fetch(url, { credentials: "same-origin", signal: ORDERS_CTRL.signal })).json();
+      ORDERS_LAYER.clearLayers();
+      (fc.features || []).forEach(f => {
+        const [lng, lat] = f.geometry.coordinates;
+        const p = f.properties || {};
+        if (p.cluster) clusterMarker(p, lat, lng).addTo(ORDERS_LAYER);
+        else if (p.code) orderPopup(p, lat, lng).addTo(ORDERS_LAYER);
+        else {
+          // điểm lẻ trong chế độ cụm: tải chi tiết khi mở popup
+          const m = L.marker([lat,lng]).addTo(ORDERS_LAYER);
+          m.once("click", async () => {
+            const o = await (await fetch(`/orders/api/orders/${p.id}/?format=json`, { credentials: "same-origin" })).json();
+            ORDERS_LAYER.removeLayer(m);
+            orderPopup(o, lat, lng).addTo(ORDERS_LAYER).openPopup();
+          });
+        }
       });
-      if (bounds.isValid()) map.fitBounds(bounds, { padding:[40,40] });
-    })
-    .catch(()=>{});
+    }catch{}
+  }
+  map.on("moveend", () => {
+    clearTimeout(ORDERS_TIMER);
+    ORDERS_TIMER = setTimeout(loadOrders, 250);
+  });
+
+  // Lần đầu: lấy cụm toàn cục (vài chục điểm) để đưa khung nhìn tới vùng có đơn
+  (async function initialView(){
+    try{
+      const fc = await (await fetch("/orders/api/map/?format=json&bbox=-180,-90,180,90&zoom=3",
+        { credentials: "same-origin" })).json();
+      if (WAYPOINTS.length) return loadOrders();  // đã khôi phục điểm dừng -> giữ khung nhìn đó
+      const pts = (fc.features || []).map(f => [f.geometry.coordinates[1], f.geometry.coordinates[0]]);
+      if (pts.length) {
+        const fb = L.latLngBounds(pts);
+        if (fb.isValid()) return map.fitBounds(fb, { padding:[40,40], maxZoom: 15 });  // moveend -> loadOrders
+      }
+    }catch{}
+    loadOrders();
+  })();
 
   // ===== Search địa chỉ (Nominatim) =====
   btnSearch?.addEventListener("click", () => {
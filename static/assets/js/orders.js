@@ -15,6 +15,7 @@
   const resetBtn  = q("#resetBtn");
   const btnIn  = q("#checkInBtn");
   const btnOut = q("#checkOutBtn");
+  const moreBtn = q("#loadMoreBtn");
 
   // address fields
   const elPickupAddr  = q("#pickupAddress");
@@ -81,29 +82,61 @@
   };
 
   // ================= Orders =================
+  // API phân trang cursor: tải từng trang khi cần (nút "Tải thêm" / cuộn tới cuối bảng),
+  // lọc trạng thái + tìm kiếm làm ở server
   let cache = [];
+  let nextUrl = null;
+  let loadSeq = 0;
 
-  async function loadOrders(){
+  function listUrl(){
+    const params = new URLSearchParams();
+    const kw = (searchBox?.value||"").trim();
+    const st = filterSel?.value||"";
+    if (kw) params.set("search", kw);
+    if (st) params.set("status", st);
+    const qs = params.toString();
+    return qs ? `${API_ORDERS}?${qs}` : API_ORDERS;
+  }
+
+  function updateMoreBtn(busy=false){
+    if (!moreBtn) return;
+    moreBtn.hidden = !nextUrl;
+    moreBtn.disabled = busy;
+    moreBtn.textContent = busy ? "Đang tải..." : "Tải thêm";
+  }
+
+  async function loadOrders(more=false){
+    const url = more ? nextUrl : listUrl();
+    if (!url || (more && moreBtn?.disabled)) return;
+    const seq = ++loadSeq;  // bỏ kết quả cũ khi bộ lọc đổi giữa chừng
+    updateMoreBtn(true);
     try{
-      const res = await fetch(API_ORDERS, { credentials:"same-origin" });
+      const res = await fetch(url, { credentials:"same-origin" });
       if(!res.ok) throw 0;
-      cache = await res.json();
+      const page = await res.json();
+      if (seq !== loadSeq) return;
+      const rows = page.results || page;
+      cache = more ? cache.concat(rows) : rows;
+      nextUrl = page.next || null;
       renderOrders();
     }catch{
-      tbody.innerHTML = `<tr><td colspan="${IS_STAFF?10:9}" style="color:#ef4444;text-align:center;">Lỗi tải dữ liệu</td></tr>`;
+      if (seq !== loadSeq) return;
+      if (more) toast("Lỗi tải thêm đơn","error");
+      else tbody.innerHTML = `<tr><td colspan="${IS_STAFF?10:9}" style="color:#ef4444;text-align:center;">Lỗi tải dữ liệu</td></tr>`;
+    }finally{
+      if (seq === loadSeq) updateMoreBtn(false);
     }
   }
 
+  moreBtn?.addEventListener("click", ()=>loadOrders(true));
+  if (moreBtn && "IntersectionObserver" in window){
+    new IntersectionObserver(entries=>{
+      if (entries.some(e=>e.isIntersecting)) loadOrders(true);
+    }).observe(moreBtn);
+  }
+
   function renderOrders(){
-    const kw = (searchBox?.value||"").trim().toLowerCase();
-    const st = filterSel?.value||"";
-    const rows = cache.filter(o=>{
-      const okSt = !st || o.status===st;
-      const okKw = !kw ||
-        (o.code||"").toLowerCase().includes(kw) ||
-        (o.customer_name||"").toLowerCase().includes(kw);
-      return okSt && okKw;
-    }).map(o=>{
+    const rows = cache.map(o=>{
       const actions = IS_STAFF ? `
         <button class="icon-btn" onclick="editOrder(${o.id},'${js(o.code)}','${js(o.customer_name)}','${js(o.address||"")}','${js(o.phone||"")}','${js(o.status||"new")}',${Number(o.cod||0)})">✏️</button>
         <button class="icon-btn danger" onclick="delOrder(${o.id})">🗑️</button>
@@ -264,12 +297,15 @@
   }
 
   async function att(action){
+    // cùng key cho lần gửi lại khi lỗi mạng -> server không tạo / đóng ca 2 lần
+    const key = window.crypto?.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
+    const send = () => fetch(API_ATT, {
+      method:"POST", credentials:"same-origin",
+      headers:{ "Content-Type":"application/json", "X-CSRFToken": CSRF, "Idempotency-Key": key },
+      body: JSON.stringify({ action })
+    });
     try{
-      const res = await fetch(API_ATT, {
-        method:"POST", credentials:"same-origin",
-        headers:{ "Content-Type":"application/json", "X-CSRFToken": CSRF },
-        body: JSON.stringify({ action })
-      });
+      const res = await send().catch(send);
       const ok = res.ok;
       const data = await res.json().catch(()=>null);
       if(!ok){ toast(data?.detail || "Lỗi chấm công","error"); return; }
@@ -285,8 +321,12 @@
   btnOut?.addEventListener("click", ()=>att("out"));
 
   // ================= Filters =================
-  searchBox?.addEventListener("input", renderOrders);
-  filterSel?.addEventListener("change", renderOrders);
+  let searchTimer;
+  searchBox?.addEventListener("input", ()=>{
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(()=>loadOrders(), 300);
+  });
+  filterSel?.addEventListener("change", ()=>loadOrders());
 
   // ================= Init =================
   loadOrders();
@@ -320,7 +360,7 @@
         <tr>
           <td>${r.user}</td>
           <td style="text-align:center">${r.orders.done}</td>
-          <td style="text-align:center">${r.orders.total}</td>
+          <td style="text-align:center">${r.orders.closed}</td>
           <td style="text-align:right">${Number(r.orders.cod_sum||0).toLocaleString("vi-VN")}</td>
           <td style="text-align:center">${(r.attendance.worked_hours||0).toFixed(2)}</td>
           <td style="text-align:center">${r.attendance.orders_per_hour ?? "-"}</td>